@@ -20,6 +20,9 @@
 const int stepPin1 = 11, dirPin1 = 10, enablePin1 = A0;
 const int stepPin2 = 8,  dirPin2  = 9,  enablePin2 = A1;
 const int stepPin3 = 6,  dirPin3  = 4,  enablePin3 = A2;
+const int stepPins[3]   = {stepPin1,   stepPin2,   stepPin3};
+const int dirPins[3]    = {dirPin1,    dirPin2,    dirPin3};
+const int enablePins[3] = {enablePin1, enablePin2, enablePin3};
 
 const int airMotorPin   = 5;
 const int cameraPin     = 3;
@@ -30,6 +33,13 @@ const int selenoid      = 2;
 bool VERBOSE = false;                 // default sessiz
 inline void vlog(const char* s){ if (VERBOSE) Serial.println(s); }
 
+// =================== Etiketli Cevap ===================
+// "#17 MOVE3 8526" gelirse cevap "#17 DONE" olur; etiketsiz komutlar eskisi gibi.
+// Python tarafı birden çok komutu yolda tutup cevapları etiketle eşleştirir.
+String replyTag = "";                // "#17 " biçiminde; etiketsizse boş
+inline void replyBegin(){ if (replyTag.length()) Serial.print(replyTag); }
+inline void reply(const char* s){ replyBegin(); Serial.println(s); }
+
 // =================== HX711 (kütüphanesiz) ==================
 // gram = (raw - tare_offset) / scale_factor
 long  tare_offset  = 0;              // TARE ile ayarlanır (açılışta ham okunup atanır)
@@ -106,19 +116,164 @@ float getPH() {
   return ph;
 }
 
+// =================== Zamanlı Aktüatörler (millis tabanlı) ===================
+// *_DUR komutları hemen "OK" döner; süre dolunca "END:<AD>" satırı gönderilir.
+// Pencereler birbirini beklemez (hava ve su aynı anda çalışabilir) ve bu sırada
+// PING / PH_MEASURE / WEIGHT_MEASURE cevaplanmaya devam eder.
+struct TimedOutput {
+  const char*   name;    // tamamlanma olayı: END:<name>
+  int           pin;     // -1: sadece zamanlayıcı (çökme)
+  bool          active;
+  unsigned long start;
+  unsigned long dur;
+  String        tag;     // komut etiketliyse olay da aynı etiketle döner
+};
+
+TimedOutput timed[] = {
+  {"AIR",   airMotorPin,   false, 0, 0, ""},
+  {"WATER", waterMotorPin, false, 0, 0, ""},
+  {"VALVE", selenoid,      false, 0, 0, ""},
+  {"COKME", -1,            false, 0, 0, ""},
+};
+const int TIMED_AIR = 0, TIMED_WATER = 1, TIMED_VALVE = 2, TIMED_COKME = 3;
+const int TIMED_N = sizeof(timed) / sizeof(timed[0]);
+
+void finishTimed(int i) {
+  TimedOutput &t = timed[i];
+  if (!t.active) return;
+  if (t.pin >= 0) digitalWrite(t.pin, LOW);
+  t.active = false;
+  if (t.tag.length()) Serial.print(t.tag);
+  Serial.print("END:"); Serial.println(t.name);
+}
+
+void startTimed(int i, long ms) {
+  TimedOutput &t = timed[i];
+  finishTimed(i);                      // çalışan pencere varsa önce kapat (olayı yollanır)
+  if (t.pin >= 0) digitalWrite(t.pin, HIGH);
+  t.start  = millis();
+  t.dur    = ms > 0 ? (unsigned long)ms : 0;
+  t.tag    = replyTag;
+  t.active = true;
+  reply("OK");
+}
+
+// loop() ve uzun step döngüleri içinden çağrılır
+void serviceTimed() {
+  unsigned long now = millis();
+  for (int i = 0; i < TIMED_N; i++)
+    if (timed[i].active && now - timed[i].start >= timed[i].dur) finishTimed(i);
+}
+
 // =================== Step Motor Sürüşü ===================
-void moveStepper(int pin, int directionPin, int enablePin, long steps) {
-  digitalWrite(enablePin, LOW);
-  digitalWrite(directionPin, steps >= 0 ? HIGH : LOW);
-
-  unsigned long n = (unsigned long)abs(steps);
-  for (unsigned long k = 0; k < n; k++) {
-    digitalWrite(pin, HIGH);  delayMicroseconds(800);
-    digitalWrite(pin, LOW);   delayMicroseconds(800);
+// Trapez hız profili: startSps'den accelSps2 ile maxSps'e çıkar, sonda simetrik
+// yavaşlar. Eksenler micros() takvimiyle bağımsız darbelenir; hareket boyunca
+// PROGRESS_MS'de bir, eksenler sırayla, tek "PROGRESS:<motor>:<atılan adım>"
+// satırı yazılır. TX tamponunda satırlık yer yoksa o tur atlanır: 9600 baud'da
+// Serial.print bloklarsa adım takvimi kayar ve motor rampasız hızlanır.
+// Python tarafı (motion.py) aynı profille süre tahmini yapar; SET_RATE ile ayarlanır.
+float maxSps[3]    = {1250.0f, 1250.0f, 1250.0f};
+float accelSps2[3] = {2500.0f, 2500.0f, 2500.0f};
+float startSps[3]  = {400.0f,  400.0f,  400.0f};
+const unsigned long PROGRESS_MS = 250;
+const int PROGRESS_MAX_LEN = 24;       // "#9999 PROGRESS:1:38000\r\n"
+
+// k adım atılmışken bir sonraki adıma kadar beklenecek süre (µs)
+unsigned long stepInterval(int i, unsigned long k, unsigned long n) {
+  unsigned long r = (k < n - k) ? k : n - k;          // uca en yakın mesafe
+  float v = sqrt(startSps[i] * startSps[i] + 2.0f * accelSps2[i] * (float)r);
+  if (v > maxSps[i]) v = maxSps[i];
+  return (unsigned long)(1000000.0f / v);
+}
+
+void runMoves(long steps[3]) {
+  unsigned long n[3], done[3] = {0, 0, 0}, next[3];
+  unsigned long now = micros();
+  for (int i = 0; i < 3; i++) {
+    n[i] = (unsigned long)abs(steps[i]);
+    next[i] = now;
+    if (!n[i]) continue;
+    digitalWrite(enablePins[i], LOW);
+    digitalWrite(dirPins[i], steps[i] >= 0 ? HIGH : LOW);
+  }
+
+  unsigned long lastProgress = millis();
+  int progressAxis = 0;
+  while (true) {
+    bool busy = false;
+    now = micros();
+    for (int i = 0; i < 3; i++) {
+      if (done[i] >= n[i]) continue;
+      busy = true;
+      if ((long)(now - next[i]) < 0) continue;
+      digitalWrite(stepPins[i], HIGH); delayMicroseconds(3);
+      digitalWrite(stepPins[i], LOW);
+      done[i]++;
+      // Geride kalındıysa (seri yazım vb.) adımları üst üste atma; takvimi kaydır
+      next[i] = now + stepInterval(i, done[i], n[i]);
+    }
+    if (!busy) break;
+    if (millis() - lastProgress >= PROGRESS_MS) {
+      lastProgress = millis();
+      // Sıradaki hareketli eksen; yazım bloklamayacaksa tek satır
+      for (int k = 0; k < 3; k++) {
+        int i = (progressAxis + k) % 3;
+        if (!n[i] || done[i] >= n[i]) continue;
+        progressAxis = (i + 1) % 3;
+        if (Serial.availableForWrite() >= PROGRESS_MAX_LEN) {
+          replyBegin(); Serial.print("PROGRESS:"); Serial.print(i + 1);
+          Serial.print(':'); Serial.println(done[i]);
+        }
+        break;
+      }
+      serviceTimed();                  // hareket sırasında da pencereler kapanır
+    }
   }
-  digitalWrite(enablePin, HIGH);
+
+  for (int i = 0; i < 3; i++) if (n[i]) digitalWrite(enablePins[i], HIGH);
   delay(40);
-  Serial.println("DONE");      // tek satır yanıt
+  reply("DONE");      // tek satır yanıt
+}
+
+void moveStepper(int idx, long steps) {
+  long s[3] = {0, 0, 0};
+  s[idx - 1] = steps;
+  runMoves(s);
+}
+
+// "MOVE_MULTI 1:<adım> 2:<adım> 3:<adım>" — verilen eksenler aynı döngüde,
+// birlikte sürülür; süre en uzun hareket kadardır. Tek DONE döner.
+void moveMulti(String args) {
+  long n[3] = {0, 0, 0};
+  args.trim();
+  while (args.length()) {
+    int sp = args.indexOf(' ');
+    String tok = sp < 0 ? args : args.substring(0, sp);
+    args = sp < 0 ? "" : args.substring(sp + 1);
+    args.trim();
+    int c = tok.indexOf(':');
+    int idx = tok.substring(0, c).toInt();
+    if (c < 1 || idx < 1 || idx > 3) { reply("ERR"); return; }
+    n[idx - 1] = tok.substring(c + 1).toInt();
+  }
+  runMoves(n);
+}
+
+// "SET_RATE <motor> <max adım/sn> <ivme adım/sn²> [<başlangıç adım/sn>]"
+void setRate(String args) {
+  args.trim();
+  int a = args.indexOf(' ');
+  int b = a < 0 ? -1 : args.indexOf(' ', a + 1);
+  if (a < 0 || b < 0) { reply("ERR"); return; }
+  int idx = args.substring(0, a).toInt();
+  if (idx < 1 || idx > 3) { reply("ERR"); return; }
+  int c = args.indexOf(' ', b + 1);
+  float vmax = args.substring(a + 1, b).toFloat();
+  float acc  = (c < 0 ? args.substring(b + 1) : args.substring(b + 1, c)).toFloat();
+  float v0   = c < 0 ? startSps[idx - 1] : args.substring(c + 1).toFloat();
+  if (vmax < 1.0f || acc < 1.0f || v0 < 1.0f || v0 > vmax) { reply("ERR"); return; }
+  maxSps[idx - 1] = vmax; accelSps2[idx - 1] = acc; startSps[idx - 1] = v0;
+  reply("OK");
 }
 
 // =================== Komut Yorumlayıcı ===================
@@ -126,88 +281,80 @@ void executeCommand(String command) {
   command.trim();
 
   // ----- yönetim -----
-  if (command == "VERBOSE_ON")  { VERBOSE = true;  Serial.println("OK"); return; }
-  if (command == "VERBOSE_OFF") { VERBOSE = false; Serial.println("OK"); return; }
-  if (command == "PING")        { Serial.println("PONG"); return; }
+  if (command == "VERBOSE_ON")  { VERBOSE = true;  reply("OK"); return; }
+  if (command == "VERBOSE_OFF") { VERBOSE = false; reply("OK"); return; }
+  if (command == "PING")        { reply("PONG"); return; }
 
   // ----- step / IO -----
+  if (command.startsWith("MOVE_MULTI")) { moveMulti(command.substring(10)); return; }
+  if (command.startsWith("SET_RATE"))   { setRate(command.substring(8));     return; }
   if (command.startsWith("MOVE1")) {
     long steps = command.substring(6).toInt();
-    moveStepper(stepPin1, dirPin1, enablePin1, steps); return;
+    moveStepper(1, steps); return;
   }
   if (command.startsWith("MOVE2")) {
     long steps = command.substring(6).toInt();
-    moveStepper(stepPin2, dirPin2, enablePin2, steps); return;
+    moveStepper(2, steps); return;
   }
   if (command.startsWith("MOVE3")) {
     long steps = command.substring(6).toInt();
-    moveStepper(stepPin3, dirPin3, enablePin3, steps); return;
+    moveStepper(3, steps); return;
   }
 
-  if (command == "AIR_ON")   { digitalWrite(airMotorPin, HIGH);  Serial.println("DONE"); return; }
-  if (command == "AIR_OFF")  { digitalWrite(airMotorPin, LOW);   Serial.println("DONE"); return; }
-  if (command.startsWith("AIR_DUR")) {
-    long ms = command.substring(8).toInt();
-    digitalWrite(airMotorPin, HIGH); delay(ms);
-    digitalWrite(airMotorPin, LOW);  Serial.println("DONE"); return;
-  }
+  // *_OFF çalışan süreli pencereyi de kapatır (END olayı gider)
+  if (command == "AIR_ON")   { digitalWrite(airMotorPin, HIGH);  reply("DONE"); return; }
+  if (command == "AIR_OFF")  { finishTimed(TIMED_AIR); digitalWrite(airMotorPin, LOW); reply("DONE"); return; }
+  if (command.startsWith("AIR_DUR"))   { startTimed(TIMED_AIR, command.substring(8).toInt()); return; }
 
-  if (command == "WATER_ON")  { digitalWrite(waterMotorPin, HIGH); Serial.println("DONE"); return; }
-  if (command == "WATER_OFF") { digitalWrite(waterMotorPin, LOW);  Serial.println("DONE"); return; }
-  if (command.startsWith("WATER_DUR")) {
-    long ms = command.substring(10).toInt();
-    digitalWrite(waterMotorPin, HIGH); delay(ms);
-    digitalWrite(waterMotorPin, LOW);  Serial.println("DONE"); return;
-  }
+  if (command == "WATER_ON")  { digitalWrite(waterMotorPin, HIGH); reply("DONE"); return; }
+  if (command == "WATER_OFF") { finishTimed(TIMED_WATER); digitalWrite(waterMotorPin, LOW); reply("DONE"); return; }
+  if (command.startsWith("WATER_DUR")) { startTimed(TIMED_WATER, command.substring(10).toInt()); return; }
 
-  if (command == "VALVE_ON")  { digitalWrite(selenoid, HIGH); Serial.println("DONE"); return; }
-  if (command == "VALVE_OFF") { digitalWrite(selenoid, LOW);  Serial.println("DONE"); return; }
-  if (command.startsWith("VALVE_DUR")) {
-    long ms = command.substring(10).toInt();
-    digitalWrite(selenoid, HIGH); delay(ms);
-    digitalWrite(selenoid, LOW);  Serial.println("DONE"); return;
-  }
+  if (command == "VALVE_ON")  { digitalWrite(selenoid, HIGH); reply("DONE"); return; }
+  if (command == "VALVE_OFF") { finishTimed(TIMED_VALVE); digitalWrite(selenoid, LOW); reply("DONE"); return; }
+  if (command.startsWith("VALVE_DUR")) { startTimed(TIMED_VALVE, command.substring(10).toInt()); return; }
 
-  if (command.startsWith("COKME_DUR")) { long ms = command.substring(10).toInt(); delay(ms); Serial.println("DONE"); return; }
+  if (command.startsWith("COKME_DUR")) { startTimed(TIMED_COKME, command.substring(10).toInt()); return; }
+  if (command == "COKME_OFF") { finishTimed(TIMED_COKME); reply("DONE"); return; }   // renk erken oturdu
 
   if (command == "CAMERA_TRIG") {
     digitalWrite(cameraPin, HIGH); delay(100);
-    digitalWrite(cameraPin, LOW);  Serial.println("DONE"); return;
+    digitalWrite(cameraPin, LOW);  reply("DONE"); return;
   }
 
   // ----- ölçümler & kalibrasyon -----
   if (command == "WEIGHT_MEASURE") {
     float w = getWeight();
-    Serial.print("Weight: "); Serial.println(w, 3);  // Python tarafı "Weight: " bekliyor
+    replyBegin(); Serial.print("Weight: "); Serial.println(w, 3);  // Python tarafı "Weight: " bekliyor
     return;
   }
-  if (command == "RAW_READ")       { long r = hxReadRaw();  Serial.print("RAW:");    Serial.println(r);   return; }
-  if (command == "TARE")           { long r = hxReadRaw();  tare_offset = r;         Serial.print("TARE:"); Serial.println(tare_offset); return; }
+  if (command == "RAW_READ")       { long r = hxReadRaw();  replyBegin(); Serial.print("RAW:");    Serial.println(r);   return; }
+  if (command == "TARE")           { long r = hxReadRaw();  tare_offset = r;         replyBegin(); Serial.print("TARE:"); Serial.println(tare_offset); return; }
   if (command.startsWith("SET_SCALE")) {
     float s = command.substring(9).toFloat();
-    if (s > 0.001f) { scale_factor = s; Serial.print("SCALE:"); Serial.println(scale_factor, 3); }
-    else Serial.println("ERR");
+    if (s > 0.001f) { scale_factor = s; replyBegin(); Serial.print("SCALE:"); Serial.println(scale_factor, 3); }
+    else reply("ERR");
     return;
   }
   if (command.startsWith("SET_TARE")) {
     long t = command.substring(8).toInt();
-    tare_offset = t; Serial.print("TARE:"); Serial.println(tare_offset); return;
+    tare_offset = t; replyBegin(); Serial.print("TARE:"); Serial.println(tare_offset); return;
   }
   if (command == "PH_MEASURE") {
     float p = getPH();
-    Serial.print("PH: "); Serial.println(p, 2);      // Python tarafı "PH: " bekliyor
+    replyBegin(); Serial.print("PH: "); Serial.println(p, 2);      // Python tarafı "PH: " bekliyor
     return;
   }
 
   // ----- test akışını kapatma için uyumluluk -----
   if (command == "COMPLETE_TEST") {
     // Herhangi bir sayaç tutmuyoruz; UI beklemesin diye DONE döndürüyoruz
-    Serial.println("DONE");
+    reply("DONE");
     return;
   }
 
   // tanınmayan komut
-  Serial.println("ERR");
+  reply("ERR");
 }
 
 // =================== setup / loop ===================
@@ -240,8 +387,15 @@ void setup() {
 }
 
 void loop() {
+  serviceTimed();
   if (Serial.available()) {
     String cmd = Serial.readStringUntil('\n');
+    cmd.trim();
+    replyTag = "";
+    if (cmd.startsWith("#")) {
+      int sp = cmd.indexOf(' ');
+      if (sp > 1) { replyTag = cmd.substring(0, sp + 1); cmd = cmd.substring(sp + 1); }
+    }
     executeCommand(cmd);
   }
 }
@@ -0,0 +1,362 @@
+"""Uçtan uca ve mikro ölçümler: simülatörde tam titrasyon döngüsü + sıcak yollar.
+
+Sonuçlar JSON olarak yazılır; --compare ile önceki bir sonuç dosyasına oranlanır.
+
+    python benchmark.py --scale 0.02 --runs 3 --out bench.json
+    python benchmark.py --only e2e,serial --compare bench_eski.json
+
+Ölçümler:
+  e2e      TitrationEngine + SerialTransport + simulator (start -> completed -> temizlik);
+           süreler simülasyon saniyesidir (gerçek süre / scale), saatlik numune buradan.
+  serial   SerialWorker.send_command("PING") gidiş-dönüşü (pty üzerinden)
+  parse    Fq2Framer.feed ve MyApp.process_camera_data
+  formula  MyApp.apply_formula ve loadFormula
+  report   MyApp.save_report
+Qt ölçümleri offscreen bir MyApp üzerinde, geçici bir çalışma klasöründe koşar.
+"""
+import argparse
+import contextlib
+import datetime
+import json
+import os
+import platform
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import serial
+
+from device import TitrationDevice
+from rgb_stream import Fq2Framer
+from serial_transport import SerialTransport
+from simulator import BenchSimulator
+from titration_engine import FormulaParams, ThreadScheduler, TitrationEngine
+
+APP_DIR = Path(__file__).resolve().parent
+SUITES = ("e2e", "serial", "parse", "formula", "report")
+
+# v3 formül satırı; simülatörün varsayılan eğrisine (1.2 ml'de 10,20,30 -> 100,100,100) göre
+BENCH_FORMULA = "bench,1,1,0.5,0.2,,,1,1,1,3,100,100,100,8,8,8,8,8,8,(M1+100)/M3"
+
+
+# ---------------- Yardımcılar ----------------
+def summarize(samples) -> dict:
+    """Süre listesi (sn) -> istatistik sözlüğü."""
+    s = sorted(samples)
+    if not s:
+        return {"n": 0}
+    mean = statistics.fmean(s)
+    return {
+        "n": len(s),
+        "mean_s": mean,
+        "p50_s": s[len(s) // 2],
+        "p95_s": s[min(len(s) - 1, int(len(s) * 0.95))],
+        "min_s": s[0],
+        "max_s": s[-1],
+        "ops_per_s": (1.0 / mean) if mean > 0 else None,
+    }
+
+
+def timeit(fn, n: int = 1000, warmup: int = 10) -> dict:
+    for _ in range(warmup):
+        fn()
+    out = []
+    for _ in range(n):
+        t0 = time.perf_counter()
+        fn()
+        out.append(time.perf_counter() - t0)
+    return summarize(out)
+
+
+def git_rev():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=APP_DIR,
+                              capture_output=True, text=True, timeout=5).stdout.strip() or None
+    except Exception:
+        return None
+
+
+# ---------------- Uçtan uca ----------------
+def clean_cycle(device: TitrationDevice, f: FormulaParams):
+    """MyApp.clean_system ile aynı sıra: valf, hava + su, su bitince valf (bloklayıcı)."""
+    device.timed("VALVE", f.valve_s).result()
+    air = device.timed("AIR", f.water_s + f.air_s)
+    device.timed("WATER", f.water_s).result()
+    device.timed("VALVE", f.air_s).result()
+    air.result()
+
+
+def bench_e2e(scale: float, runs: int, seed=None) -> dict:
+    sim = BenchSimulator(scale=scale, seed=seed, tau_s=1.0)
+    port, (host, tcp_port) = sim.start()
+    ser = serial.Serial(port, 9600, timeout=None)
+    transport = SerialTransport(ser)
+    transport.start()
+    transport.enable_tags().result(3)
+    device = TitrationDevice(transport)
+    device.apply_profiles().result(3)
+    scheduler = ThreadScheduler()
+    scheduler.start()
+    engine = TitrationEngine(device, scheduler, rgb_timeout_s=max(1.0, 15 * scale))
+    formula = FormulaParams.from_fields(BENCH_FORMULA.split(","))
+
+    done = threading.Event()
+    cycle_t = []
+    result = {}
+
+    def on_event(event, data):
+        if event == "cycle":
+            cycle_t.append(time.monotonic())
+        elif event in ("completed", "error"):
+            result.update(data, event=event)
+            done.set()
+    engine.add_listener(on_event)
+
+    # FQ2 istemcisi: TcpClientThread'in yaptığı gibi kayıtları motora verir
+    sock = socket.create_connection((host, tcp_port))
+
+    def reader():
+        framer = Fq2Framer()
+        while True:
+            try:
+                data = sock.recv(4096)
+            except OSError:
+                return
+            if not data:
+                return
+            for rgb in framer.feed(data):
+                scheduler.call_soon_threadsafe(lambda rgb=rgb: engine.feed_rgb(rgb))
+    threading.Thread(target=reader, name="bench-fq2", daemon=True).start()
+    time.sleep(0.1)
+
+    tests, cycles, cycle_lat = [], [], []
+    failures = 0
+    try:
+        for _ in range(runs):
+            done.clear()
+            result.clear()
+            cycle_t.clear()
+            t0 = time.monotonic()
+            scheduler.call_soon_threadsafe(lambda: engine.start(formula))
+            if not done.wait(600 * scale + 30):
+                failures += 1
+                scheduler.call_soon_threadsafe(engine.abort)
+                continue
+            t_test = time.monotonic()
+            clean_cycle(device, formula)
+            t_end = time.monotonic()
+            if result.get("event") != "completed":
+                failures += 1
+                continue
+            tests.append(((t_test - t0) / scale, (t_end - t0) / scale))
+            cycles.append(result.get("cycles", 0))
+            marks = [t0] + cycle_t + [t_test]
+            cycle_lat += [(b - a) / scale for a, b in zip(marks, marks[1:])]
+    finally:
+        scheduler.call_soon_threadsafe(engine.abort)
+        sock.close()
+        rtt = transport.rtt_summary()
+        transport.stop()
+        ser.close()
+        scheduler.stop()
+        sim.close()
+
+    total = [t[1] for t in tests]
+    return {
+        "scale": scale,
+        "runs": runs,
+        "failures": failures,
+        "test_sim_s": summarize([t[0] for t in tests]),
+        "test_with_clean_sim_s": summarize(total),
+        "cycle_sim_s": summarize(cycle_lat),
+        "cycles_per_test": statistics.fmean(cycles) if cycles else None,
+        "samples_per_hour": (3600.0 / statistics.fmean(total)) if total else None,
+        "serial_rtt_real_s": {k: {"n": n, "mean_s": m, "last_s": last} for k, (n, m, last) in rtt.items()},
+    }
+
+
+# ---------------- Mikro ölçümler ----------------
+def bench_serial(n: int) -> dict:
+    sim = BenchSimulator(scale=1.0)
+    port, _ = sim.start()
+    from titration_main import SerialWorker
+    ser = serial.Serial(port, 9600, timeout=None)
+    worker = SerialWorker(ser)
+    try:
+        return {"send_command_ping": timeit(lambda: worker.send_command("PING", "PONG", 2.0), n)}
+    finally:
+        worker.close()
+        ser.close()
+        sim.close()
+
+
+def bench_parse(n: int) -> dict:
+    lines = b"".join(f"{i % 256}\r\n{(i * 7) % 256}\r\n{(i * 13) % 256}\r\n".encode() for i in range(100))
+    framer = Fq2Framer()
+    out = {"fq2_framer_feed_100": timeit(lambda: framer.feed(lines), n)}
+    app = _app()
+    if app is not None:
+        out["process_camera_data"] = timeit(lambda: app.process_camera_data("101\n99\n100\n"), n)
+    return out
+
+
+def bench_formula(n: int) -> dict:
+    app = _app()
+    if app is None:
+        return {}
+    parts = BENCH_FORMULA.split(",")
+    if "bench" not in app.formula_store:
+        raise RuntimeError("bench formülü yok; loadFormula boş aramayı ölçerdi")
+    app.formula_combobox.addItem("bench")
+    app.formula_combobox.setCurrentText("bench")
+    return {
+        "apply_formula": timeit(lambda: app.apply_formula(parts), n),
+        "loadFormula": timeit(app.loadFormula, n),
+    }
+
+
+def bench_report(n: int) -> dict:
+    app = _app()
+    if app is None:
+        return {}
+    app.current_rgb = None
+    return {"save_report": timeit(lambda: app.save_report(101, 99, 100), n)}
+
+
+_APP = None
+
+
+def _app():
+    """Offscreen MyApp (PyQt5 yoksa None); seri/TCP simülatöre bağlanır."""
+    global _APP
+    if _APP is not None:
+        return _APP
+    try:
+        os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+        from PyQt5.QtWidgets import QApplication
+    except ImportError:
+        return None
+    sim = BenchSimulator(scale=1.0)
+    port, (host, tcp_port) = sim.start()
+    os.environ["TITRATION_SERIAL_PORT"] = port
+    os.environ["TITRATION_FQ2_ADDR"] = f"{host}:{tcp_port}"
+    qapp = QApplication.instance() or QApplication([])
+    import titration_main
+    titration_main.SERIAL_PORT = port
+    titration_main.FQ2_HOST, titration_main.FQ2_PORT = host, tcp_port
+    # Arşiv / formül / dönüm dosyaları depoya değil ölçüm klasörüne (main ayarlar)
+    titration_main.DATA_DIR = Path(os.environ["TITRATION_DATA_DIR"])
+    titration_main.RUN_ARCHIVE = None
+    _APP = titration_main.MyApp()
+    _APP._bench_refs = (qapp, sim)
+    return _APP
+
+
+def _close_app():
+    global _APP
+    if _APP is not None:
+        _APP.close()
+        _APP._bench_refs[1].close()
+        _APP = None
+
+
+# ---------------- Karşılaştırma ----------------
+def compare(new: dict, old: dict, path=()):
+    """Aynı anahtarlı mean_s / samples_per_hour değerlerinin oranları (yeni / eski)."""
+    rows = []
+    for k, v in new.items():
+        o = old.get(k) if isinstance(old, dict) else None
+        if o is None:
+            continue
+        if isinstance(v, dict):
+            rows += compare(v, o, path + (k,))
+        elif k in ("mean_s", "samples_per_hour") and isinstance(v, (int, float)) and o:
+            rows.append((".".join(path + (k,)), o, v, v / o))
+    return rows
+
+
+def run_suites(suites, a, results: dict):
+    if "e2e" in suites:
+        results["e2e"] = bench_e2e(a.scale, a.runs, a.seed)
+    if "serial" in suites:
+        results["serial"] = bench_serial(min(a.n, 200))
+    if "parse" in suites:
+        results["parse"] = bench_parse(a.n)
+    if "formula" in suites:
+        results["formula"] = bench_formula(a.n)
+    if "report" in suites:
+        results["report"] = bench_report(a.n)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Titrasyon döngüsü ölçümleri")
+    ap.add_argument("--scale", type=float, default=0.02, help="e2e zaman sıkıştırma (0.02 = 50 kat)")
+    ap.add_argument("--runs", type=int, default=3, help="e2e test sayısı")
+    ap.add_argument("-n", type=int, default=500, help="mikro ölçüm tekrar sayısı")
+    ap.add_argument("--only", default=",".join(SUITES), help="virgülle: " + ",".join(SUITES))
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--out", default=None, help="JSON çıktı dosyası (yoksa stdout)")
+    ap.add_argument("--compare", default=None, help="önceki JSON sonuç dosyası")
+    a = ap.parse_args(argv)
+
+    suites = [s.strip() for s in a.only.split(",") if s.strip()]
+    unknown = set(suites) - set(SUITES)
+    if unknown:
+        ap.error(f"bilinmeyen ölçüm: {', '.join(sorted(unknown))}")
+
+    workdir = tempfile.mkdtemp(prefix="titration-bench-")
+    shutil.copy(APP_DIR / "formulas.txt", workdir)
+    with open(os.path.join(workdir, "formulas.txt"), "a") as f:
+        f.write(BENCH_FORMULA + "\n")
+    cwd = os.getcwd()
+    os.chdir(workdir)                            # rapor / formül dosyaları geçici klasöre
+    saved_env = {k: os.environ.get(k) for k in ("TITRATION_DATA_DIR", "TITRATION_RUN_ARCHIVE")}
+    os.environ["TITRATION_DATA_DIR"] = workdir   # MyApp veri dosyaları APP_DIR yerine buraya
+    os.environ.pop("TITRATION_RUN_ARCHIVE", None)
+    results = {}
+    try:
+        # Uygulamanın print'leri stdout'taki JSON'a karışmasın
+        with contextlib.redirect_stdout(sys.stderr):
+            run_suites(suites, a, results)
+    finally:
+        _close_app()
+        for k, v in saved_env.items():
+            if v is None:
+                os.environ.pop(k, None)
+            else:
+                os.environ[k] = v
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    doc = {
+        "meta": {
+            "time": datetime.datetime.now().isoformat(timespec="seconds"),
+            "git": git_rev(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "args": vars(a),
+        },
+        "results": results,
+    }
+    text = json.dumps(doc, indent=2, ensure_ascii=False)
+    if a.out:
+        with open(a.out, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if a.compare:
+        with open(a.compare) as f:
+            old = json.load(f)
+        for key, o, v, ratio in compare(results, old.get("results", {})):
+            print(f"{key:60s} {o:12.6g} -> {v:12.6g}  x{ratio:.3f}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
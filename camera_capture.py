@@ -0,0 +1,158 @@
+"""Ayrı süreçte kamera yakalama: kareler paylaşımlı bellekteki halkaya yazılır.
+
+Yakalama (ve Picamera2'nin kendi dönüşümleri) GUI sürecinin GIL'ini paylaşmaz;
+seri/motor döngüsü kare zamanlamasından etkilenmez. GUI tarafı aynı belleği
+numpy görünümü olarak eşler, kare kopyalanmaz.
+
+Bellek düzeni: int64 başlık [seq, slots, h, w, c] + slot başına seq + slot kareleri.
+Yazar önce slot seq'ini -1 yapar (slot yazılıyor), sonra kareyi, slot seq'ini ve
+en son başlıktaki seq'i yazar; okuyucu kareyi kullandıktan sonra slot seq'i
+değişmemişse (tur bindirilmemişse, yazım sürmüyorsa) geçerli sayar.
+"""
+import multiprocessing as mp
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+HEADER = 5
+
+
+class FrameRing:
+    """Paylaşımlı bellekte sabit boyutlu kare halkası (tek yazar, çok okuyucu)."""
+    def __init__(self, shm: shared_memory.SharedMemory, shape=None, slots: int = None, owner: bool = False):
+        self.shm = shm
+        self.owner = owner
+        self.header = np.ndarray((HEADER,), dtype=np.int64, buffer=shm.buf)
+        if shape is not None:
+            self.header[:] = (0, slots, *shape)
+        self.slots = int(self.header[1])
+        self.shape = tuple(int(v) for v in self.header[2:5])
+        self.slot_seq = np.ndarray((self.slots,), dtype=np.int64, buffer=shm.buf, offset=HEADER * 8)
+        self.frames = np.ndarray((self.slots, *self.shape), dtype=np.uint8, buffer=shm.buf,
+                                 offset=(HEADER + self.slots) * 8)
+
+    @staticmethod
+    def nbytes(shape, slots: int) -> int:
+        return (HEADER + slots) * 8 + slots * int(np.prod(shape))
+
+    @classmethod
+    def create(cls, shape, slots: int = 8):
+        shm = shared_memory.SharedMemory(create=True, size=cls.nbytes(shape, slots))
+        ring = cls(shm, shape, slots, owner=True)
+        ring.slot_seq[:] = -1
+        return ring
+
+    @classmethod
+    def attach(cls, name: str):
+        return cls(shared_memory.SharedMemory(name=name))
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    @property
+    def seq(self) -> int:
+        return int(self.header[0])
+
+    def write(self, frame):
+        seq = self.seq + 1
+        slot = seq % self.slots
+        self.slot_seq[slot] = -1                 # önce geçersiz kıl: eski seq'i tutan okuyucu yırtık kare görmesin
+        self.frames[slot] = frame
+        self.slot_seq[slot] = seq
+        self.header[0] = seq
+
+    def read(self, seq: int):
+        """seq numaralı karenin görünümü; üzerine yazılmışsa None."""
+        slot = seq % self.slots
+        if seq <= 0 or self.slot_seq[slot] != seq:
+            return None
+        return self.frames[slot]
+
+    def valid(self, seq: int) -> bool:
+        """Görünüm kullanıldıktan sonra: kare hâlâ aynı mı (yazar tur bindirmedi mi)?"""
+        return bool(self.slot_seq[seq % self.slots] == seq)
+
+    def wait_next(self, last_seq: int, timeout_s: float = 1.0, poll_s: float = 0.002):
+        """last_seq'ten yeni kare gelene kadar bekler: (seq, görünüm) ya da (last_seq, None)."""
+        deadline = time.monotonic() + timeout_s
+        while self.seq == last_seq:
+            if time.monotonic() >= deadline:
+                return last_seq, None
+            time.sleep(poll_s)
+        seq = self.seq
+        return seq, self.read(seq)
+
+    def close(self):
+        # numpy görünümleri bırakılmadan SharedMemory kapatılamaz
+        self.header = self.slot_seq = self.frames = None
+        try:
+            self.shm.close()
+        except BufferError:
+            pass                                 # dışarıda hâlâ bir görünüm var; süreç sonunda kapanır
+        if self.owner:
+            self.shm.unlink()
+
+
+# ---------------- Yakalama süreci ----------------
+def picamera2_source(size):
+    """Picamera2 kare üreticisi (yalnızca yakalama sürecinde import edilir)."""
+    from picamera2.picamera2 import Picamera2, libcamera
+    picam2 = Picamera2()
+    config = picam2.create_still_configuration(main={"size": size, "format": "RGB888"})
+    config["transform"] = libcamera.Transform(hflip=True, vflip=True)
+    picam2.configure(config)
+    picam2.start()
+    try:
+        while True:
+            yield picam2.capture_array()
+    finally:
+        picam2.stop()
+
+
+def capture_main(shm_name: str, size, stop, source=picamera2_source):
+    ring = FrameRing.attach(shm_name)
+    try:
+        for frame in source(size):
+            if stop.is_set():
+                break
+            ring.write(frame)
+    finally:
+        ring.close()
+
+
+class CaptureProcess:
+    """Yakalama sürecini ve paylaşımlı halkayı yönetir (spawn: Qt thread'leri kopyalanmaz)."""
+    def __init__(self, size=(320, 240), slots: int = 8, source=picamera2_source):
+        self.size = size
+        self.slots = slots
+        self.source = source
+        self.ring = None
+        self._proc = None
+        self._stop = None
+
+    def start(self) -> FrameRing:
+        w, h = self.size
+        self.ring = FrameRing.create((h, w, 3), self.slots)
+        ctx = mp.get_context("spawn")
+        self._stop = ctx.Event()
+        self._proc = ctx.Process(target=capture_main, name="camera-capture", daemon=True,
+                                 args=(self.ring.name, self.size, self._stop, self.source))
+        self._proc.start()
+        return self.ring
+
+    @property
+    def alive(self) -> bool:
+        return self._proc is not None and self._proc.is_alive()
+
+    def stop(self, timeout_s: float = 2.0):
+        if self._proc is not None:
+            self._stop.set()
+            self._proc.join(timeout_s)
+            if self._proc.is_alive():
+                self._proc.terminate()
+            self._proc = None
+        if self.ring is not None:
+            self.ring.close()
+            self.ring = None
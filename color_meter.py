@@ -0,0 +1,58 @@
+"""Kamera karesinden ROI renk ölçümü (FQ2'ye yerel alternatif).
+
+Ölçüm capture_array() tamponunun bir görünümü (view) üzerinde numpy ile
+yapılır; kare kopyalanmaz. Picamera2 "RGB888" biçimi bellekte B, G, R
+sırasıdır (bgr=True).
+"""
+import numpy as np
+
+
+def rgb_to_lab(rgb):
+    """sRGB (0..255) -> CIE L*a*b* (D65); (..., 3) dizi ya da tek üçlü."""
+    c = np.asarray(rgb, dtype=np.float64) / 255.0
+    c = np.where(c > 0.04045, ((c + 0.055) / 1.055) ** 2.4, c / 12.92)
+    m = np.array([[0.4124564, 0.3575761, 0.1804375],
+                  [0.2126729, 0.7151522, 0.0721750],
+                  [0.0193339, 0.1191920, 0.9503041]])
+    xyz = c @ m.T / np.array([0.95047, 1.0, 1.08883])
+    f = np.where(xyz > (6 / 29) ** 3, np.cbrt(xyz), xyz / (3 * (6 / 29) ** 2) + 4 / 29)
+    L = 116 * f[..., 1] - 16
+    a = 500 * (f[..., 0] - f[..., 1])
+    b = 200 * (f[..., 1] - f[..., 2])
+    return np.stack([L, a, b], axis=-1)
+
+
+class RoiColorMeter:
+    """
+    roi = (x, y, w, h) karenin oranı olarak (0..1); stat "mean" ya da "median".
+    measure(frame) -> (r, g, b) float; son değer last_rgb, Lab karşılığı lab().
+    """
+    def __init__(self, roi=(0.4, 0.4, 0.2, 0.2), stat: str = "mean", bgr: bool = True):
+        self.roi = roi
+        self.stat = stat
+        self.bgr = bgr
+        self.last_rgb = None
+        self._slices = None                      # (kare boyutu, (satır, sütun) dilimleri)
+
+    def _roi_slices(self, h: int, w: int):
+        if self._slices is None or self._slices[0] != (h, w):
+            x, y, rw, rh = self.roi
+            x0, y0 = int(x * w), int(y * h)
+            x1, y1 = max(x0 + 1, int((x + rw) * w)), max(y0 + 1, int((y + rh) * h))
+            self._slices = ((h, w), (slice(y0, min(y1, h)), slice(x0, min(x1, w))))
+        return self._slices[1]
+
+    def measure(self, frame):
+        rows, cols = self._roi_slices(frame.shape[0], frame.shape[1])
+        patch = frame[rows, cols, :3]            # görünüm; kopya yok
+        if self.stat == "median":
+            v = np.median(patch.reshape(-1, 3), axis=0)
+        else:
+            v = patch.mean(axis=(0, 1))
+        if self.bgr:
+            v = v[::-1]
+        self.last_rgb = (float(v[0]), float(v[1]), float(v[2]))
+        return self.last_rgb
+
+    def lab(self):
+        return None if self.last_rgb is None else tuple(rgb_to_lab(self.last_rgb).tolist())
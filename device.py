@@ -0,0 +1,165 @@
+"""Titrasyon donanımının komut katmanı (Qt'siz): motorlar, süreli aktüatörler, ölçümler.
+
+Bütün metotlar Future döndürür; seri bağlantı yoksa (transport=None) Future'lar
+hemen None ile tamamlanır, böylece akış donanımsız da yürür.
+"""
+import time
+from concurrent.futures import Future
+
+from motion import MotorProfile, LEGACY_PROFILE
+from serial_transport import startswith_token
+
+
+def completed(result=None) -> Future:
+    f = Future()
+    f.set_result(result)
+    return f
+
+
+def parse_measure(line, token: str):
+    """'PH: 7.01' / 'Weight: 12.3' -> float; uymazsa None."""
+    if line and startswith_token(line, token):
+        try:
+            return float(line.split(":", 1)[1])
+        except Exception:
+            pass
+    return None
+
+
+def is_error(res) -> bool:
+    return res is None or str(res).upper().startswith("ERR")
+
+
+def is_device_reply_error(res) -> bool:
+    """Kartın kendisinin döndürdüğü ERR / ERR:... (zaman aşımı / kapanış taşıyıcının ürettiğidir)."""
+    return is_error(res) and res is not None and not str(res).upper().startswith(("ERR: TIMEOUT", "ERR: CLOSED"))
+
+
+class TitrationDevice:
+    """SerialTransport üzerinde Arduino komut seti."""
+    def __init__(self, transport=None, resolution: dict = None, profiles: dict = None):
+        self.transport = transport
+        self.resolution = resolution if resolution is not None else \
+            {"motor1": 8526.32, "motor2": 8526.32, "motor3": 8526.32}
+        self.profiles = profiles if profiles is not None else \
+            {"motor1": MotorProfile(), "motor2": MotorProfile(), "motor3": MotorProfile()}
+        self.move_progress = {}          # motor no -> (toplam adım, başlangıç)
+
+    @property
+    def connected(self) -> bool:
+        return self.transport is not None and self.transport.is_open
+
+    # ---- temel ----
+    def command(self, cmd: str, wait_token_prefix: str = "DONE", timeout_s: float = 5.0) -> Future:
+        if self.transport is None:
+            return completed(None)
+        return self.transport.submit(cmd, wait_token_prefix, timeout_s)
+
+    def timed(self, name: str, duration_s: float) -> Future:
+        """<name>_DUR: cihaz pencereyi zamanlar; Future END:<name> ile tamamlanır."""
+        if self.transport is None:
+            return completed(None)
+        d = float(duration_s)
+        return self.transport.submit_timed(f"{name}_DUR {int(d*1000)}", name, d + 2)
+
+    def apply_profiles(self) -> Future:
+        """Hız profillerini karta yazar; ERR dönerse süre tahmini eski sabit hıza geçer."""
+        futs = []
+        for idx in (1, 2, 3):
+            key = f"motor{idx}"
+            f = self.command(self.profiles[key].command(idx), "OK", 2.0)
+
+            def done(f, key=key):
+                res = None if f.cancelled() else f.result()
+                if is_error(res):
+                    self.profiles[key] = LEGACY_PROFILE
+            f.add_done_callback(done)
+            futs.append(f)
+        return futs[-1]
+
+    # ---- motorlar ----
+    def steps_for(self, idx: int, ml) -> int:
+        return int(float(str(ml).replace(',', '.')) * self.resolution[f"motor{idx}"])
+
+    def ml_for(self, idx: int, steps: int) -> float:
+        return steps / self.resolution[f"motor{idx}"]
+
+    def move_ml(self, ml_values: dict) -> Future:
+        """{motor no: ml} — birden çok motoru tek MOVE_MULTI ile aynı anda sürer."""
+        return self.move_steps({idx: self.steps_for(idx, v) for idx, v in ml_values.items()})
+
+    def move_steps(self, steps: dict) -> Future:
+        """{motor no: adım} — tek eksen MOVEn, birden çoğu MOVE_MULTI olarak gider."""
+        steps = {i: n for i, n in sorted(steps.items()) if n}
+        if not steps:
+            return completed("DONE")
+        # Zaman aşımı sabit değil, adım sayısı ve eksenin hız profilinden türetilir
+        timeout = max(self.profiles[f"motor{i}"].timeout_s(n) for i, n in steps.items())
+        now = time.monotonic()
+        for i, n in steps.items():
+            self.move_progress[i] = (abs(n), now)
+        if len(steps) == 1:
+            (i, n), = steps.items()
+            return self.command(f"MOVE{i} {n}", "DONE", timeout)
+
+        result = Future()
+        args = " ".join(f"{i}:{n}" for i, n in steps.items())
+
+        def sequential(items):
+            # Eksenler sırayla; biri hata verirse kalanı sürülmez
+            (i, n), rest = items[0], items[1:]
+
+            def step_done(sf):
+                res = None if sf.cancelled() else sf.result()
+                if rest and not is_error(res) and not result.cancelled():
+                    sequential(rest)
+                elif not result.done():
+                    result.set_result(res)
+            self.command(f"MOVE{i} {n}", "DONE", self.profiles[f"motor{i}"].timeout_s(n)) \
+                .add_done_callback(step_done)
+
+        def done(f):
+            res = f.result()
+            # Eski firmware MOVE_MULTI bilmez (ERR / ERR:...): eksenleri sırayla sür.
+            # Zaman aşımında motorlar dönüyor olabilir; tekrar sürülmez, hata iletilir.
+            if is_device_reply_error(res):
+                sequential(list(steps.items()))
+            elif not result.done():
+                result.set_result(res)
+        inner = self.command(f"MOVE_MULTI {args}", "DONE", timeout)
+        inner.add_done_callback(lambda f: None if f.cancelled() else done(f))
+        # Dıştaki Future iptal edilirse henüz gönderilmemiş komut da kuyruktan düşer
+        result.add_done_callback(lambda r: r.cancelled() and inner.cancel())
+        return result
+
+    def progress_text(self, body: str):
+        """'PROGRESS:<motor>:<adım>' satırından durum metni; anlaşılmazsa None."""
+        try:
+            _, idx, done = body.split(":")
+            idx, done = int(idx), int(done)
+            total, _t0 = self.move_progress[idx]
+        except Exception:
+            return None
+        prof = self.profiles[f"motor{idx}"]
+        remaining = max(0.0, prof.eta_s(total) - prof.eta_s(done))
+        pct = 100 * done // total if total else 100
+        return f"Motor{idx}: %{pct} ({done}/{total} adım, ~{remaining:.1f} sn)"
+
+    # ---- kamera / ölçümler ----
+    def camera_trigger(self) -> Future:
+        return self.command("CAMERA_TRIG", "DONE", 3.0)
+
+    def _measure(self, cmd: str, token: str, timeout_s: float) -> Future:
+        result = Future()
+
+        def done(f):
+            if not result.cancelled():
+                result.set_result(None if f.cancelled() else parse_measure(f.result(), token))
+        self.command(cmd, token, timeout_s).add_done_callback(done)
+        return result
+
+    def measure_ph(self) -> Future:
+        return self._measure("PH_MEASURE", "PH:", 5.0)
+
+    def measure_weight(self) -> Future:
+        return self._measure("WEIGHT_MEASURE", "WEIGHT:", 5.0)
@@ -0,0 +1,161 @@
+"""Adaptif titrant dozu: döngü geçmişinden (M3, RGB) dönüm noktası tahmini."""
+import json
+import os
+from bisect import bisect_left, insort
+from collections import deque
+
+
+class DosePlanner:
+    """
+    Her döngünün (toplam M3, RGB) kaydından hedefe ilerlemeyi çıkarır:
+    0 = ilk ölçülen renk, 1 = hedef renk. Son noktalara doğru uydurup hedefe
+    ulaşılacak M3'ü tahmin eder; uzakken kalan yolun bir kısmı kadar büyük,
+    yaklaşınca formülün titrant adımı (ince doz) kadar ekler.
+    """
+    def __init__(self, fine_ml: float, target, max_factor: float = 8.0, safety: float = 0.5,
+                 fine_from: float = 0.6, fit_points: int = 4, expected_ml: float = None):
+        self.fine_ml = float(fine_ml)
+        self.target = tuple(float(v) for v in target)
+        self.max_ml = self.fine_ml * max_factor   # tek döngüde en fazla doz
+        self.safety = safety                      # tahmini kalan hacmin en fazla bu kadarı
+        self.fine_from = fine_from                # bu ilerlemeden sonra yalnızca ince doz
+        self.fit_points = fit_points
+        self.expected_ml = expected_ml            # geçmiş testlerden beklenen dönüm (varsa)
+        self.history = []                         # [(m3, (r, g, b)), ...]
+        self._last_dose = self.fine_ml
+
+    def observe(self, m3: float, rgb):
+        self.history.append((float(m3), tuple(float(v) for v in rgb)))
+
+    def progress(self, rgb):
+        """İlk renkten hedefe doğru izdüşüm (0..1, aşımda >1); hesaplanamazsa None."""
+        if not self.history:
+            return None
+        origin = self.history[0][1]
+        d = [t - o for t, o in zip(self.target, origin)]
+        dd = sum(x * x for x in d)
+        if dd < 1.0:
+            return None                           # ilk renk zaten hedefte
+        return sum((v - o) * x for v, o, x in zip(rgb, origin, d)) / dd
+
+    def predicted_endpoint(self):
+        """Son fit_points noktadan doğrusal uyum; ilerleme 1 olduğu M3 (ya da None)."""
+        pts = []
+        for m3, rgb in self.history[-self.fit_points:]:
+            p = self.progress(rgb)
+            if p is not None:
+                pts.append((m3, p))
+        if len(pts) < 2:
+            return None
+        n = len(pts)
+        mm = sum(m for m, _ in pts) / n
+        mp = sum(p for _, p in pts) / n
+        sxx = sum((m - mm) ** 2 for m, _ in pts)
+        if sxx <= 0:
+            return None
+        slope = sum((m - mm) * (p - mp) for m, p in pts) / sxx
+        if slope <= 1e-9:
+            return None                           # renk henüz tepki vermiyor
+        return max(mm + (1.0 - mp) / slope, pts[-1][0])
+
+    def next_dose(self) -> float:
+        if not self.history:
+            return self.fine_ml
+        m3, rgb = self.history[-1]
+        p = self.progress(rgb)
+        if p is None or p >= self.fine_from:
+            dose = self.fine_ml
+        else:
+            est = self.predicted_endpoint()
+            if est is None and self.expected_ml is not None and self.expected_ml > m3:
+                dose = self.safety * (self.expected_ml - m3)
+            elif est is None:
+                # Tepki yok: adımı katlayarak büyüt
+                dose = self._last_dose * 2
+            else:
+                dose = self.safety * (est - m3)
+            dose = min(max(dose, self.fine_ml), self.max_ml)
+            # İnce adımın katı: toplam M3 elle yapılan artışlarla karşılaştırılabilir kalır
+            dose = max(1, round(dose / self.fine_ml)) * self.fine_ml
+        self._last_dose = dose
+        return dose
+
+
+# ---------------- Öğrenilmiş ön yükleme ----------------
+class RollingQuantile:
+    """Son window değerin sıralı kopyası; ekleme O(log n), quantile O(1)."""
+    def __init__(self, window: int = 30, values=()):
+        self.window = window
+        self._fifo = deque()
+        self._sorted = []
+        for v in values:
+            self.add(v)
+
+    def add(self, v: float):
+        v = float(v)
+        self._fifo.append(v)
+        insort(self._sorted, v)
+        if len(self._fifo) > self.window:
+            old = self._fifo.popleft()
+            del self._sorted[bisect_left(self._sorted, old)]
+
+    def __len__(self):
+        return len(self._fifo)
+
+    def values(self):
+        return list(self._fifo)
+
+    def quantile(self, q: float):
+        if not self._sorted:
+            return None
+        pos = q * (len(self._sorted) - 1)
+        lo = int(pos)
+        hi = min(lo + 1, len(self._sorted) - 1)
+        return self._sorted[lo] + (self._sorted[hi] - self._sorted[lo]) * (pos - lo)
+
+
+class EndpointHistory:
+    """
+    Formül başına hedefe ulaşılan toplam titrant (M3) geçmişi. JSON dosyasında
+    saklanır; önerilen ön yükleme düşük bir quantile'ın güvenli bir oranıdır,
+    böylece ön yükleme tek başına dönüm noktasını aşmaz.
+    """
+    def __init__(self, path="endpoint_history.json", window: int = 30):
+        self.path = path
+        self.window = window
+        self.stats = {}                          # formül adı -> RollingQuantile
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return
+        self.stats = {name: RollingQuantile(self.window, vals) for name, vals in data.items()}
+
+    def save(self):
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump({name: st.values() for name, st in self.stats.items()}, f)
+        os.replace(tmp, self.path)
+
+    def record(self, name: str, m3: float):
+        if not name or m3 <= 0:
+            return
+        self.stats.setdefault(name, RollingQuantile(self.window)).add(m3)
+        self.save()
+
+    def count(self, name: str) -> int:
+        st = self.stats.get(name)
+        return len(st) if st else 0
+
+    def quantile(self, name: str, q: float):
+        st = self.stats.get(name)
+        return st.quantile(q) if st else None
+
+    def suggested_preload(self, name: str, fraction: float = 0.9, q: float = 0.1, min_runs: int = 3):
+        """Yeterli geçmiş varsa fraction * q-quantile (ml), yoksa None."""
+        if self.count(name) < min_runs:
+            return None
+        return fraction * self.quantile(name, q)
@@ -0,0 +1,132 @@
+"""Formül ifadeleri: bir kez ayrıştır, doğrula, derle; sonucu önbellekten kullan.
+
+İfade AST'si beyaz listeyle denetlenir: sayılar, + - * / // % **, tekli +/-,
+izin verilen adlar (M1, M2, M3 ve formül sabitleri, ör. N, F) ve birkaç
+fonksiyon (min, max, abs, sqrt, log, log10, exp). Öznitelik erişimi, indeks,
+karşılaştırma, lambda vb. reddedilir; eval() ham metne hiç uygulanmaz.
+
+Derlenen kod aynı ortamla hem tek değerde hem numpy dizilerinde çalışır:
+evaluate(M1=.., M3=..) canlı sonuç, evaluate_many(M3=dizi, ...) ise arşivdeki
+binlerce test için tek seferde hesap (sabit değişince yeniden hesaplama).
+"""
+import ast
+from functools import lru_cache
+
+import numpy as np
+
+DEFAULT_NAMES = ("M1", "M2", "M3")
+
+# CH2O hesabı (calculate_math_formul): S toplam titrant, t örnek hacmi
+CH2O_FORMULA = "(S*F*N*3)/t"
+
+_BINOPS = (ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.Pow)
+_UNARYOPS = (ast.UAdd, ast.USub)
+
+# Ad -> (argüman sayısı, fonksiyon); numpy sürümleri skalerde de çalışır
+FUNCTIONS = {
+    "min": (2, np.minimum),
+    "max": (2, np.maximum),
+    "abs": (1, np.abs),
+    "sqrt": (1, np.sqrt),
+    "log": (1, np.log),
+    "log10": (1, np.log10),
+    "exp": (1, np.exp),
+}
+
+
+class FormulaError(ValueError):
+    """Formül ayrıştırılamadı ya da izin verilmeyen öğe içeriyor."""
+
+
+class CompiledFormula:
+    """Doğrulanmış ve derlenmiş ifade; names ifadede geçen değişken adlarıdır."""
+    __slots__ = ("text", "names", "_code")
+
+    def __init__(self, text: str, names, code):
+        self.text = text
+        self.names = names
+        self._code = code
+
+    def _env(self, values: dict):
+        missing = [n for n in self.names if n not in values]
+        if missing:
+            raise FormulaError(f"Formülde tanımsız ad: {', '.join(missing)}")
+        env = {n: values[n] for n in self.names}
+        env.update((k, f) for k, (_, f) in FUNCTIONS.items())
+        return env
+
+    def evaluate(self, constants: dict = None, **values) -> float:
+        """Tek sonuç (float). Sıfıra bölme ZeroDivisionError verir."""
+        env = self._env({**(constants or {}), **{k: float(v) for k, v in values.items()}})
+        return float(eval(self._code, {"__builtins__": {}}, env))
+
+    def evaluate_many(self, constants: dict = None, **arrays) -> np.ndarray:
+        """
+        Diziler üzerinde vektörel sonuç; sıfıra bölme inf/nan verir (1/(N-2) gibi
+        formül sabitlerinden de). Yalnızca sayı yazılı alt ifadeler (ör. 1/0) Python
+        aritmetiğiyle hesaplanır ve ZeroDivisionError / OverflowError verebilir.
+        """
+        values = {k: np.asarray(v, dtype=np.float64) for k, v in arrays.items()}
+        # Sabitler de numpy skaleri: 1/(N-2) gibi alt ifadeler Python hatası değil inf verir
+        consts = {k: np.float64(v) for k, v in (constants or {}).items()}
+        env = self._env({**consts, **values})
+        n = max((v.size for v in values.values() if v.ndim), default=1)
+        with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+            out = eval(self._code, {"__builtins__": {}}, env)
+        return np.broadcast_to(np.asarray(out, dtype=np.float64), (n,)).copy()
+
+
+def _check(node, allowed: frozenset, used: set):
+    if isinstance(node, ast.Expression):
+        return _check(node.body, allowed, used)
+    if isinstance(node, ast.Constant):
+        if isinstance(node.value, bool) or not isinstance(node.value, (int, float)):
+            raise FormulaError(f"Sayı olmayan sabit: {node.value!r}")
+        return
+    if isinstance(node, ast.Name):
+        if node.id not in allowed:
+            raise FormulaError(f"İzin verilmeyen ad: {node.id}")
+        used.add(node.id)
+        return
+    if isinstance(node, ast.BinOp) and isinstance(node.op, _BINOPS):
+        _check(node.left, allowed, used)
+        _check(node.right, allowed, used)
+        return
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, _UNARYOPS):
+        _check(node.operand, allowed, used)
+        return
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in FUNCTIONS:
+        nargs, _ = FUNCTIONS[node.func.id]
+        if node.keywords or len(node.args) != nargs:
+            raise FormulaError(f"{node.func.id}() {nargs} argüman alır")
+        for a in node.args:
+            _check(a, allowed, used)
+        return
+    raise FormulaError(f"İzin verilmeyen ifade: {type(node).__name__}")
+
+
+@lru_cache(maxsize=256)
+def _compile(text: str, allowed: frozenset) -> CompiledFormula:
+    try:
+        tree = ast.parse(text.strip(), mode="eval")
+    except SyntaxError as e:
+        raise FormulaError(f"Sözdizimi hatası: {e.msg}") from None
+    used = set()
+    _check(tree, allowed, used)
+    # Tamsayı sabitler float olsun: 9**9**9 gibi ifadeler sınırsız tamsayı hesabına girmez
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Constant):
+            node.value = float(node.value)
+    return CompiledFormula(text, tuple(sorted(used)), compile(tree, "<formül>", "eval"))
+
+
+def compile_formula(text: str, names=DEFAULT_NAMES, constants=()) -> CompiledFormula:
+    """Metni derler (aynı metin + ad kümesi önbellekten döner). Boş metin FormulaError."""
+    if not text or not text.strip():
+        raise FormulaError("Formül boş")
+    allowed = frozenset(names) | frozenset(c for c in constants if str(c).isidentifier())
+    return _compile(text, allowed)
+
+
+def cache_info():
+    return _compile.cache_info()
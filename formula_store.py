@@ -0,0 +1,162 @@
+"""Formül deposu: sürümlü JSON şeması, bellekte ad indeksi, atomik kayıt.
+
+Dosya: {"schema": 4, "formulas": {ad: {alan: metin, ...}}}. Alanlar adlıdır
+(v3'teki sıra numaraları yerine); değerler kullanıcının girdiği metindir.
+İndeks dosyanın mtime/boyutu değişince yeniden okunur, yani seçim değişiminde
+disk taranmaz. Kayıt/silme kilit altında diskteki son hâli okuyup tek kaydı
+değiştirir ve geçici dosyaya yazıp os.replace ile yerine koyar; aynı anda
+iki kayıt birbirinin değişikliğini silmez, dosya yarım kalmaz.
+
+Eski formulas.txt (v3, virgülle ayrılmış) JSON dosyası yoksa ilk açılışta
+içe aktarılır; math alanı virgül içerse de bozulmaz (ilk 20 virgülden bölünür).
+"""
+import json
+import os
+import threading
+
+try:
+    import fcntl                                 # süreçler arası kilit (Linux / Pi)
+except ImportError:
+    fcntl = None
+
+SCHEMA = 4
+
+# v3 konumsal düzeni: alan adı, sıra numarası = konum
+V3_FIELDS = (
+    "name", "sample_ml", "indicator_ml", "titrant_ml", "preload_ml", "m4_ml", "m5_ml",
+    "air_s", "water_s", "valve_s", "cokme_s",
+    "target_r", "target_g", "target_b",
+    "thr_plus_r", "thr_plus_g", "thr_plus_b",
+    "thr_minus_r", "thr_minus_g", "thr_minus_b",
+    "math",
+)
+
+# MyApp.apply_formula / FormulaParams.from_fields ile aynı varsayılanlar
+DEFAULTS = {
+    "m4_ml": "0", "m5_ml": "0",
+    "air_s": "1", "water_s": "1", "valve_s": "1", "cokme_s": "1",
+    "target_r": "0", "target_g": "0", "target_b": "0",
+    "thr_plus_r": "20", "thr_plus_g": "20", "thr_plus_b": "20",
+    "thr_minus_r": "20", "thr_minus_g": "20", "thr_minus_b": "20",
+}
+
+
+def normalize(rec: dict) -> dict:
+    """Bütün alanları olan, metin değerli kayıt (eksikler varsayılan)."""
+    return {k: DEFAULTS.get(k, "") if rec.get(k) is None else str(rec[k]) for k in V3_FIELDS}
+
+
+def from_v3(parts) -> dict:
+    parts = list(parts)
+    return normalize({k: parts[i] for i, k in enumerate(V3_FIELDS) if i < len(parts)})
+
+
+def to_v3(rec: dict) -> list:
+    """FormulaParams.from_fields için konumsal liste."""
+    rec = normalize(rec)
+    return [rec[k] for k in V3_FIELDS]
+
+
+def parse_v3_line(line: str):
+    """formulas.txt satırı -> kayıt ya da None (boş satır)."""
+    line = line.strip()
+    if not line:
+        return None
+    parts = line.split(",", len(V3_FIELDS) - 1)     # math virgül içerebilir
+    return from_v3(parts) if parts[0] else None
+
+
+class FormulaStore:
+    """Ad -> kayıt; names/get bellekten, save/delete atomik dosya yazımı."""
+    def __init__(self, path: str = "formulas.json", legacy_path: str = "formulas.txt"):
+        self.path = path
+        self.legacy_path = legacy_path
+        self._index = {}                         # ad -> kayıt
+        self._stamp = None                       # (mtime_ns, boyut)
+        self._lock = threading.RLock()           # _refresh -> import_csv yeniden girer
+
+    # ---- okuma ----
+    def _file_stamp(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def _read(self) -> dict:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                doc = json.load(f)
+        except FileNotFoundError:
+            return {}
+        if doc.get("schema", 0) > SCHEMA:
+            raise ValueError(f"Formül dosyası daha yeni bir sürüm ({doc.get('schema')})")
+        return {name: normalize(rec) for name, rec in doc.get("formulas", {}).items()}
+
+    def _refresh(self):
+        stamp = self._file_stamp()
+        if stamp is None and self.legacy_path and os.path.exists(self.legacy_path):
+            self.import_csv(self.legacy_path)
+            stamp = self._file_stamp()
+        if stamp != self._stamp:
+            self._index = self._read()
+            self._stamp = stamp
+
+    def names(self):
+        with self._lock:
+            self._refresh()
+            return list(self._index)
+
+    def get(self, name: str):
+        with self._lock:
+            self._refresh()
+            rec = self._index.get(name)
+            return dict(rec) if rec is not None else None
+
+    def __contains__(self, name: str):
+        return self.get(name) is not None
+
+    def __len__(self):
+        return len(self.names())
+
+    # ---- yazma ----
+    def _locked_update(self, fn):
+        """Kilit altında: diskteki son hâli oku, fn(index) uygula, atomik yaz."""
+        with self._lock:
+            lock_f = open(f"{self.path}.lock", "a") if fcntl else None
+            try:
+                if lock_f:
+                    fcntl.flock(lock_f, fcntl.LOCK_EX)
+                index = self._read()
+                fn(index)
+                tmp = f"{self.path}.tmp{os.getpid()}"
+                with open(tmp, "w", encoding="utf-8") as f:
+                    json.dump({"schema": SCHEMA, "formulas": index}, f, ensure_ascii=False, indent=1)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp, self.path)
+                self._index, self._stamp = index, self._file_stamp()
+            finally:
+                if lock_f:
+                    lock_f.close()
+
+    def save(self, rec: dict):
+        rec = normalize(rec)
+        if not rec["name"]:
+            raise ValueError("Formül adı boş")
+        self._locked_update(lambda index: index.__setitem__(rec["name"], rec))
+
+    def delete(self, name: str):
+        self._locked_update(lambda index: index.pop(name, None))
+
+    def import_csv(self, path: str, overwrite: bool = False) -> int:
+        """v3 formulas.txt içe aktarımı; mevcut adlar overwrite=False ise korunur."""
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            recs = [r for r in map(parse_v3_line, f) if r is not None]
+
+        def merge(index):
+            for rec in recs:
+                if overwrite or rec["name"] not in index:
+                    index[rec["name"]] = rec
+        self._locked_update(merge)
+        return len(recs)
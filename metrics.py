@@ -0,0 +1,223 @@
+"""Faz ve komut süreleri: histogramlar, Prometheus metin biçimi, yerel HTTP / dosya çıkışı.
+
+Süreler monotonik saatle ölçülür. PhaseTimer TitrationEngine olaylarını dinler;
+her durum (dosing, titrant, settling, camera, wait_rgb) bir sonraki duruma
+geçilene kadar geçen süreyle kaydedilir, böylece fazlar arasındaki boşluklar da
+bir faza yazılır. SerialTransport.on_rtt ile her seri komut adıyla ölçülür.
+
+    TITRATION_METRICS_PORT=9101     -> http://127.0.0.1:9101/metrics
+    TITRATION_METRICS_FILE=x.prom   -> node_exporter textfile toplayıcısı için dosya
+"""
+import bisect
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Saniye; 10 ms (seri) .. 10 dk (uzun hareket / çökme)
+DEFAULT_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+
+class Histogram:
+    """Kümülatif kova sayıları + toplam + adet (Prometheus histogram modeli)."""
+    __slots__ = ("buckets", "counts", "sum", "count", "last")
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)      # son kova +Inf
+        self.sum = 0.0
+        self.count = 0
+        self.last = None
+
+    def observe(self, v: float):
+        self.counts[bisect.bisect_left(self.buckets, v)] += 1
+        self.sum += v
+        self.count += 1
+        self.last = v
+
+    def cumulative(self):
+        out, acc = [], 0
+        for c in self.counts:
+            acc += c
+            out.append(acc)
+        return out
+
+    def quantile(self, q: float):
+        """Kova sınırlarından kaba yüzdelik (üst sınır)."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        for le, c in zip(self.buckets + (float("inf"),), self.cumulative()):
+            if c >= rank:
+                return le
+        return None
+
+
+def _escape(v) -> str:
+    return str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in sorted(labels.items())) + "}"
+
+
+def _num(v: float) -> str:
+    return "+Inf" if v == float("inf") else f"{v:g}"
+
+
+class Metrics:
+    """İsim + etiket -> Histogram / sayaç. Her thread'den güvenle çağrılır."""
+    def __init__(self, prefix: str = "titration"):
+        self.prefix = prefix
+        self._hists = {}                         # (ad, etiketler) -> Histogram
+        self._counters = {}
+        self._help = {}
+        self._lock = threading.Lock()
+        self._server = None
+
+    @staticmethod
+    def _key(name: str, labels: dict):
+        return name, tuple(sorted(labels.items()))
+
+    def describe(self, name: str, text: str):
+        self._help[name] = text
+
+    def observe(self, name: str, seconds: float, **labels):
+        with self._lock:
+            h = self._hists.get(self._key(name, labels))
+            if h is None:
+                h = self._hists[self._key(name, labels)] = Histogram()
+            h.observe(seconds)
+
+    def inc(self, name: str, n: int = 1, **labels):
+        with self._lock:
+            k = self._key(name, labels)
+            self._counters[k] = self._counters.get(k, 0) + n
+
+    def snapshot(self):
+        """[(ad, etiketler, adet, ortalama, p95, son)] — geliştirici sekmesi için."""
+        with self._lock:
+            rows = [(name, dict(lbl), h.count, h.sum / h.count if h.count else 0.0,
+                     h.quantile(0.95), h.last) for (name, lbl), h in self._hists.items()]
+        return sorted(rows, key=lambda r: (r[0], sorted(r[1].items())))
+
+    def summary_text(self) -> str:
+        lines = [f"{'metrik':38s} {'adet':>6s} {'ort':>9s} {'p95<=':>7s} {'son':>9s}"]
+        for name, lbl, n, mean, p95, last in self.snapshot():
+            label = name + ("[" + ",".join(str(v) for _, v in sorted(lbl.items())) + "]" if lbl else "")
+            lines.append(f"{label:38s} {n:6d} {mean:9.3f} {_num(p95):>7s} {last:9.3f}")
+        with self._lock:
+            counters = sorted(self._counters.items())
+        for (name, lbl), v in counters:
+            label = name + ("[" + ",".join(str(x) for _, x in lbl) + "]" if lbl else "")
+            lines.append(f"{label:38s} {v:6d}")
+        return "\n".join(lines)
+
+    def prometheus_text(self) -> str:
+        with self._lock:
+            hists = sorted(self._hists.items())
+            counters = sorted(self._counters.items())
+            hist_state = [(k, h.buckets, h.cumulative(), h.sum, h.count) for k, h in hists]
+        out, seen = [], set()
+        for (name, lbl), buckets, cum, total, count in hist_state:
+            full = f"{self.prefix}_{name}"
+            if full not in seen:
+                seen.add(full)
+                if name in self._help:
+                    out.append(f"# HELP {full} {self._help[name]}")
+                out.append(f"# TYPE {full} histogram")
+            labels = dict(lbl)
+            for le, c in zip(buckets + (float("inf"),), cum):
+                out.append(f"{full}_bucket{_labels({**labels, 'le': _num(le)})} {c}")
+            out.append(f"{full}_sum{_labels(labels)} {total:.6f}")
+            out.append(f"{full}_count{_labels(labels)} {count}")
+        for (name, lbl), v in counters:
+            full = f"{self.prefix}_{name}_total"
+            if full not in seen:
+                seen.add(full)
+                if name in self._help:
+                    out.append(f"# HELP {full} {self._help[name]}")
+                out.append(f"# TYPE {full} counter")
+            out.append(f"{full}{_labels(dict(lbl))} {v}")
+        return "\n".join(out) + "\n"
+
+    def write_textfile(self, path: str):
+        """Prometheus textfile toplayıcısı için atomik yazım."""
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as f:
+            f.write(self.prometheus_text())
+        os.replace(tmp, path)
+
+    def serve(self, port: int, host: str = "127.0.0.1"):
+        """GET /metrics için arka planda HTTP sunucusu."""
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = metrics.prometheus_text().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self._server.serve_forever, name="metrics-http", daemon=True).start()
+        return self._server.server_address
+
+    def close(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+# ---------------- Motor fazları ----------------
+class PhaseTimer:
+    """TitrationEngine dinleyicisi: durum, döngü ve test süreleri."""
+    IDLE_STATES = ("idle", "done", "aborted")
+
+    def __init__(self, metrics: Metrics, clock=time.monotonic):
+        self.metrics = metrics
+        self.clock = clock
+        self._state = None
+        self._since = None
+        self._cycle_t = None
+        self._test_t = None
+        metrics.describe("phase_seconds", "Titrasyon durumunda geçen süre")
+        metrics.describe("cycle_seconds", "Bir titrant döngüsünün süresi")
+        metrics.describe("test_seconds", "Başlatmadan bitişe test süresi")
+        metrics.describe("tests", "Biten testler (sonuca göre)")
+
+    def __call__(self, event: str, data: dict):
+        now = self.clock()
+        if event == "state":
+            if self._state is not None and self._state not in self.IDLE_STATES:
+                self.metrics.observe("phase_seconds", now - self._since, phase=self._state)
+            self._state, self._since = data["state"], now
+            if self._state == "aborted":
+                self._end_test(now, "aborted")       # hata ya da elle iptal
+            elif self._test_t is None and self._state not in self.IDLE_STATES:
+                self._test_t = now
+        elif event == "cycle":
+            if self._cycle_t is not None:
+                self.metrics.observe("cycle_seconds", now - self._cycle_t)
+            self._cycle_t = now
+        elif event == "completed":
+            self._end_test(now, data.get("reason", "target"))
+
+    def _end_test(self, now: float, result: str):
+        if self._cycle_t is not None and result != "aborted":
+            self.metrics.observe("cycle_seconds", now - self._cycle_t)
+        if self._test_t is not None:
+            self.metrics.observe("test_seconds", now - self._test_t, result=result)
+        self.metrics.inc("tests", result=result)
+        self._cycle_t = self._test_t = None
@@ -0,0 +1,39 @@
+"""Step motor hız profili ve süre tahmini (firmware'deki runMoves ile aynı model)."""
+import math
+
+
+class MotorProfile:
+    """Trapez profil: start_rate'den accel ile max_rate'e çıkar, sonda simetrik yavaşlar."""
+    __slots__ = ("max_rate", "accel", "start_rate")
+
+    def __init__(self, max_rate: float = 1250.0, accel: float = 2500.0, start_rate: float = 400.0):
+        self.max_rate = float(max_rate)        # adım/sn
+        self.accel = float(accel)              # adım/sn²
+        self.start_rate = min(float(start_rate), self.max_rate)
+
+    def command(self, idx: int) -> str:
+        """Firmware'e gönderilecek SET_RATE komutu."""
+        return f"SET_RATE {idx} {self.max_rate:g} {self.accel:g} {self.start_rate:g}"
+
+    def eta_s(self, steps: int) -> float:
+        """steps adımlık hareketin tahmini süresi (sn)."""
+        n = abs(int(steps))
+        if n == 0:
+            return 0.0
+        v0, vmax, a = self.start_rate, self.max_rate, self.accel
+        if a <= 0 or v0 >= vmax:
+            return n / vmax
+        ramp_steps = (vmax * vmax - v0 * v0) / (2 * a)
+        if 2 * ramp_steps >= n:
+            # Üçgen profil: tepe hıza ulaşmadan yavaşlamaya başlar
+            v_peak = math.sqrt(v0 * v0 + a * n)
+            return 2 * (v_peak - v0) / a
+        return 2 * (vmax - v0) / a + (n - 2 * ramp_steps) / vmax
+
+    def timeout_s(self, steps: int, margin: float = 1.25, slack_s: float = 2.0) -> float:
+        """Hareket için seri zaman aşımı: tahmini süre * margin + slack."""
+        return self.eta_s(steps) * margin + slack_s
+
+
+# Eski firmware: sabit 800 µs yüksek / 800 µs düşük darbe (625 adım/sn, rampasız)
+LEGACY_PROFILE = MotorProfile(max_rate=625.0, accel=0.0, start_rate=625.0)
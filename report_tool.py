@@ -0,0 +1,291 @@
+"""Test arşivi üzerinde sorgu, istatistik ve dışa aktarım.
+
+    python report_tool.py import-legacy reports/           # eski report.txt satırları
+    python report_tool.py stats --formula X --days 30       # ortalama, std, kontrol sınırları
+    python report_tool.py stats --by formula --since 2026-01-01
+    python report_tool.py stats --recompute -c N=1.02       # formül sonucu yeni sabitle
+    python report_tool.py export runs.csv --since 2026-09-01
+    python report_tool.py export cycles.parquet --cycles    # pyarrow varsa
+
+Filtreler SQL'de uygulanır (runs_formula / runs_started indeksleri), kolonlar
+numpy dizisine alınıp toplu hesaplanır. Dışa aktarım imleçten parça parça
+okunur; bellek kullanımı arşiv boyutundan bağımsızdır.
+"""
+import argparse
+import csv
+import datetime
+import os
+import re
+import sys
+
+import numpy as np
+
+from formula_expr import FormulaError, compile_formula
+from run_archive import COLUMNS, PHASES, TRACE, connect
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:                              # Pi'de isteğe bağlı
+    pa = pq = None
+
+# Shewhart bireysel değer kartı: sigma = ortalama hareketli aralık / d2 (n=2)
+D2 = 1.128
+STAT_FIELDS = ("m3_ml", "math_result", "duration_s", "cycles")
+EXPORT_COLUMNS = ("id",) + tuple(c for c in COLUMNS if c != "trace")
+CYCLE_COLUMNS = ("run_id", "cycle", "t_s", "m3_ml", "r", "g", "b", "ph") + tuple(f"{p}_s" for p in PHASES)
+CHUNK = 2000
+
+LEGACY_LINE = re.compile(r"^(\d{4}-\d\d-\d\d \d\d:\d\d:\d\d),\s*RGB:\s*\((-?\d+),\s*(-?\d+),\s*(-?\d+)\)")
+
+
+# ---------------- Eski raporlar ----------------
+def parse_legacy(path: str):
+    """report.txt -> [(zaman, r, g, b)]; biçime uymayan satırlar atlanır."""
+    out = []
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        for line in f:
+            m = LEGACY_LINE.match(line)
+            if m:
+                out.append((m.group(1), int(m.group(2)), int(m.group(3)), int(m.group(4))))
+    return out
+
+
+def import_legacy(conn, root: str) -> int:
+    """reports/<tarih>/report.txt satırlarını result='legacy' olarak ekler (tekrar eklemez)."""
+    seen = {tuple(r) for r in conn.execute(
+        "SELECT started_at, r, g, b FROM runs WHERE result = 'legacy'")}
+    rows = []
+    for dirpath, _dirs, files in sorted(os.walk(root)):
+        if "report.txt" in files:
+            for rec in parse_legacy(os.path.join(dirpath, "report.txt")):
+                if rec not in seen:
+                    seen.add(rec)
+                    rows.append(rec)
+    with conn:
+        conn.executemany("INSERT INTO runs (started_at, result, r, g, b) VALUES (?, 'legacy', ?, ?, ?)", rows)
+    return len(rows)
+
+
+# ---------------- Filtre ----------------
+def where_clause(formula=None, since=None, until=None, days=None, results=None):
+    """(sql, parametreler); until gün dahil."""
+    conds, params = [], []
+    if days is not None:
+        since = (datetime.date.today() - datetime.timedelta(days=days)).isoformat()
+    if formula:
+        conds.append("formula = ?")
+        params.append(formula)
+    if since:
+        conds.append("started_at >= ?")
+        params.append(since)
+    if until:
+        end = datetime.date.fromisoformat(until) + datetime.timedelta(days=1)
+        conds.append("started_at < ?")
+        params.append(end.isoformat())
+    if results:
+        conds.append(f"result IN ({', '.join('?' * len(results))})")
+        params.extend(results)
+    return (" AND ".join(conds), params)
+
+
+def _select(conn, cols, where, params, order="started_at"):
+    sql = f"SELECT {', '.join(cols)} FROM runs {'WHERE ' + where if where else ''} ORDER BY {order}"
+    return conn.execute(sql, params)
+
+
+# ---------------- İstatistik ----------------
+TEXT_COLUMNS = ("formula", "math_formula")
+
+
+def load_columns(conn, where: str, params, fields=STAT_FIELDS):
+    """Filtreye uyan satırlar -> {kolon: dizi}; sayısal kolonlarda NULL = nan."""
+    cols = tuple(dict.fromkeys(tuple(fields) + ("m3_ml", "sample_ml", "indicator_ml") + TEXT_COLUMNS))
+    rows = _select(conn, cols, where, params, order="formula, started_at").fetchall()
+    out = {}
+    for i, c in enumerate(cols):
+        if c in TEXT_COLUMNS:
+            out[c] = np.array([r[i] or "" for r in rows], dtype=object)
+        else:
+            out[c] = np.array([np.nan if r[i] is None else r[i] for r in rows], dtype=np.float64)
+    return out
+
+
+def recompute(data: dict, constants: dict):
+    """math_result'u yeni sabitlerle yeniden hesaplar (formül metni başına tek vektörel çağrı)."""
+    result = np.full(len(data["m3_ml"]), np.nan)
+    for text in set(data["math_formula"]):
+        if not text:
+            continue
+        sel = data["math_formula"] == text
+        try:
+            expr = compile_formula(text, constants=constants)
+            result[sel] = expr.evaluate_many(constants, M1=data["sample_ml"][sel],
+                                             M2=data["indicator_ml"][sel], M3=data["m3_ml"][sel])
+        except (FormulaError, ArithmeticError) as e:
+            print(f"Formül atlandı ({text}): {e}", file=sys.stderr)
+    data["math_result"] = result
+
+
+def describe(x: np.ndarray) -> dict:
+    """Adet, ortalama, std, min/max ve bireysel kontrol kartı sınırları (nan'lar hariç)."""
+    x = x[np.isfinite(x)]
+    n = x.size
+    if not n:
+        return {"n": 0}
+    mean = float(x.mean())
+    std = float(x.std(ddof=1)) if n > 1 else 0.0
+    sigma = float(np.abs(np.diff(x)).mean() / D2) if n > 1 else 0.0
+    return {"n": n, "mean": mean, "std": std, "min": float(x.min()), "max": float(x.max()),
+            "lcl": mean - 3 * sigma, "ucl": mean + 3 * sigma,
+            "out_of_control": int(((x < mean - 3 * sigma) | (x > mean + 3 * sigma)).sum()) if sigma else 0}
+
+
+def stats(data: dict, fields=STAT_FIELDS, by_formula: bool = False):
+    """[(grup, alan, describe())]; satırlar formüle göre sıralı geldiğinden gruplar dilimdir."""
+    groups = [("(hepsi)", slice(None))]
+    if by_formula and len(data["formula"]):
+        names = data["formula"]
+        starts = np.flatnonzero(np.r_[True, names[1:] != names[:-1]])
+        ends = np.r_[starts[1:], len(names)]
+        groups = [(names[s] or "(adsız)", slice(s, e)) for s, e in zip(starts, ends)]
+    return [(g, f, describe(data[f][sl])) for g, sl in groups for f in fields]
+
+
+def format_stats(rows) -> str:
+    lines = [f"{'grup':16s} {'alan':12s} {'n':>6s} {'ort':>10s} {'std':>9s} {'min':>9s} "
+             f"{'max':>9s} {'LCL':>9s} {'UCL':>9s} {'dışarı':>6s}"]
+    for g, f, d in rows:
+        if not d["n"]:
+            lines.append(f"{g[:16]:16s} {f:12s} {0:6d}")
+            continue
+        lines.append(f"{g[:16]:16s} {f:12s} {d['n']:6d} {d['mean']:10.4f} {d['std']:9.4f} "
+                     f"{d['min']:9.4f} {d['max']:9.4f} {d['lcl']:9.4f} {d['ucl']:9.4f} {d['out_of_control']:6d}")
+    return "\n".join(lines)
+
+
+# ---------------- Dışa aktarım ----------------
+def iter_chunks(conn, where: str, params, cycles: bool = False):
+    """CHUNK'lık satır listeleri; cycles=True ise döngü izi satırlara açılır."""
+    cols = ("id", "trace") if cycles else EXPORT_COLUMNS
+    cur = _select(conn, cols, where, params)
+    while True:
+        rows = cur.fetchmany(CHUNK)
+        if not rows:
+            return
+        if not cycles:
+            yield rows
+            continue
+        out = []
+        for run_id, blob in rows:
+            for i, (t, m3, r, g, b, ph, *phases) in enumerate(TRACE.iter_unpack(blob or b""), 1):
+                rgb = (None, None, None) if r < 0 else (r, g, b)
+                out.append((run_id, i, t, m3, *rgb, None if np.isnan(ph) else ph, *phases))
+        if out:
+            yield out
+
+
+def export(conn, path: str, where: str, params, cycles: bool = False, fmt: str = None) -> int:
+    fmt = fmt or ("parquet" if path.endswith(".parquet") else "csv")
+    cols = CYCLE_COLUMNS if cycles else EXPORT_COLUMNS
+    n = 0
+    if fmt == "csv":
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            w = csv.writer(f)
+            w.writerow(cols)
+            for rows in iter_chunks(conn, where, params, cycles):
+                w.writerows(rows)
+                n += len(rows)
+        return n
+    if fmt != "parquet":
+        raise ValueError(f"Bilinmeyen biçim: {fmt}")
+    if pq is None:
+        raise RuntimeError("Parquet için pyarrow gerekli (pip install pyarrow); CSV kullanın")
+    writer = None
+    try:
+        for rows in iter_chunks(conn, where, params, cycles):
+            table = pa.Table.from_pylist([dict(zip(cols, r)) for r in rows])
+            if writer is None:
+                writer = pq.ParquetWriter(path, table.schema)
+            writer.write_table(table.cast(writer.schema))
+            n += len(rows)
+    finally:
+        if writer is not None:
+            writer.close()
+    return n
+
+
+# ---------------- CLI ----------------
+def _constant(item: str):
+    """argparse type=: "AD=DEĞER" -> (ad, değer); hata argparse mesajı olarak basılır."""
+    k, sep, v = item.partition("=")
+    try:
+        if not sep or not k.strip():
+            raise ValueError
+        return k.strip(), float(v)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Sabit AD=DEĞER olmalı: {item}") from None
+
+
+def _date(text: str) -> str:
+    """argparse type=: YYYY-MM-DD; geçersiz tarih argparse mesajı olarak basılır."""
+    try:
+        return datetime.date.fromisoformat(text).isoformat()
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Tarih YYYY-MM-DD olmalı: {text}") from None
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Test arşivi sorgu / dışa aktarım")
+    data_dir = os.environ.get("TITRATION_DATA_DIR") or os.path.dirname(os.path.abspath(__file__))
+    ap.add_argument("--db", default=os.environ.get("TITRATION_RUN_ARCHIVE", os.path.join(data_dir, "runs.sqlite")))
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    p = sub.add_parser("import-legacy", help="reports/*/report.txt satırlarını arşive ekle")
+    p.add_argument("root", nargs="?", default="reports")
+
+    filters = argparse.ArgumentParser(add_help=False)
+    filters.add_argument("--formula")
+    filters.add_argument("--since", type=_date, help="YYYY-MM-DD")
+    filters.add_argument("--until", type=_date, help="YYYY-MM-DD (dahil)")
+    filters.add_argument("--days", type=int, help="son N gün")
+    filters.add_argument("--result", action="append", help="target, manual, aborted, legacy ...")
+
+    p = sub.add_parser("stats", parents=[filters], help="ortalama, std, kontrol kartı sınırları")
+    p.add_argument("--by", choices=("formula",), help="formüle göre grupla")
+    p.add_argument("--field", action="append", choices=STAT_FIELDS)
+    p.add_argument("--recompute", action="store_true", help="math_result'u yeniden hesapla")
+    p.add_argument("-c", "--constant", action="append", type=_constant, help="formül sabiti AD=DEĞER")
+
+    p = sub.add_parser("export", parents=[filters], help="CSV / Parquet dışa aktarım")
+    p.add_argument("out")
+    p.add_argument("--cycles", action="store_true", help="döngü başına satır")
+    p.add_argument("--format", choices=("csv", "parquet"))
+    a = ap.parse_args(argv)
+
+    conn = connect(a.db)
+    try:
+        if a.cmd == "import-legacy":
+            print(f"{import_legacy(conn, a.root)} satır eklendi")
+            return
+        where, params = where_clause(a.formula, a.since, a.until, a.days, a.result)
+        if a.cmd == "stats":
+            # Varsayılan: tamamlanmış testler (elle / eski RGB kayıtlarında hacim yok)
+            if not a.result:
+                where, params = where_clause(a.formula, a.since, a.until, a.days, ["target"])
+            data = load_columns(conn, where, params)
+            if a.recompute:
+                recompute(data, {"N": 1, "F": 1, **dict(a.constant or ())})
+            print(format_stats(stats(data, a.field or STAT_FIELDS, a.by == "formula")))
+        else:
+            try:
+                n = export(conn, a.out, where, params, a.cycles, a.format)
+            except (RuntimeError, ValueError) as e:
+                ap.exit(1, f"{e}\n")
+            print(f"{n} satır -> {a.out}", file=sys.stderr)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
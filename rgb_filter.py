@@ -0,0 +1,60 @@
+"""RGB ölçüm serisi için dönüm noktası sınıflandırıcı (numpy).
+
+EndpointClassifier ölçüm başına O(1) karar verir: aykırı değeri atar, medyan +
+EMA ile yumuşatır ve hedef kutusunda art arda confirm_n filtrelenmiş ölçüm
+görmeden testi bitirmez.
+"""
+import numpy as np
+
+
+# ---------------- Dönüm noktası sınıflandırıcı ----------------
+class EndpointClassifier:
+    """Ölçüm başına: "in" (filtreli değer kutuda), "out" ya da "outlier" (yok sayıldı)."""
+    IN, OUT, OUTLIER = "in", "out", "outlier"
+
+    def __init__(self, lo, hi, confirm_n: int = 3, median_k: int = 5, alpha: float = 0.5,
+                 outlier: float = 25.0, max_rejects: int = 3):
+        self.lo = np.asarray(lo, dtype=np.float64)
+        self.hi = np.asarray(hi, dtype=np.float64)
+        self.confirm_n = max(1, confirm_n)
+        self.median_k = median_k
+        self.alpha = alpha
+        self.outlier = outlier
+        # Art arda bu kadar aykırı gelirse tekil hata değil gerçek seviye değişimidir
+        self.max_rejects = max(1, max_rejects)
+        self._buf = np.empty((median_k, 3), dtype=np.float64)
+        self.reset()
+
+    def reset(self):
+        """Yeni titrant dozundan sonra renk değişir: geçmiş sıfırlanır."""
+        self._n = 0
+        self._ema = None
+        self.value = None                         # son filtreli değer (int r, g, b)
+        self.consecutive = 0
+        self.rejected = 0
+        self._streak = 0                          # art arda atılan ölçüm
+
+    @property
+    def confirmed(self) -> bool:
+        return self.consecutive >= self.confirm_n
+
+    def add(self, rgb) -> str:
+        x = np.asarray(rgb, dtype=np.float64)
+        filled = min(self._n, self.median_k)
+        if filled >= 3 and np.any(np.abs(x - np.median(self._buf[:filled], axis=0)) > self.outlier):
+            self._streak += 1
+            if self._streak <= self.max_rejects:
+                self.rejected += 1
+                return self.OUTLIER
+            # Seviye değişti (ör. dönüm noktası rengi): tampon yeni değerle baştan kurulur
+            self._n = 0
+            self._ema = None
+        self._streak = 0
+        self._buf[self._n % self.median_k] = x
+        self._n += 1
+        med = np.median(self._buf[:min(self._n, self.median_k)], axis=0)
+        self._ema = med if self._ema is None else self._ema + self.alpha * (med - self._ema)
+        self.value = tuple(int(v) for v in np.round(self._ema))
+        inside = bool(np.all((self.lo <= self._ema) & (self._ema <= self.hi)))
+        self.consecutive = self.consecutive + 1 if inside else 0
+        return self.IN if inside else self.OUT
@@ -0,0 +1,130 @@
+"""FQ2 RGB akışı: TCP parçalarından tam kayıt çıkaran framer ve sayısal halka tampon.
+
+FQ2 her ölçümü ya üç satır (R, G, B) ya da tek satırda ayraçlı üç sayı olarak
+yollar; recv() sınırları kayıt sınırlarıyla örtüşmez. Fq2Framer baytları
+biriktirip yalnızca tamamlanmış kayıtları döndürür, RgbRing de bunları zaman
+damgasıyla sabit boyutlu numpy dizilerinde tutar (okuyucular sıra numarasıyla
+kaldıkları yerden devam eder, hiçbir ölçüm atlanmaz).
+
+Üç satırlı kipte bir satır kaybolursa kanallar kayar (G, B, sonraki R). Bunu
+önlemek için kayıt sınırı sayılan her durumda yarım kayıt atılır: akışın
+susması (flush) ve boş satır. CRLF tek satır sonudur, boş satır sayılmaz.
+"""
+import re
+import threading
+
+import numpy as np
+
+NUM_RE = re.compile(rb'-?\d+(?:\.\d+)?')
+
+
+# ---------------- Framer ----------------
+class Fq2Framer:
+    """Artımlı ayrıştırıcı: feed(bytes) -> [(r, g, b), ...] (yalnızca tam kayıtlar)."""
+    def __init__(self, max_line: int = 256):
+        self.max_line = max_line
+        self._buf = bytearray()
+        self._pending = []                       # tek sayılı satırlardan biriken kanallar
+        self._skip_lf = False                    # son satır \r ile bitti: ardından gelen \n CRLF'nin parçası
+        self.bad_lines = 0
+
+    def feed(self, data: bytes):
+        self._buf += data
+        out = []
+        while True:
+            if self._skip_lf and self._buf[:1] == b"\n":
+                del self._buf[0]
+            i = self._next_eol()
+            if i < 0:
+                break
+            self._skip_lf = self._buf[i] == 0x0D
+            line = bytes(self._buf[:i])
+            del self._buf[:i + 1]
+            self._line(line, out)
+        if len(self._buf) > self.max_line:
+            # Satır sonu gelmeyen çöp: at, senkronu bir sonraki satırda yakala
+            self._buf.clear()
+            self._pending.clear()
+            self.bad_lines += 1
+        return out
+
+    def flush(self):
+        """Satır sonu beklemeden tampondakini son satır say (akış sustuğunda); yarım kayıt atılır."""
+        out = []
+        if self._buf:
+            line = bytes(self._buf)
+            self._buf.clear()
+            self._line(line, out)
+        self._resync()
+        return out
+
+    def _resync(self):
+        # Kayıt sınırı: eksik kalan kanallar bir sonraki kayda taşınmaz
+        if self._pending:
+            self._pending.clear()
+            self.bad_lines += 1
+
+    def _next_eol(self) -> int:
+        i, j = self._buf.find(b"\n"), self._buf.find(b"\r")
+        if i < 0:
+            return j
+        return i if j < 0 else min(i, j)
+
+    def _line(self, line: bytes, out: list):
+        line = line.strip()
+        if not line:
+            self._resync()
+            return
+        nums = NUM_RE.findall(line)
+        if len(nums) >= 3:
+            self._pending.clear()
+            out.append(tuple(float(n) for n in nums[:3]))
+        elif len(nums) == 1:
+            self._pending.append(float(nums[0]))
+            if len(self._pending) == 3:
+                out.append(tuple(self._pending))
+                self._pending.clear()
+        else:
+            self._pending.clear()
+            self.bad_lines += 1
+
+
+# ---------------- Halka tampon ----------------
+class RgbRing:
+    """
+    Sabit kapasiteli (t, R, G, B) tamponu. seq o ana kadar yazılan toplam kayıt
+    sayısıdır; since(seq) okuyucunun kaçırdığı kayıtları (kapasite kadarını) verir.
+    Yazar TCP (ya da kamera) thread'i; UI since() ile yeni kayıtların hepsini alır,
+    sırayla motora verir, sonuncuyu gösterir. Erişim kilitle korunur.
+    """
+    def __init__(self, capacity: int = 4096):
+        self.capacity = capacity
+        self.t = np.zeros(capacity, dtype=np.float64)
+        self.rgb = np.zeros((capacity, 3), dtype=np.float32)
+        self.seq = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return min(self.seq, self.capacity)
+
+    def push(self, t: float, rgb):
+        with self._lock:
+            i = self.seq % self.capacity
+            self.t[i] = t
+            self.rgb[i] = rgb
+            self.seq += 1
+
+    def extend(self, t: float, records):
+        with self._lock:
+            for rgb in records:
+                i = self.seq % self.capacity
+                self.t[i] = t
+                self.rgb[i] = rgb
+                self.seq += 1
+
+    def since(self, seq: int):
+        """seq'ten sonraki kayıtlar: (yeni seq, t[], rgb[], taşma nedeniyle kaybolan)."""
+        with self._lock:
+            start = max(seq, self.seq - self.capacity)
+            idx = np.arange(start, self.seq) % self.capacity
+            return self.seq, self.t[idx], self.rgb[idx], start - seq
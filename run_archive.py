@@ -0,0 +1,245 @@
+"""Test arşivi: her test için bir satır + sıkıştırılmış döngü izi (SQLite).
+
+runs tablosu formülü, hacimleri, döngü sayısını, sonucu, süreleri ve formül
+sonucunu tutar; trace kolonu döngü başına sabit boyutlu kayıtlardır (TRACE:
+başlangıçtan saniye, kümülatif M3, son RGB, pH, faz süreleri). Yazım ayrı bir
+thread'de yapılır: add() yalnızca kuyruğa koyar, yazıcı birikenleri tek
+işlemde (executemany + commit) yazar; UI ve kontrol döngüsü diske beklemez.
+
+RunRecorder TitrationEngine dinleyicisidir; testi olaylardan kurar ve bitince
+(ya da iptal edilince) arşive verir.
+"""
+import datetime
+import math
+import queue
+import sqlite3
+import struct
+import threading
+import time
+
+from formula_expr import FormulaError, compile_formula
+
+# Döngü içi fazlar (dosing yalnızca testin başında; satırda dosing_s)
+PHASES = ("titrant", "settling", "camera", "wait_rgb")
+# t_s, m3_ml, r, g, b (-1 = yok), ph (nan = yok), faz süreleri
+TRACE = struct.Struct("<ff3hf" + "f" * len(PHASES))
+
+COLUMNS = (
+    "started_at", "formula", "result", "error",
+    "sample_ml", "indicator_ml", "titrant_ml", "preload_ml",
+    "m3_ml", "cycles", "duration_s", "dosing_s",
+    "r", "g", "b", "ph", "math_formula", "math_result", "trace",
+)
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    started_at TEXT NOT NULL,
+    formula TEXT, result TEXT, error TEXT,
+    sample_ml REAL, indicator_ml REAL, titrant_ml REAL, preload_ml REAL,
+    m3_ml REAL, cycles INTEGER, duration_s REAL, dosing_s REAL,
+    r INTEGER, g INTEGER, b INTEGER, ph REAL,
+    math_formula TEXT, math_result REAL,
+    trace BLOB
+);
+CREATE INDEX IF NOT EXISTS runs_started ON runs(started_at);
+CREATE INDEX IF NOT EXISTS runs_formula ON runs(formula, started_at);
+PRAGMA user_version = 1;
+"""
+
+_INSERT = f"INSERT INTO runs ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})"
+
+
+# ---------------- İz ----------------
+def pack_trace(cycles) -> bytes:
+    """[{t, m3, rgb, ph, phases: {faz: sn}}] -> bayt (döngü başına TRACE.size)."""
+    out = bytearray()
+    for c in cycles:
+        r, g, b = c.get("rgb") or (-1, -1, -1)
+        ph = c.get("ph")
+        phases = c.get("phases", {})
+        out += TRACE.pack(c["t"], c["m3"], r, g, b, math.nan if ph is None else ph,
+                          *(phases.get(p, 0.0) for p in PHASES))
+    return bytes(out)
+
+
+def unpack_trace(blob: bytes):
+    out = []
+    for t, m3, r, g, b, ph, *phases in TRACE.iter_unpack(blob or b""):
+        out.append({"t": t, "m3": m3, "rgb": None if r < 0 else (r, g, b),
+                    "ph": None if math.isnan(ph) else ph, "phases": dict(zip(PHASES, phases))})
+    return out
+
+
+def connect(path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(path, timeout=10)
+    conn.execute("PRAGMA journal_mode=WAL")      # okuyucular yazıcıyı beklemez
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+# ---------------- Arşiv ----------------
+class RunArchive:
+    """Tamponlu SQLite yazıcısı; add() bloklamaz, flush() yazılana kadar bekler."""
+    def __init__(self, path: str = "runs.sqlite", batch: int = 64, flush_s: float = 1.0):
+        self.path = path
+        self.batch = batch
+        self.flush_s = flush_s
+        self.written = 0
+        self.errors = 0
+        self._q = queue.Queue()
+        connect(path).close()                    # şema hatası açılışta görülsün
+        self._thread = threading.Thread(target=self._run, name="run-archive", daemon=True)
+        self._thread.start()
+
+    def add(self, run: dict):
+        self._q.put(tuple(run.get(k) for k in COLUMNS))
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        done = threading.Event()
+        self._q.put(done)
+        return done.wait(timeout)
+
+    def close(self):
+        if self._thread.is_alive():
+            self._q.put(None)
+            self._thread.join(5.0)
+
+    def _run(self):
+        conn = connect(self.path)
+        try:
+            while True:
+                item = self._q.get()
+                rows, marks, stop = [], [], False
+                deadline = time.monotonic() + self.flush_s
+                # İlk kayıttan sonra flush_s boyunca (ya da batch dolana kadar) biriktir
+                while True:
+                    if item is None:
+                        stop = True
+                    elif isinstance(item, threading.Event):
+                        marks.append(item)
+                    else:
+                        rows.append(item)
+                    if stop or marks or len(rows) >= self.batch:
+                        break
+                    try:
+                        item = self._q.get(timeout=max(0.0, deadline - time.monotonic()))
+                    except queue.Empty:
+                        break
+                if rows:
+                    try:
+                        with conn:
+                            conn.executemany(_INSERT, rows)
+                        self.written += len(rows)
+                    except sqlite3.Error as e:
+                        self.errors += len(rows)
+                        print("Arşiv yazılamadı:", e)
+                for m in marks:
+                    m.set()
+                if stop:
+                    return
+        finally:
+            conn.close()
+
+    # ---- okuma ----
+    def query(self, where: str = "", params=(), order: str = "started_at"):
+        """Satır sözlükleri (ayrı bağlantı; yazıcıyı beklemez)."""
+        conn = connect(self.path)
+        conn.row_factory = sqlite3.Row
+        try:
+            sql = f"SELECT * FROM runs {'WHERE ' + where if where else ''} ORDER BY {order}"
+            for row in conn.execute(sql, params):
+                yield dict(row)
+        finally:
+            conn.close()
+
+
+# ---------------- Motor dinleyicisi ----------------
+class RunRecorder:
+    """TitrationEngine olaylarından test satırı + döngü izi kurar ve arşive verir."""
+    IDLE_STATES = ("idle", "done", "aborted")
+
+    def __init__(self, archive: RunArchive, engine, constants=None, clock=time.monotonic, on_commit=None):
+        self.archive = archive
+        self.engine = engine
+        self.constants = constants if constants is not None else {}
+        self.clock = clock
+        self.on_commit = on_commit               # on_commit(satır): arşive verildikten sonra
+        self._run = None
+        self._pending = None                     # iptal: hata mesajı bir sonraki olayda gelir
+        self._state = None
+        self._since = None
+
+    def __call__(self, event: str, data: dict):
+        now = self.clock()
+        if self._pending is not None:
+            if event == "error":
+                self._pending["error"] = data.get("message")
+            self._commit(self._pending)
+            self._pending = None
+        if event == "state":
+            self._on_state(data["state"], now)
+        elif self._run is None:
+            return
+        elif event == "cycle":
+            self._run["_cycles"].append({"t": now - self._run["_t0"], "m3": data["m3"],
+                                         "rgb": None, "ph": None, "phases": {}})
+        elif event == "rgb":
+            if self._run["_cycles"]:
+                self._run["_cycles"][-1]["rgb"] = data["rgb"]
+        elif event == "ph":
+            if self._run["_cycles"]:
+                self._run["_cycles"][-1]["ph"] = data["value"]
+        elif event == "completed":
+            run, self._run = self._run, None
+            rgb = data.get("rgb") or (None, None, None)
+            run.update(result=data.get("reason"), m3_ml=data.get("m3"), cycles=data.get("cycles"),
+                       duration_s=data.get("duration_s"), ph=data.get("ph"),
+                       r=rgb[0], g=rgb[1], b=rgb[2])
+            self._commit(run)
+
+    def _on_state(self, state: str, now: float):
+        run = self._run
+        if run is not None and self._state not in self.IDLE_STATES and self._since is not None:
+            dt = now - self._since
+            if self._state == "dosing":
+                run["dosing_s"] = (run.get("dosing_s") or 0.0) + dt
+            elif run["_cycles"]:
+                phases = run["_cycles"][-1]["phases"]
+                phases[self._state] = phases.get(self._state, 0.0) + dt
+        self._state, self._since = state, now
+        if state == "dosing" and run is None:
+            self._begin(now)
+        elif state == "aborted" and run is not None:
+            self._run = None
+            run.update(result="aborted", m3_ml=self.engine.m3_dispensed, cycles=self.engine.cycles,
+                       duration_s=now - run["_t0"])
+            self._pending = run
+
+    def _begin(self, now: float):
+        f = self.engine.formula
+        self._run = {
+            "_t0": now, "_cycles": [],
+            "started_at": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "formula": f.name, "sample_ml": f.sample_ml, "indicator_ml": f.indicator_ml,
+            "titrant_ml": f.titrant_ml, "preload_ml": f.preload_ml, "math_formula": f.math_formula,
+        }
+
+    def _math_result(self, run: dict):
+        if not run.get("math_formula") or run.get("m3_ml") is None:
+            return None
+        try:
+            expr = compile_formula(run["math_formula"], constants=self.constants)
+            return expr.evaluate(self.constants, M1=run["sample_ml"], M2=run["indicator_ml"],
+                                 M3=run["m3_ml"])
+        except (FormulaError, ArithmeticError, TypeError):
+            return None
+
+    def _commit(self, run: dict):
+        run["math_result"] = self._math_result(run)
+        run["trace"] = pack_trace(run.pop("_cycles"))
+        run.pop("_t0", None)
+        self.archive.add(run)
+        if self.on_commit is not None:
+            self.on_commit(run)
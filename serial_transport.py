@@ -0,0 +1,479 @@
+"""Arduino seri hattı için arka plan taşıyıcı: komut kuyruğu + future.
+
+serial.Serial portunun tek sahibi bu modüldeki SerialTransport'tur; UI tarafı
+komutu kuyruğa bırakır, okuyucu thread cevap satırı gelince Future'ı tamamlar.
+"""
+import queue
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, InvalidStateError
+
+
+# ---------------- Yardımcı: satır ayrıştırma ----------------
+# Cihazın tek satırlık cevap/olay türleri (ön ek -> tür)
+LINE_KINDS = (
+    ("DONE", "DONE"), ("OK", "OK"), ("PONG", "PONG"), ("ERR", "ERR"),
+    ("PH:", "PH"), ("WEIGHT:", "WEIGHT"), ("RAW:", "RAW"), ("TARE:", "TARE"), ("SCALE:", "SCALE"),
+)
+
+def normalize_line(s: str) -> str:
+    return s.strip()
+
+def _upper(s: str) -> str:
+    return s.strip().upper()
+
+def line_kind(s: str):
+    """Satırın türünü döndürür (DONE/OK/PONG/ERR/PH/WEIGHT/RAW/TARE/SCALE) ya da None."""
+    if not s:
+        return None
+    su = _upper(s)
+    for prefix, kind in LINE_KINDS:
+        if su.startswith(prefix):
+            return kind
+    return None
+
+def is_interesting(s: str) -> bool:
+    """DONE/OK/PONG/ERR ve ölçüm ön ekleri (WEIGHT:/PH:/RAW:/TARE:/SCALE:) — case-insensitive."""
+    return line_kind(s) is not None
+
+def startswith_token(line: str, token_prefix: str) -> bool:
+    return _upper(line).startswith(_upper(token_prefix))
+
+
+TAG_RE = re.compile(r"^#(\d+)\s+(.*)$")
+
+def split_tag(line: str):
+    """'#17 DONE' -> (17, 'DONE'); etiketsiz satır -> (None, line)."""
+    m = TAG_RE.match(line)
+    if m:
+        return int(m.group(1)), m.group(2).strip()
+    return None, line
+
+
+class SerialRequest:
+    """Kuyruktaki tek komut: gönderilecek metin, beklenen önek, etiket ve sonucu."""
+    __slots__ = ("cmd", "name", "wait_token_prefix", "timeout_s", "future", "last_line",
+                 "tag", "sent_at", "deadline")
+
+    def __init__(self, cmd: str, wait_token_prefix: str = None, timeout_s: float = 5.0):
+        self.cmd = cmd.strip()
+        self.name = self.cmd.split(" ", 1)[0]
+        self.wait_token_prefix = wait_token_prefix
+        self.timeout_s = timeout_s
+        self.future = Future()
+        self.last_line = None
+        self.tag = None
+        self.sent_at = None
+        self.deadline = None
+
+    def wire(self) -> bytes:
+        if self.tag is None:
+            return (self.cmd + "\n").encode()
+        return f"#{self.tag} {self.cmd}\n".encode()
+
+    def matches(self, line: str) -> bool:
+        # ERR her bekleyen komutun cevabı sayılır; aksi halde önek eşleşmeli
+        if self.wait_token_prefix is None or line_kind(line) == "ERR":
+            return True
+        return startswith_token(line, self.wait_token_prefix)
+
+
+class EventWaiter:
+    """Kendiliğinden gelen bir olay satırını (ör. END:AIR) bekleyen Future."""
+    __slots__ = ("prefix", "req", "future", "timer")
+
+    def __init__(self, prefix: str, req: SerialRequest):
+        self.prefix = prefix
+        self.req = req              # olayı başlatan komut (etiket eşleşmesi için)
+        self.future = Future()
+        self.timer = None
+
+    def matches(self, tag, body: str) -> bool:
+        if not startswith_token(body, self.prefix):
+            return False
+        return tag is None or self.req.tag is None or self.req.tag == tag
+
+
+# ---------------- Seri Taşıyıcı Thread ----------------
+class SerialTransport:
+    """
+    Portun tek sahibi. Yazıcı thread kuyruktaki komutları gönderip bekleyen
+    listesine ekler; okuyucu thread porttan bloklayarak okur, satırları parçalar
+    ve her satırı eşleşen bekleyene ya da (eşleşen yoksa) add_listener ile
+    kayıtlı dinleyicilere iletir. Giriş tamponu hiçbir zaman temizlenmez.
+
+    Etiketli modda (enable_tags) her komut "#<seq> KOMUT" olarak gider, cevap
+    "#<seq> ..." ile birebir eşleşir ve aynı anda max_in_flight komut yolda
+    olabilir; yolda olanların toplam uzunluğu rx_budget baytı (Arduino RX
+    tamponu 64 bayt) aşmaz. Etiketsiz modda pencere 1'dir: tek komut, tek cevap.
+    Cihaz komutları sırayla yürüttüğü için zaman aşımı sayacı, komut
+    bekleyenlerin başına geçtiğinde (önceki cevaplandığında) başlar.
+    """
+    MAX_LINE = 4096
+    RECENT_EVENTS = 64
+    RTT_HISTORY = 100
+    TAG_MAX = 9999
+    TAG_OVERHEAD = 7                     # "#9999 " + "\n"
+
+    def __init__(self, ser, max_in_flight: int = 4, rx_budget: int = 56):
+        self.ser = ser
+        self.max_in_flight = max(1, int(max_in_flight))
+        # Kart runMoves / getWeight içinde bloklanırken yoldaki komutlar RX tamponunda
+        # bekler (64 bayt, taşan sessizce düşer): adet değil bayt sınırı, biraz pay ile
+        self.rx_budget = rx_budget
+        self.tagged = False
+        self._seq = 0
+        self._queue = queue.Queue()
+        self._held = deque()             # el sıkışma sürerken bekletilen komutlar (sırayla)
+        self._handshaking = False
+        self._pending = []
+        self._cv = threading.Condition()
+        self._listeners = []
+        self._events = []
+        self.recent_events = deque(maxlen=self.RECENT_EVENTS)
+        self.rtt = {}                    # komut adı -> deque(saniye)
+        self.on_rtt = None               # isteğe bağlı: fn(komut adı, saniye) (metrics)
+        self._running = False
+        self._writer = None
+        self._reader = None
+
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        self._reader = threading.Thread(target=self._read_loop, name="serial-rx", daemon=True)
+        self._writer = threading.Thread(target=self._write_loop, name="serial-tx", daemon=True)
+        self._reader.start()
+        self._writer.start()
+
+    def stop(self, timeout_s: float = 1.0):
+        self._running = False
+        self._queue.put(None)
+        with self._cv:
+            self._cv.notify_all()
+        cancel = getattr(self.ser, "cancel_read", None)
+        if cancel:
+            try:
+                cancel()
+            except Exception:
+                pass
+        for th in (self._writer, self._reader):
+            if th is not None:
+                th.join(timeout_s)
+        self._writer = self._reader = None
+        # Kuyrukta ve beklemede kalanları serbest bırak
+        while self._held:
+            self._finish(self._held.popleft(), "ERR: CLOSED")
+        while True:
+            try:
+                req = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if req is not None:
+                self._finish(req, "ERR: CLOSED")
+        with self._cv:
+            pending, self._pending = self._pending, []
+            events, self._events = self._events, []
+        for req in pending:
+            self._finish(req, "ERR: CLOSED")
+        for w in events:
+            self._resolve_event(w, "ERR: CLOSED")
+
+    @property
+    def is_open(self) -> bool:
+        return bool(self.ser and self.ser.is_open)
+
+    def add_listener(self, fn):
+        """fn(line) — hiçbir bekleyenle eşleşmeyen satırlar için (okuyucu thread'inde çağrılır)."""
+        self._listeners.append(fn)
+
+    def remove_listener(self, fn):
+        if fn in self._listeners:
+            self._listeners.remove(fn)
+
+    def submit(self, cmd: str, wait_token_prefix: str = None, timeout_s: float = 5.0) -> Future:
+        """timeout_s <= 0 ise cevap beklenmez (gönder-unut); Future None ile tamamlanır."""
+        req = SerialRequest(cmd, wait_token_prefix, timeout_s)
+        if not self._running or not self.is_open:
+            self._finish(req, None)
+            return req.future
+        self._queue.put(req)
+        return req.future
+
+    def submit_timed(self, cmd: str, event: str, timeout_s: float) -> Future:
+        """
+        Süreli aktüatör komutu (AIR_DUR/WATER_DUR/VALVE_DUR/COKME_DUR). Firmware hemen
+        OK döner ve süre dolunca "END:<event>" yollar; Future bu olayla tamamlanır.
+        timeout_s, OK geldikten sonra olay için beklenecek süredir. Eski firmware
+        süre sonunda DONE döndürür; bu da tamamlanma sayılır.
+        """
+        req = SerialRequest(cmd, None, timeout_s)
+        waiter = EventWaiter(f"END:{event}", req)
+        if not self._running or not self.is_open:
+            waiter.future.set_result(None)
+            return waiter.future
+        with self._cv:
+            self._events.append(waiter)
+
+        def on_ack(f):
+            res = None if f.cancelled() else f.result()
+            if res is not None and line_kind(res) == "OK":
+                waiter.timer = threading.Timer(timeout_s, self._resolve_event, (waiter, "ERR: TIMEOUT"))
+                waiter.timer.daemon = True
+                waiter.timer.start()
+            else:
+                # DONE (eski firmware), ERR, zaman aşımı ya da iptal
+                self._resolve_event(waiter, res)
+        req.future.add_done_callback(on_ack)
+        # Komut kuyruktan düşürülürse (iptal) olay beklemesi de iptal olur
+        waiter.future.add_done_callback(lambda f: f.cancelled() and req.future.cancel())
+        self._queue.put(req)
+        return waiter.future
+
+    def _resolve_event(self, waiter: EventWaiter, result):
+        with self._cv:
+            if waiter in self._events:
+                self._events.remove(waiter)
+        if waiter.timer is not None:
+            waiter.timer.cancel()
+        try:
+            waiter.future.set_result(result)
+        except InvalidStateError:
+            pass
+
+    def enable_tags(self, timeout_s: float = 1.0, attempts: int = 5) -> Future:
+        """
+        Cihaza "#0 PING" gönderir; "#0 PONG" gelirse etiketli moda geçer.
+        Eski firmware "ERR" döndürür ve etiketsiz mod korunur. Future -> bool.
+
+        Port açılınca Uno/Mega DTR ile resetlenir; bootloader ve setup() (HX711)
+        sürerken gelen baytlar kaybolur. Bu yüzden cevap gelmezse PING attempts
+        kez tekrarlanır ve el sıkışma bitene kadar diğer komutlar (ör. SET_RATE)
+        gönderilmeden sırayla bekletilir.
+        """
+        result = Future()
+        if not self._running or not self.is_open:
+            result.set_result(False)
+            return result
+        self._handshaking = True
+
+        def send(left: int):
+            req = SerialRequest("PING", "PONG", timeout_s)
+            req.tag = 0
+
+            def done(f):
+                res = None if f.cancelled() else f.result()
+                if res in (None, "ERR: TIMEOUT") and left > 1 and self._running:
+                    send(left - 1)               # kart henüz hazır değil
+                    return
+                self.tagged = res == "PONG"
+                self._handshaking = False
+                self._queue.put(None)            # bekletilenler için yazıcıyı uyandır
+                result.set_result(self.tagged)
+            req.future.add_done_callback(done)
+            self._queue.put(req)
+        send(max(1, attempts))
+        return result
+
+    def rtt_summary(self) -> dict:
+        """Komut adı -> (adet, ortalama sn, son sn)."""
+        out = {}
+        for name, hist in list(self.rtt.items()):
+            if hist:
+                out[name] = (len(hist), sum(hist) / len(hist), hist[-1])
+        return out
+
+    # ---- yazıcı ----
+    def _window(self) -> int:
+        return self.max_in_flight if self.tagged else 1
+
+    def _wire_len(self, req: SerialRequest) -> int:
+        return len(req.cmd) + self.TAG_OVERHEAD
+
+    def _has_room(self, req: SerialRequest) -> bool:
+        """Kilit altında: req şimdi gönderilebilir mi (pencere + RX bayt bütçesi)."""
+        if not self._pending:
+            return True                          # tek komut her zaman gider
+        if len(self._pending) >= self._window():
+            return False
+        used = sum(self._wire_len(p) for p in self._pending)
+        return used + self._wire_len(req) <= self.rx_budget
+
+    def _next_tag(self) -> int:
+        self._seq = self._seq % self.TAG_MAX + 1
+        return self._seq
+
+    def _arm_head(self):
+        # Bekleyenlerin başındaki komutun süresi şimdi başlar (cihaz sırayla yürütür)
+        if self._pending and self._pending[0].deadline is None:
+            self._pending[0].deadline = time.monotonic() + self._pending[0].timeout_s
+
+    def _wait_s(self):
+        if not self._pending or self._pending[0].deadline is None:
+            return None
+        return max(0.0, self._pending[0].deadline - time.monotonic())
+
+    def _expire(self):
+        """Süresi dolan baştaki komut(lar)ı düşürür; kilit altında çağrılır."""
+        expired = []
+        now = time.monotonic()
+        while self._pending and self._pending[0].deadline is not None and self._pending[0].deadline <= now:
+            expired.append(self._pending.pop(0))
+            self._arm_head()
+        return expired
+
+    def _write_loop(self):
+        req = None                               # sırası gelmiş, yer açılmasını bekleyen komut
+        while self._running:
+            with self._cv:
+                expired = self._expire()
+                if not expired and req is not None and not self._has_room(req):
+                    # Pencere / RX bütçesi dolu: cevap (ya da zaman aşımı) bekle
+                    self._cv.wait(self._wait_s())
+                    continue
+                wait_s = self._wait_s()
+            for r in expired:
+                self._finish(r, r.last_line or "ERR: TIMEOUT")
+            if expired or not self._running:
+                continue
+            if req is None:
+                req = self._take(wait_s)
+                continue                         # yer kontrolü bir sonraki turda
+            self._send(req)
+            req = None
+        if req is not None:
+            self._finish(req, "ERR: CLOSED")
+
+    def _send(self, req: SerialRequest):
+        if not req.future.set_running_or_notify_cancel():
+            return                               # beklerken iptal edildi
+        with self._cv:
+            if self.tagged and req.tag is None:
+                req.tag = self._next_tag()
+            if req.timeout_s > 0:
+                self._pending.append(req)
+                self._arm_head()
+            req.sent_at = time.monotonic()
+        try:
+            self.ser.write(req.wire())
+        except Exception as e:
+            self._drop(req)
+            self._finish(req, f"ERR: {e}")
+            return
+        if req.timeout_s <= 0:
+            self._finish(req, None)
+
+    def _take(self, wait_s):
+        """Sıradaki komut; el sıkışma sürerken PING dışındakiler _held'e alınır."""
+        if self._held and not self._handshaking:
+            return self._held.popleft()
+        try:
+            req = self._queue.get(timeout=wait_s)
+        except queue.Empty:
+            return None
+        if req is not None and (self._handshaking or self._held) and req.tag != 0:
+            self._held.append(req)
+            return None
+        return req
+
+    def _drop(self, req: SerialRequest):
+        with self._cv:
+            if req in self._pending:
+                self._remove_locked(req)
+
+    def _remove_locked(self, req: SerialRequest):
+        head = self._pending[0] is req
+        self._pending.remove(req)
+        if head:
+            self._arm_head()
+        self._cv.notify_all()
+        # Kuyrukta bloklanan yazıcıyı uyandır: yeni baş komutun süresi değişti
+        self._queue.put(None)
+
+    # ---- okuyucu ----
+    def _read_loop(self):
+        buf = bytearray()
+        while self._running:
+            try:
+                # Veri gelene kadar bloklar (portun timeout'u kadar); polling yok
+                chunk = self.ser.read(self.ser.in_waiting or 1)
+            except Exception:
+                if not self._running:
+                    break
+                time.sleep(0.2)
+                continue
+            if not chunk:
+                continue
+            buf += chunk
+            while True:
+                i = buf.find(b"\n")
+                if i < 0:
+                    break
+                raw = bytes(buf[:i])
+                del buf[:i + 1]
+                line = normalize_line(raw.decode(errors="ignore"))
+                if line:
+                    self._dispatch(line)
+            if len(buf) > self.MAX_LINE:
+                buf.clear()
+
+    def _match(self, tag, line: str):
+        """Satırın sahibi olan bekleyeni bulur; kilit altında çağrılır."""
+        if tag is not None:
+            for req in self._pending:
+                if req.tag == tag:
+                    return req
+            return None
+        if not is_interesting(line):
+            return None
+        for req in self._pending:
+            # Etiketsiz modda tek etiketli komut el sıkışma PING'idir; eski firmware ona ERR döner
+            if req.tag is not None and self.tagged:
+                continue
+            if req.matches(line):
+                return req
+            req.last_line = line
+        return None
+
+    def _dispatch(self, line: str):
+        tag, body = split_tag(line)
+        with self._cv:
+            target = self._match(tag, body)
+            if target is not None:
+                if is_interesting(body) and target.matches(body):
+                    self._remove_locked(target)
+                else:
+                    # Etiketi tutan ara satır (ör. PROGRESS:) dinleyicilere gider
+                    if is_interesting(body):
+                        target.last_line = body
+                    target = None
+        if target is not None:
+            if target.sent_at is not None:
+                hist = self.rtt.setdefault(target.name, deque(maxlen=self.RTT_HISTORY))
+                dt = time.monotonic() - target.sent_at
+                hist.append(dt)
+                if self.on_rtt is not None:
+                    self.on_rtt(target.name, dt)
+            self._finish(target, body)
+            return
+        with self._cv:
+            waiter = next((w for w in self._events if w.matches(tag, body)), None)
+        if waiter is not None:
+            self._resolve_event(waiter, body)
+            return
+        self.recent_events.append(line)
+        for fn in list(self._listeners):
+            try:
+                fn(line)
+            except Exception:
+                pass
+
+    @staticmethod
+    def _finish(req: SerialRequest, result):
+        # Okuyucu ve yazıcı aynı anda tamamlamaya çalışabilir; ilk gelen kazanır
+        try:
+            req.future.set_result(result)
+        except InvalidStateError:
+            pass
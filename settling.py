@@ -0,0 +1,65 @@
+"""Çökme sırasında akan RGB ölçümlerinden rengin oturduğunu tespit eder."""
+from collections import deque
+
+
+class SettlingDetector:
+    """
+    Son window_s saniyelik ölçümlerde kanal başına standart sapma ve eğim
+    (birim/sn) eşik altındaysa renk oturmuş sayılır. Çökme başlangıcından
+    min_s geçmeden, pencerede min_samples ölçüm yokken ya da ölçümler en az
+    min_span_s (varsayılan window_s / 2) yayılmadan karar verilmez.
+    """
+    def __init__(self, window_s: float = 2.0, min_samples: int = 5, max_std: float = 2.0,
+                 max_slope: float = 1.5, min_s: float = 1.0, min_span_s: float = None):
+        self.window_s = window_s
+        self.min_samples = min_samples
+        self.min_span_s = window_s / 2 if min_span_s is None else min_span_s
+        self.max_std = max_std
+        self.max_slope = max_slope
+        self.min_s = min_s
+        self.samples = deque()                   # (t, (r, g, b))
+        self.t0 = 0.0
+
+    @classmethod
+    def for_period(cls, period_s: float, min_samples: int = 4, **kw):
+        """
+        Tetikli ölçüm (period_s aralıkla) için: pencere min_samples + 1 periyot
+        tutar, yayılma şartı %20 zamanlama sapmasına izin verir.
+        """
+        if period_s <= 0:
+            return cls(**kw)
+        return cls(window_s=(min_samples + 1) * period_s, min_samples=min_samples,
+                   min_span_s=(min_samples - 1) * period_s * 0.8, **kw)
+
+    def reset(self, t0: float):
+        self.samples.clear()
+        self.t0 = t0
+
+    def add(self, t: float, rgb):
+        self.samples.append((t, tuple(float(v) for v in rgb)))
+        while self.samples and self.samples[0][0] < t - self.window_s:
+            self.samples.popleft()
+
+    def stable(self) -> bool:
+        n = len(self.samples)
+        if n < self.min_samples:
+            return False
+        t_first, t_last = self.samples[0][0], self.samples[-1][0]
+        if t_last - self.t0 < self.min_s or t_last - t_first < self.min_span_s:
+            return False
+        ts = [t for t, _ in self.samples]
+        mt = sum(ts) / n
+        stt = sum((t - mt) ** 2 for t in ts)
+        for ch in range(3):
+            vs = [rgb[ch] for _, rgb in self.samples]
+            mv = sum(vs) / n
+            if (sum((v - mv) ** 2 for v in vs) / n) ** 0.5 > self.max_std:
+                return False
+            slope = sum((t - mt) * (v - mv) for t, v in zip(ts, vs)) / stt if stt > 0 else 0.0
+            if abs(slope) > self.max_slope:
+                return False
+        return True
+
+    def mean(self):
+        n = len(self.samples)
+        return tuple(int(round(sum(rgb[ch] for _, rgb in self.samples) / n)) for ch in range(3))
@@ -0,0 +1,484 @@
+"""Donanım simülatörü: Arduino komut seti (pty üzerinde) ve FQ2 RGB sunucusu (yerel TCP).
+
+Tezgâh olmadan MyApp / SerialWorker / TcpClientThread'i ya da TitrationEngine'i
+uçtan uca koşturmak için. SimArduino firmware'deki executeCommand ile aynı
+komutları aynı cevap biçimleriyle verir (etiketli cevaplar, OK + END:<AD>
+süreli pencereler, PROGRESS satırları); süreler motion.MotorProfile ve
+firmware'deki sabit gecikmelerle modellenir. TitrationModel kaba eklenen
+titranta göre renk ve pH üretir; Fq2Server her CAMERA_TRIG'de (ve istenirse
+sabit hızda) bu rengi FQ2 biçiminde yollar.
+
+scale bütün süreleri çarpar: scale=0.1 on kat hızlı koşturur.
+
+    python simulator.py --scale 0.1 --tcp-port 9876
+    TITRATION_SERIAL_PORT=/dev/pts/N TITRATION_FQ2_ADDR=127.0.0.1:9876 python titration_main.py
+"""
+import argparse
+import math
+import os
+import random
+import re
+import select
+import socket
+import threading
+import time
+import tty
+
+from motion import MotorProfile
+
+
+class SimClock:
+    """Simülasyon zamanı: gerçek süre / scale."""
+    def __init__(self, scale: float = 1.0):
+        self.scale = float(scale)
+        self._t0 = time.monotonic()
+
+    def now(self) -> float:
+        return (time.monotonic() - self._t0) / self.scale
+
+    def real(self, sim_s: float) -> float:
+        return max(0.0, sim_s) * self.scale
+
+    def sleep(self, sim_s: float):
+        time.sleep(self.real(sim_s))
+
+
+# ---------------- Titrasyon modeli ----------------
+class TitrationModel:
+    """
+    Kaptaki titrant hacmine (ml) göre denge rengi ve pH: eşdeğerlik noktası
+    çevresinde sigmoid geçiş. Görünen renk yeni dengeye tau_s zaman sabitiyle
+    yaklaşır (karışma / çökme); ölçümlere gürültü eklenir.
+    """
+    def __init__(self, equivalence_ml: float = 1.2, width_ml: float = 0.05,
+                 start_rgb=(10, 20, 30), end_rgb=(100, 100, 100),
+                 ph_start: float = 4.0, ph_end: float = 10.0,
+                 tau_s: float = 1.0, noise: float = 1.0, clock: SimClock = None, seed=None):
+        self.equivalence_ml = equivalence_ml
+        self.width_ml = width_ml
+        self.start_rgb = tuple(float(v) for v in start_rgb)
+        self.end_rgb = tuple(float(v) for v in end_rgb)
+        self.ph_start = ph_start
+        self.ph_end = ph_end
+        self.tau_s = tau_s
+        self.noise = noise
+        self.clock = clock if clock is not None else SimClock()
+        self.rand = random.Random(seed)
+        self._lock = threading.Lock()
+        self.drain()
+
+    def _fraction(self, ml: float) -> float:
+        x = (ml - self.equivalence_ml) / max(self.width_ml, 1e-9)
+        return 1.0 / (1.0 + math.exp(-max(-60.0, min(60.0, x))))
+
+    def _equilibrium(self, ml: float):
+        f = self._fraction(ml)
+        return tuple(a + (b - a) * f for a, b in zip(self.start_rgb, self.end_rgb))
+
+    def _visible(self, now: float):
+        k = 1.0 if self.tau_s <= 0 else 1.0 - math.exp(-(now - self._t_change) / self.tau_s)
+        return tuple(a + (b - a) * k for a, b in zip(self._from_rgb, self._equilibrium(self.titrant_ml)))
+
+    def drain(self):
+        """Kap boşaltıldı (vana): yeni numuneye hazır."""
+        with self._lock:
+            self.titrant_ml = 0.0
+            self.sample_ml = 0.0
+            self._from_rgb = self.start_rgb
+            self._t_change = self.clock.now()
+
+    def add_sample(self, ml: float):
+        with self._lock:
+            self.sample_ml += max(0.0, ml)
+
+    def add_titrant(self, ml: float):
+        with self._lock:
+            now = self.clock.now()
+            self._from_rgb = self._visible(now)
+            self.titrant_ml = max(0.0, self.titrant_ml + ml)
+            self._t_change = now
+
+    def rgb(self):
+        with self._lock:
+            v = self._visible(self.clock.now())
+        return tuple(min(255.0, max(0.0, c + self.rand.gauss(0.0, self.noise))) for c in v)
+
+    def ph(self) -> float:
+        with self._lock:
+            f = self._fraction(self.titrant_ml)
+        return self.ph_start + (self.ph_end - self.ph_start) * f + self.rand.gauss(0.0, 0.01)
+
+
+# ---------------- FQ2 sunucusu ----------------
+class Fq2Server:
+    """
+    FQ2 gibi davranan TCP sunucusu: bağlı istemcilere ölçüm yollar. fmt "lines"
+    (R, G, B ayrı satırlarda) ya da "csv" (tek satır "R,G,B"). stream_hz > 0 ise
+    tetik beklemeden sürekli yayın yapar.
+    """
+    def __init__(self, model: TitrationModel, host: str = "127.0.0.1", port: int = 0,
+                 fmt: str = "lines", stream_hz: float = 0.0):
+        self.model = model
+        self.fmt = fmt
+        self.stream_hz = stream_hz
+        self.sent = 0
+        self._clients = []
+        self._lock = threading.Lock()
+        self._running = False
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._sock.bind((host, port))
+        self._sock.listen(4)
+        self.address = self._sock.getsockname()
+
+    def start(self):
+        self._running = True
+        threading.Thread(target=self._accept_loop, name="fq2-accept", daemon=True).start()
+        if self.stream_hz > 0:
+            threading.Thread(target=self._stream_loop, name="fq2-stream", daemon=True).start()
+        return self
+
+    def _accept_loop(self):
+        while self._running:
+            try:
+                conn, _ = self._sock.accept()
+            except OSError:
+                break
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            with self._lock:
+                self._clients.append(conn)
+
+    def _stream_loop(self):
+        period = self.model.clock.real(1.0 / self.stream_hz)
+        while self._running:
+            self.emit()
+            time.sleep(period)
+
+    def format(self, rgb) -> bytes:
+        r, g, b = (int(round(v)) for v in rgb)
+        if self.fmt == "csv":
+            return f"{r},{g},{b}\r\n".encode()
+        return f"{r}\r\n{g}\r\n{b}\r\n".encode()
+
+    def emit(self, rgb=None):
+        """Bir ölçüm yollar (rgb verilmezse modelin o anki rengi)."""
+        data = self.format(rgb if rgb is not None else self.model.rgb())
+        with self._lock:
+            for conn in list(self._clients):
+                try:
+                    conn.sendall(data)
+                except OSError:
+                    self._clients.remove(conn)
+                    conn.close()
+        self.sent += 1
+
+    def close(self):
+        self._running = False
+        self._sock.close()
+        with self._lock:
+            for conn in self._clients:
+                conn.close()
+            self._clients.clear()
+
+
+# ---------------- Arduino ----------------
+class SimArduino:
+    """
+    Firmware komut yorumlayıcısının pty üzerinde çalışan kopyası. Tek thread'de
+    satır satır işler: hareketler süresince yeni komut okunmaz (karttaki gibi),
+    süreli pencereler ise hareket sırasında da kapanır.
+    """
+    TIMED = ("AIR", "WATER", "VALVE", "COKME")
+    PROGRESS_S = 0.25
+    RAW_ZERO = 83_880                                # boş kefede HX711 ham değeri
+
+    def __init__(self, model: TitrationModel = None, clock: SimClock = None,
+                 resolution: float = 8526.32, load_g: float = 0.0, camera=None):
+        self.clock = clock if clock is not None else SimClock()
+        self.model = model if model is not None else TitrationModel(clock=self.clock)
+        self.resolution = resolution                 # adım/ml (üç motor)
+        self.profiles = [MotorProfile(), MotorProfile(), MotorProfile()]
+        self.load_g = load_g                         # kefedeki yük
+        self.scale_factor = 936.57
+        self.tare_offset = self._raw()
+        self.camera = camera                         # CAMERA_TRIG'de çağrılır (ör. Fq2Server.emit)
+        self.camera_latency_s = 0.15
+        self.pins = {"AIR": False, "WATER": False, "VALVE": False}
+        self.timed = {}                              # ad -> (bitiş, etiket)
+        self.log = []
+        self.master = self.port = None
+        self._running = False
+
+    # ---- pty ----
+    def start(self) -> str:
+        self.master, slave = os.openpty()
+        tty.setraw(slave)
+        self.port = os.ttyname(slave)
+        self._slave = slave                          # açık kalsın: istemci kapanınca EIO olmasın
+        self._running = True
+        threading.Thread(target=self._loop, name="sim-arduino", daemon=True).start()
+        return self.port
+
+    def close(self):
+        self._running = False
+        for fd in (self.master, getattr(self, "_slave", None)):
+            if fd is not None:
+                try:
+                    os.close(fd)
+                except OSError:
+                    pass
+
+    def _write(self, text: str):
+        try:
+            os.write(self.master, (text + "\r\n").encode())
+        except OSError:
+            pass
+
+    def _reply(self, tag: str, text: str):
+        self._write(tag + text)
+
+    def _loop(self):
+        buf = b""
+        while self._running:
+            self._service_timed()
+            wait = self._next_deadline()
+            try:
+                ready, _, _ = select.select([self.master], [], [], wait)
+                if not ready:
+                    continue
+                data = os.read(self.master, 1024)
+            except OSError:
+                break
+            buf += data
+            while b"\n" in buf:
+                line, buf = buf.split(b"\n", 1)
+                self.handle_line(line.decode(errors="replace"))
+
+    def _next_deadline(self):
+        if not self.timed:
+            return 0.05
+        return self.clock.real(min(end for end, _ in self.timed.values()) - self.clock.now())
+
+    # ---- süreli pencereler ----
+    def _finish_timed(self, name: str):
+        entry = self.timed.pop(name, None)
+        if entry is None:
+            return
+        if name in self.pins:
+            self.pins[name] = False
+        if name == "VALVE":
+            self.model.drain()
+        self._write(f"{entry[1]}END:{name}")
+
+    def _start_timed(self, name: str, ms: int, tag: str):
+        self._finish_timed(name)
+        if name in self.pins:
+            self.pins[name] = True
+        self.timed[name] = (self.clock.now() + max(0, ms) / 1000.0, tag)
+        self._reply(tag, "OK")
+
+    def _service_timed(self):
+        now = self.clock.now()
+        for name in [n for n, (end, _) in self.timed.items() if now >= end]:
+            self._finish_timed(name)
+
+    # ---- ölçümler ----
+    def _raw(self) -> int:
+        return int(self.RAW_ZERO + self.load_g * self.scale_factor + random.gauss(0, 40))
+
+    def weight(self) -> float:
+        self.clock.sleep(0.5)                        # HX711 10 Hz, 5 okuma
+        return (sum(self._raw() for _ in range(5)) / 5 - self.tare_offset) / self.scale_factor
+
+    # ---- hareket ----
+    def run_moves(self, steps, tag: str):
+        etas = [p.eta_s(n) for p, n in zip(self.profiles, steps)]
+        total = max(etas)
+        start = self.clock.now()
+        axis = 0
+        while True:
+            elapsed = self.clock.now() - start
+            if elapsed >= total:
+                break
+            self.clock.sleep(min(self.PROGRESS_S, total - elapsed))
+            elapsed = min(self.clock.now() - start, total)
+            # Firmware gibi: her turda sıradaki hareketli eksen için tek satır
+            for k in range(3):
+                i = (axis + k) % 3
+                if steps[i] and elapsed < etas[i]:
+                    axis = (i + 1) % 3
+                    self._reply(tag, f"PROGRESS:{i + 1}:{int(abs(steps[i]) * elapsed / etas[i])}")
+                    break
+            self._service_timed()
+        if steps[0] > 0 or steps[1] > 0:
+            self.model.add_sample((max(0, steps[0]) + max(0, steps[1])) / self.resolution)
+        if steps[2]:
+            self.model.add_titrant(steps[2] / self.resolution)
+        self.clock.sleep(0.04)
+        self._reply(tag, "DONE")
+
+    def _move_multi(self, args: str, tag: str):
+        steps = [0, 0, 0]
+        for tok in args.split():
+            idx, _, n = tok.partition(":")
+            if not idx.isdigit() or not 1 <= int(idx) <= 3:
+                self._reply(tag, "ERR")
+                return
+            steps[int(idx) - 1] = _to_int(n)
+        self.run_moves(steps, tag)
+
+    def _set_rate(self, args: str, tag: str):
+        parts = args.split()
+        try:
+            idx, vmax, acc = int(parts[0]), float(parts[1]), float(parts[2])
+            v0 = float(parts[3]) if len(parts) > 3 else self.profiles[idx - 1].start_rate
+        except (IndexError, ValueError):
+            self._reply(tag, "ERR")
+            return
+        if not 1 <= idx <= 3 or vmax < 1 or acc < 1 or v0 < 1 or v0 > vmax:
+            self._reply(tag, "ERR")
+            return
+        self.profiles[idx - 1] = MotorProfile(vmax, acc, v0)
+        self._reply(tag, "OK")
+
+    # ---- komut yorumlayıcı ----
+    def handle_line(self, line: str):
+        cmd = line.strip()
+        tag = ""
+        if cmd.startswith("#"):
+            sp = cmd.find(" ")
+            if sp > 1:
+                tag, cmd = cmd[:sp + 1], cmd[sp + 1:].strip()
+        if not cmd:
+            return
+        self.log.append(cmd)
+        self.execute(cmd, tag)
+
+    def execute(self, cmd: str, tag: str = ""):
+        r = lambda text: self._reply(tag, text)
+        if cmd in ("VERBOSE_ON", "VERBOSE_OFF"):
+            return r("OK")
+        if cmd == "PING":
+            return r("PONG")
+        if cmd.startswith("MOVE_MULTI"):
+            return self._move_multi(cmd[10:], tag)
+        if cmd.startswith("SET_RATE"):
+            return self._set_rate(cmd[8:], tag)
+        for idx in (1, 2, 3):
+            if cmd.startswith(f"MOVE{idx}"):
+                steps = [0, 0, 0]
+                steps[idx - 1] = _to_int(cmd[6:])
+                return self.run_moves(steps, tag)
+        for name in ("AIR", "WATER", "VALVE"):
+            if cmd == f"{name}_ON":
+                self.pins[name] = True
+                return r("DONE")
+            if cmd == f"{name}_OFF":
+                self._finish_timed(name)
+                self.pins[name] = False
+                if name == "VALVE":
+                    self.model.drain()
+                return r("DONE")
+        for name in self.TIMED:
+            if cmd.startswith(f"{name}_DUR"):
+                return self._start_timed(name, _to_int(cmd[len(name) + 5:]), tag)
+        if cmd == "COKME_OFF":
+            self._finish_timed("COKME")
+            return r("DONE")
+        if cmd == "CAMERA_TRIG":
+            self.clock.sleep(0.1)
+            if self.camera is not None:
+                # FQ2 ölçümü darbeden sonra işler: sonuç DONE'dan sonra gelir
+                threading.Timer(self.clock.real(self.camera_latency_s), self.camera).start()
+            return r("DONE")
+        if cmd == "WEIGHT_MEASURE":
+            return r(f"Weight: {self.weight():.3f}")
+        if cmd == "RAW_READ":
+            return r(f"RAW:{self._raw()}")
+        if cmd == "TARE":
+            self.tare_offset = self._raw()
+            return r(f"TARE:{self.tare_offset}")
+        if cmd.startswith("SET_SCALE"):
+            s = _to_float(cmd[9:])
+            if s > 0.001:
+                self.scale_factor = s
+                return r(f"SCALE:{s:.3f}")
+            return r("ERR")
+        if cmd.startswith("SET_TARE"):
+            self.tare_offset = _to_int(cmd[8:])
+            return r(f"TARE:{self.tare_offset}")
+        if cmd == "PH_MEASURE":
+            self.clock.sleep(0.16)                   # 20 örnek x 8 ms
+            return r(f"PH: {self.model.ph():.2f}")
+        if cmd == "COMPLETE_TEST":
+            return r("DONE")
+        r("ERR")
+
+
+def _to_int(s: str) -> int:
+    # Arduino String.toInt(): baştaki sayı, yoksa 0
+    m = re.match(r"\s*[-+]?\d+", s)
+    return int(m.group()) if m else 0
+
+
+def _to_float(s: str) -> float:
+    try:
+        return float(s.strip().split()[0])
+    except (IndexError, ValueError):
+        return 0.0
+
+
+# ---------------- Hepsi bir arada ----------------
+class BenchSimulator:
+    """Arduino + FQ2 + ortak model; start() -> (seri port, (host, port))."""
+    def __init__(self, scale: float = 1.0, tcp_port: int = 0, fmt: str = "lines",
+                 stream_hz: float = 0.0, seed=None, **model_kw):
+        self.clock = SimClock(scale)
+        self.model = TitrationModel(clock=self.clock, seed=seed, **model_kw)
+        self.fq2 = Fq2Server(self.model, port=tcp_port, fmt=fmt, stream_hz=stream_hz)
+        self.arduino = SimArduino(self.model, self.clock, camera=self.fq2.emit)
+
+    def start(self):
+        self.fq2.start()
+        return self.arduino.start(), self.fq2.address
+
+    def close(self):
+        self.arduino.close()
+        self.fq2.close()
+
+
+def _rgb_arg(s: str):
+    return tuple(float(v) for v in s.split(","))
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Titrasyon tezgâhı simülatörü (Arduino pty + FQ2 TCP)")
+    ap.add_argument("--scale", type=float, default=1.0, help="süre çarpanı (0.1 = 10 kat hızlı)")
+    ap.add_argument("--tcp-port", type=int, default=9876)
+    ap.add_argument("--fmt", choices=("lines", "csv"), default="lines")
+    ap.add_argument("--stream-hz", type=float, default=0.0, help="tetiksiz sürekli FQ2 yayını")
+    ap.add_argument("--equivalence-ml", type=float, default=1.2)
+    ap.add_argument("--start-rgb", type=_rgb_arg, default=(10, 20, 30))
+    ap.add_argument("--end-rgb", type=_rgb_arg, default=(100, 100, 100))
+    ap.add_argument("--tau", type=float, default=1.0, help="renk oturma zaman sabiti (sn)")
+    ap.add_argument("--noise", type=float, default=1.0)
+    ap.add_argument("--seed", type=int, default=None)
+    a = ap.parse_args(argv)
+
+    sim = BenchSimulator(a.scale, a.tcp_port, a.fmt, a.stream_hz, a.seed,
+                         equivalence_ml=a.equivalence_ml, start_rgb=a.start_rgb,
+                         end_rgb=a.end_rgb, tau_s=a.tau, noise=a.noise)
+    port, (host, tcp_port) = sim.start()
+    print(f"TITRATION_SERIAL_PORT={port}")
+    print(f"TITRATION_FQ2_ADDR={host}:{tcp_port}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sim.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,8 @@
+import os
+import sys
+from pathlib import Path
+
+# Modüller depo kökünde (paket değil)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+# Qt testleri ekransız çalışır
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
@@ -0,0 +1,32 @@
+import os
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("PyQt5")
+pytest.importorskip("serial")
+
+import benchmark
+
+REPO = Path(benchmark.__file__).resolve().parent
+IGNORED = {"__pycache__", ".pytest_cache", ".git"}
+
+
+def snapshot():
+    out = {}
+    for dirpath, dirs, files in os.walk(REPO):
+        dirs[:] = [d for d in dirs if d not in IGNORED]
+        for name in files:
+            p = Path(dirpath, name)
+            st = p.stat()
+            out[str(p.relative_to(REPO))] = (st.st_size, st.st_mtime_ns)
+    return out
+
+
+def test_benchmark_leaves_repo_unchanged(tmp_path):
+    before = snapshot()
+    out = tmp_path / "bench.json"
+    benchmark.main(["--only", "formula,report", "-n", "3", "--out", str(out)])
+    assert out.exists()
+    assert snapshot() == before
+    assert "TITRATION_DATA_DIR" not in os.environ
@@ -0,0 +1,44 @@
+import numpy as np
+
+from camera_capture import FrameRing
+
+
+def frame(v):
+    return np.full((2, 3, 3), v, dtype=np.uint8)
+
+
+def test_lapped_slot_is_rejected():
+    ring = FrameRing.create((2, 3, 3), slots=4)
+    try:
+        for v in range(1, ring.slots + 1):
+            ring.write(frame(v))
+        view = ring.read(1)
+        assert view is not None and ring.valid(1) and view[0, 0, 0] == 1
+        ring.write(frame(99))                    # slots + 1: seq 1'in slotu bindirildi
+        assert not ring.valid(1)
+        assert ring.read(1) is None
+        assert ring.read(ring.seq)[0, 0, 0] == 99
+    finally:
+        ring.close()
+
+
+def test_slot_invalid_while_being_written():
+    ring = FrameRing.create((2, 3, 3), slots=2)
+    seen = []
+    try:
+        ring.write(frame(1))
+        # Kare kopyalanırken okuyucunun gördüğü slot seq'i
+        orig = ring.frames
+
+        class Frames:
+            def __setitem__(self, slot, value):
+                seen.append(int(ring.slot_seq[slot]))
+                orig[slot] = value
+        ring.frames = Frames()
+        ring.write(frame(2))
+        ring.write(frame(3))                     # seq 1'in slotu
+        ring.frames = orig
+        assert seen == [-1, -1]
+        assert not ring.valid(1)
+    finally:
+        ring.close()
@@ -0,0 +1,66 @@
+from concurrent.futures import Future
+
+from device import TitrationDevice, is_device_reply_error
+
+
+class ScriptedTransport:
+    """submit() cevapları komut adına göre sözlükten döner."""
+    is_open = True
+
+    def __init__(self, replies):
+        self.replies = replies
+        self.sent = []
+
+    def submit(self, cmd, wait_token_prefix=None, timeout_s=5.0):
+        self.sent.append(cmd)
+        f = Future()
+        f.set_result(self.replies.get(cmd.split(" ")[0], "DONE"))
+        return f
+
+
+def move(replies):
+    t = ScriptedTransport(replies)
+    res = TitrationDevice(t).move_steps({1: 100, 3: 50}).result(1)
+    return res, [c.split(" ")[0] for c in t.sent]
+
+
+def test_multi_move_done():
+    assert move({}) == ("DONE", ["MOVE_MULTI"])
+
+
+def test_old_firmware_falls_back_to_sequential_moves():
+    for err in ("ERR", "err", "ERR:UNKNOWN"):
+        assert move({"MOVE_MULTI": err}) == ("DONE", ["MOVE_MULTI", "MOVE1", "MOVE3"])
+
+
+def test_timeout_is_reported_not_retried():
+    res, sent = move({"MOVE_MULTI": "ERR: TIMEOUT"})
+    assert res == "ERR: TIMEOUT" and sent == ["MOVE_MULTI"]
+
+
+def test_sequential_fallback_stops_on_error():
+    res, sent = move({"MOVE_MULTI": "ERR", "MOVE1": "ERR"})
+    assert res == "ERR" and sent == ["MOVE_MULTI", "MOVE1"]
+
+
+def test_reply_error_classification():
+    assert is_device_reply_error("ERR") and is_device_reply_error("ERR:BAD")
+    assert not is_device_reply_error(None)
+    assert not is_device_reply_error("ERR: CLOSED")
+    assert not is_device_reply_error("DONE")
+
+
+class CancellingTransport(ScriptedTransport):
+    """Kapanış sırasında iptal edilen komutlar."""
+    def submit(self, cmd, wait_token_prefix=None, timeout_s=5.0):
+        self.sent.append(cmd)
+        f = Future()
+        f.cancel()
+        return f
+
+
+def test_cancelled_profile_falls_back_to_legacy():
+    from device import LEGACY_PROFILE
+    dev = TitrationDevice(CancellingTransport({}))
+    assert dev.apply_profiles().cancelled()
+    assert all(dev.profiles[f"motor{i}"] is LEGACY_PROFILE for i in (1, 2, 3))
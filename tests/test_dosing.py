@@ -0,0 +1,54 @@
+import pytest
+
+from dosing import DosePlanner, EndpointHistory, RollingQuantile
+
+
+def test_rolling_quantile_window():
+    q = RollingQuantile(window=3, values=[5, 1, 3, 2])
+    assert q.values() == [1.0, 3.0, 2.0]            # 5 pencereden çıktı
+    assert q.quantile(0.0) == 1.0 and q.quantile(1.0) == 3.0
+    assert q.quantile(0.5) == 2.0 and q.quantile(0.25) == 1.5
+
+
+def test_preload_needs_min_runs(tmp_path):
+    h = EndpointHistory(str(tmp_path / "h.json"))
+    h.record("F", 2.0)
+    h.record("F", 2.2)
+    assert h.suggested_preload("F") is None
+    h.record("F", 2.4)
+    # 0.9 * 0.1-quantile(2.0, 2.2, 2.4) = 0.9 * 2.04
+    assert h.suggested_preload("F") == pytest.approx(1.836)
+    assert h.suggested_preload("başka") is None
+
+
+def test_preload_stays_below_every_past_endpoint(tmp_path):
+    h = EndpointHistory(str(tmp_path / "h.json"), window=10)
+    for m3 in (3.1, 2.9, 3.4, 3.0, 2.8, 3.2):
+        h.record("F", m3)
+    assert h.suggested_preload("F") < 2.8
+
+
+def test_history_persists_and_ignores_bad_entries(tmp_path):
+    path = str(tmp_path / "h.json")
+    h = EndpointHistory(path, window=2)
+    for m3 in (1.0, 0.0, -1.0, 2.0, 3.0):
+        h.record("F", m3)
+    h.record("", 5.0)
+    again = EndpointHistory(path, window=2)
+    assert again.stats["F"].values() == [2.0, 3.0]
+    assert list(again.stats) == ["F"]
+
+
+def test_corrupt_history_starts_empty(tmp_path):
+    path = tmp_path / "h.json"
+    path.write_text("{yarım")
+    assert EndpointHistory(str(path)).count("F") == 0
+
+
+def test_planner_uses_expected_endpoint_before_colour_moves():
+    p = DosePlanner(0.1, (100, 100, 100), expected_ml=2.0)
+    p.observe(0.5, (10, 10, 10))
+    # Tek nokta: uyum yok, beklenen dönümden kalanın yarısı (ince adımın katı)
+    assert p.next_dose() == pytest.approx(0.8)
+    p.observe(1.3, (90, 90, 90))                  # ilerleme 0.89 >= fine_from
+    assert p.next_dose() == pytest.approx(0.1)
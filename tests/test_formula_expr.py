@@ -0,0 +1,66 @@
+import math
+
+import numpy as np
+import pytest
+
+from formula_expr import CH2O_FORMULA, FormulaError, cache_info, compile_formula
+
+
+def test_evaluate_with_constants():
+    expr = compile_formula("(M3 - M2) * N / M1", constants={"N": 0.1})
+    assert expr.names == ("M1", "M2", "M3", "N")
+    assert expr.evaluate({"N": 0.1}, M1=10, M2=1, M3=6) == pytest.approx(0.05)
+
+
+def test_functions_and_ch2o():
+    assert compile_formula("sqrt(M3) + max(M1, M2)").evaluate(M1=1, M2=2, M3=9) == 5.0
+    expr = compile_formula(CH2O_FORMULA, ("S", "t"), {"N": 1, "F": 1})
+    assert expr.evaluate({"N": 1, "F": 1}, S=2, t=3) == 2.0
+
+
+@pytest.mark.parametrize("text", [
+    "", "   ", "M3 +", "__import__('os')", "M3.real", "M1[0]", "M1 < M2",
+    "lambda: 1", "X * 2", "open('f')", "sqrt(1, 2)", "'a' * 3", "True + M1",
+])
+def test_rejected(text):
+    with pytest.raises(FormulaError):
+        compile_formula(text)
+
+
+def test_missing_constant_value():
+    expr = compile_formula("M3 * N", constants={"N": 1})
+    with pytest.raises(FormulaError):
+        expr.evaluate({}, M3=1)
+
+
+def test_scalar_division_by_zero_raises():
+    with pytest.raises(ZeroDivisionError):
+        compile_formula("M1 / M2").evaluate(M1=1, M2=0)
+
+
+def test_huge_integer_power_stays_float():
+    with pytest.raises(OverflowError):
+        compile_formula("9**9**9").evaluate()
+
+
+def test_evaluate_many_matches_scalar():
+    expr = compile_formula("M3 * N / M1", constants={"N": 2})
+    m1, m3 = np.array([1.0, 2.0, 0.0]), np.array([3.0, 4.0, 5.0])
+    out = expr.evaluate_many({"N": 2}, M1=m1, M2=np.zeros(3), M3=m3)
+    assert out[:2].tolist() == [6.0, 4.0] and math.isinf(out[2])
+    const = compile_formula("2 * N", constants={"N": 1}).evaluate_many({"N": 1}, M3=m3)
+    assert const.tolist() == [2.0, 2.0, 2.0]
+
+
+def test_compiled_once_per_text():
+    before = cache_info().hits
+    a = compile_formula("M1 + M2 + M3 + 42")
+    b = compile_formula("M1 + M2 + M3 + 42")
+    assert a is b and cache_info().hits == before + 1
+
+
+def test_evaluate_many_constant_division_gives_inf():
+    expr = compile_formula("M3 + 1/(N-2)", constants={"N": 2})
+    assert np.isinf(expr.evaluate_many({"N": 2}, M3=np.ones(2))).all()
+    with pytest.raises(ZeroDivisionError):
+        compile_formula("M3 + 1/0").evaluate_many(M3=np.ones(2))
@@ -0,0 +1,100 @@
+import json
+import os
+import threading
+
+import pytest
+
+import formula_store
+from formula_store import SCHEMA, FormulaStore, to_v3
+
+V3 = "F1,10,1,0.5,0.2,,,1,1,1,3,100,100,100,8,8,8,8,8,8,(M1+M3)*N,2\n"
+
+
+def store(tmp_path, legacy=None):
+    return FormulaStore(str(tmp_path / "formulas.json"), legacy and str(legacy))
+
+
+def test_round_trip(tmp_path):
+    s = store(tmp_path)
+    s.save({"name": "A", "sample_ml": 10, "math": "M3*N"})
+    rec = FormulaStore(str(tmp_path / "formulas.json"), None).get("A")
+    assert rec["sample_ml"] == "10" and rec["math"] == "M3*N"
+    assert rec["thr_plus_r"] == "20"             # eksik alan varsayılan
+    s.delete("A")
+    assert "A" not in s and len(s) == 0
+    with open(tmp_path / "formulas.json", encoding="utf-8") as f:
+        assert json.load(f) == {"schema": SCHEMA, "formulas": {}}
+
+
+def test_empty_name_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        store(tmp_path).save({"name": ""})
+
+
+def test_legacy_import_on_first_open(tmp_path):
+    legacy = tmp_path / "formulas.txt"
+    legacy.write_text("\n" + V3, encoding="utf-8")
+    s = store(tmp_path, legacy)
+    assert s.names() == ["F1"]
+    rec = s.get("F1")
+    assert rec["math"] == "(M1+M3)*N,2"           # virgüllü math bölünmez
+    assert to_v3(rec)[:4] == ["F1", "10", "1", "0.5"]
+    # JSON oluştu: txt değişse de yeniden içe aktarılmaz
+    legacy.write_text(V3.replace("F1", "F2"), encoding="utf-8")
+    assert store(tmp_path, legacy).names() == ["F1"]
+
+
+def test_import_keeps_existing_names(tmp_path):
+    legacy = tmp_path / "formulas.txt"
+    legacy.write_text(V3, encoding="utf-8")
+    s = store(tmp_path)
+    s.save({"name": "F1", "sample_ml": "99"})
+    assert s.import_csv(str(legacy)) == 1
+    assert s.get("F1")["sample_ml"] == "99"
+    s.import_csv(str(legacy), overwrite=True)
+    assert s.get("F1")["sample_ml"] == "10"
+
+
+def test_failed_write_leaves_file_intact(tmp_path, monkeypatch):
+    s = store(tmp_path)
+    s.save({"name": "A"})
+    before = (tmp_path / "formulas.json").read_bytes()
+
+    def boom(*_a, **_kw):
+        raise OSError("disk dolu")
+    monkeypatch.setattr(formula_store.json, "dump", boom)
+    with pytest.raises(OSError):
+        s.save({"name": "B"})
+    assert (tmp_path / "formulas.json").read_bytes() == before
+    monkeypatch.undo()
+    assert store(tmp_path).names() == ["A"]
+
+
+def test_no_temp_files_left(tmp_path):
+    s = store(tmp_path)
+    s.save({"name": "A"})
+    assert sorted(os.listdir(tmp_path)) == ["formulas.json", "formulas.json.lock"]
+
+
+def test_writers_do_not_lose_each_others_records(tmp_path):
+    # İki ayrı depo (iki pencere / süreç gibi) aynı dosyaya aynı anda yazar
+    a, b = store(tmp_path), store(tmp_path)
+    a.names()
+    b.names()
+
+    def save_many(s, prefix):
+        for i in range(20):
+            s.save({"name": f"{prefix}{i}"})
+    threads = [threading.Thread(target=save_many, args=(s, p)) for s, p in ((a, "a"), (b, "b"))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(store(tmp_path)) == 40
+    assert len(a) == 40                          # dosya değişti: a'nın indeksi tazelenir
+
+
+def test_newer_schema_refused(tmp_path):
+    (tmp_path / "formulas.json").write_text(json.dumps({"schema": SCHEMA + 1, "formulas": {}}))
+    with pytest.raises(ValueError):
+        store(tmp_path).names()
@@ -0,0 +1,57 @@
+import urllib.request
+
+from metrics import Histogram, Metrics, PhaseTimer
+
+
+def test_histogram_buckets_and_quantile():
+    h = Histogram((0.1, 1, 10))
+    for v in (0.05, 0.1, 0.5, 20):
+        h.observe(v)
+    assert h.cumulative() == [2, 3, 3, 4]        # le=0.1 dahil
+    assert h.quantile(0.5) == 0.1 and h.quantile(1.0) == float("inf")
+
+
+def test_phase_timer_attributes_time_to_states():
+    m = Metrics()
+    clock = iter([0, 1, 4, 4, 6, 7, 9]).__next__
+    pt = PhaseTimer(m, clock=clock)
+    pt("state", {"state": "dosing"})             # 0
+    pt("cycle", {})                              # 1
+    pt("state", {"state": "titrant"})            # 4
+    pt("state", {"state": "settling"})           # 4
+    pt("cycle", {})                              # 6
+    pt("state", {"state": "done"})               # 7
+    pt("completed", {"reason": "target"})        # 9
+    rows = {(name, tuple(sorted(lbl.items()))): (n, mean) for name, lbl, n, mean, _p, _l in m.snapshot()}
+    assert rows[("phase_seconds", (("phase", "dosing"),))] == (1, 4.0)
+    assert rows[("phase_seconds", (("phase", "settling"),))] == (1, 3.0)
+    assert rows[("cycle_seconds", ())] == (2, 4.0)   # 1->6, 6->9
+    assert rows[("test_seconds", (("result", "target"),))] == (1, 9.0)
+    assert 'titration_tests_total{result="target"} 1' in m.prometheus_text()
+
+
+def test_aborted_test_counted_once():
+    m = Metrics()
+    pt = PhaseTimer(m, clock=iter(range(10)).__next__)
+    pt("state", {"state": "dosing"})
+    pt("state", {"state": "aborted"})
+    pt("state", {"state": "idle"})
+    assert m.prometheus_text().count('titration_tests_total{result="aborted"} 1') == 1
+
+
+def test_prometheus_text_file_and_http(tmp_path):
+    m = Metrics()
+    m.describe("serial_rtt_seconds", "RTT")
+    m.observe("serial_rtt_seconds", 0.02, cmd='PH"1')
+    text = m.prometheus_text()
+    assert "# HELP titration_serial_rtt_seconds RTT" in text
+    assert 'titration_serial_rtt_seconds_count{cmd="PH\\"1"} 1' in text
+    path = tmp_path / "m.prom"
+    m.write_textfile(str(path))
+    assert path.read_text() == text
+    host, port = m.serve(0)
+    try:
+        with urllib.request.urlopen(f"http://{host}:{port}/metrics", timeout=5) as r:
+            assert r.read().decode() == text
+    finally:
+        m.close()
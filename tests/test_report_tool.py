@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+
+import report_tool
+
+
+def test_constant_parsed_by_argparse():
+    assert report_tool._constant(" N = 1.02") == ("N", 1.02)
+
+
+@pytest.mark.parametrize("bad", ["N", "N=abc", "=3"])
+def test_bad_constant_is_a_usage_error(bad, tmp_path, capsys):
+    with pytest.raises(SystemExit) as e:
+        report_tool.main(["--db", str(tmp_path / "r.sqlite"), "stats", "--recompute", "-c", bad])
+    assert e.value.code == 2
+    assert "AD=DEĞER" in capsys.readouterr().err
+
+
+@pytest.mark.parametrize("opt", ["--since", "--until"])
+def test_bad_date_is_a_usage_error(opt, tmp_path, capsys):
+    with pytest.raises(SystemExit) as e:
+        report_tool.main(["--db", str(tmp_path / "r.sqlite"), "stats", opt, "2024-13-01"])
+    assert e.value.code == 2
+    assert "YYYY-MM-DD" in capsys.readouterr().err
+
+
+def test_date_filters(tmp_path, capsys):
+    report_tool.main(["--db", str(tmp_path / "r.sqlite"), "stats", "--since", "2024-01-01",
+                      "--until", "2024-12-31"])
+    assert "m3_ml" in capsys.readouterr().out
+
+
+def test_recompute_skips_failing_formula(capsys):
+    data = {"m3_ml": np.array([1.0, 2.0]), "sample_ml": np.array([10.0, 10.0]),
+            "indicator_ml": np.array([1.0, 1.0]),
+            "math_formula": np.array(["M3*N", "M3 + 1/0"], dtype=object)}
+    report_tool.recompute(data, {"N": 2})
+    assert data["math_result"][0] == 2.0 and np.isnan(data["math_result"][1])
+    assert "Formül atlandı" in capsys.readouterr().err
@@ -0,0 +1,45 @@
+from rgb_filter import EndpointClassifier
+
+
+def make(confirm_n=3, **kw):
+    return EndpointClassifier((90, 90, 90), (110, 110, 110), confirm_n, **kw)
+
+
+def test_single_outlier_is_ignored():
+    c = make()
+    for _ in range(4):
+        assert c.add((10, 20, 30)) == c.OUT
+    assert c.add((200, 200, 200)) == c.OUTLIER
+    assert c.add((10, 20, 30)) == c.OUT
+    assert c.value == (10, 20, 30)
+    assert c.rejected == 1
+
+
+def test_step_change_is_accepted_after_max_rejects():
+    c = make()
+    for _ in range(4):
+        c.add((10, 20, 30))
+    verdicts = [c.add((100, 100, 100)) for _ in range(20)]
+    assert verdicts[:3] == [c.OUTLIER] * 3
+    assert verdicts[3] == c.IN
+    assert c.value == (100, 100, 100)
+    assert c.confirmed
+
+
+def test_confirmation_needs_consecutive_in_samples():
+    c = make(confirm_n=3)
+    assert c.add((100, 100, 100)) == c.IN
+    assert c.add((100, 100, 100)) == c.IN
+    assert not c.confirmed
+    assert c.add((100, 100, 100)) == c.IN
+    assert c.confirmed
+
+
+def test_reset_clears_history():
+    c = make()
+    for _ in range(5):
+        c.add((100, 100, 100))
+    c.reset()
+    assert c.value is None and c.consecutive == 0
+    assert c.add((10, 20, 30)) == c.OUT
+
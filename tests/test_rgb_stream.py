@@ -0,0 +1,59 @@
+import numpy as np
+
+from rgb_stream import Fq2Framer, RgbRing
+
+
+def feed_all(framer, chunks):
+    out = []
+    for c in chunks:
+        out += framer.feed(c)
+    return out
+
+
+def test_single_line_records_across_chunks():
+    f = Fq2Framer()
+    assert feed_all(f, [b"10,20,", b"30\r\n40;50;6", b"0\n"]) == [(10, 20, 30), (40, 50, 60)]
+
+
+def test_three_line_records_with_crlf_split_between_chunks():
+    f = Fq2Framer()
+    assert feed_all(f, [b"1\r", b"\n2\r", b"\n3\r\n"]) == [(1, 2, 3)]
+    assert f.bad_lines == 0
+
+
+def test_lost_line_resyncs_on_silence():
+    f = Fq2Framer()
+    assert f.feed(b"1\r\n2\r\n") == []          # B kayboldu
+    assert f.flush() == []
+    assert f.bad_lines == 1
+    assert f.feed(b"4\r\n5\r\n6\r\n") == [(4, 5, 6)]
+
+
+def test_lost_line_resyncs_on_blank_line():
+    f = Fq2Framer()
+    assert f.feed(b"1\r\n2\r\n\r\n4\r\n5\r\n6\r\n\r\n") == [(4, 5, 6)]
+
+
+def test_flush_completes_unterminated_record():
+    f = Fq2Framer()
+    assert f.feed(b"7\n8\n9") == []
+    assert f.flush() == [(7, 8, 9)]
+    assert f.bad_lines == 0
+
+
+def test_garbage_without_newline_is_dropped():
+    f = Fq2Framer(max_line=8)
+    assert f.feed(b"x" * 20) == [] and f.bad_lines == 1
+    assert f.feed(b"\n1 2 3\n") == [(1, 2, 3)]
+
+
+def test_ring_since_returns_missed_records():
+    ring = RgbRing(capacity=4)
+    ring.push(0.0, (1, 2, 3))
+    seq = ring.seq
+    ring.extend(1.0, [(4, 5, 6), (7, 8, 9)])
+    seq2, _t, rgb, lost = ring.since(seq)
+    assert (seq2, lost) == (3, 0)
+    assert np.array_equal(rgb, [[4, 5, 6], [7, 8, 9]])
+    ring.extend(2.0, [(0, 0, 0)] * 5)
+    assert ring.since(seq2)[3] == 1              # kapasite aşıldı
@@ -0,0 +1,30 @@
+from types import SimpleNamespace
+
+from run_archive import RunArchive, RunRecorder, pack_trace, unpack_trace
+
+
+def test_trace_round_trip():
+    cycles = [{"t": 1.5, "m3": 0.5, "rgb": (1, 2, 3), "ph": None, "phases": {"titrant": 0.25}}]
+    out = unpack_trace(pack_trace(cycles))
+    assert out[0]["rgb"] == (1, 2, 3) and out[0]["ph"] is None
+    assert out[0]["phases"]["titrant"] == 0.25
+
+
+def test_recorder_commits_completed_run(tmp_path):
+    archive = RunArchive(str(tmp_path / "runs.sqlite"), flush_s=0.01)
+    formula = SimpleNamespace(name="F1", sample_ml=10.0, indicator_ml=1.0, titrant_ml=0.5,
+                              preload_ml=0.0, math_formula="M3*N")
+    engine = SimpleNamespace(formula=formula, m3_dispensed=0.0, cycles=0)
+    committed = []
+    rec = RunRecorder(archive, engine, {"N": 2}, clock=iter(range(100)).__next__,
+                      on_commit=committed.append)
+    rec("state", {"state": "dosing"})
+    rec("state", {"state": "titrant"})
+    rec("cycle", {"m3": 0.5})
+    rec("completed", {"reason": "target", "m3": 0.5, "cycles": 1, "rgb": (1, 2, 3)})
+    assert [r["result"] for r in committed] == ["target"]
+    assert archive.flush()
+    rows = list(archive.query())
+    archive.close()
+    assert len(rows) == 1 and rows[0]["math_result"] == 1.0
+    assert len(unpack_trace(rows[0]["trace"])) == 1
@@ -0,0 +1,119 @@
+import queue
+import threading
+import time
+
+from serial_transport import SerialTransport, split_tag
+
+
+class FakeBoard:
+    """serial.Serial yerine: satırları yürütür; ilk deaf_s saniye (reset) gelenleri yutar."""
+    def __init__(self, deaf_s=0.0, tagged=True, busy=()):
+        self.is_open = True
+        self.t0 = time.monotonic()
+        self.deaf_s = deaf_s
+        self.tagged = tagged
+        self.busy = set(busy)                    # cevap vermeyen (uzun süren) komutlar
+        self.lines = []                          # kartın gördüğü satırlar
+        self.written = []                        # porta yazılan her satır
+        self._rx = queue.Queue()
+        self._buf = b""
+        self._lock = threading.Lock()
+
+    @property
+    def in_waiting(self):
+        return len(self._buf)
+
+    def write(self, data):
+        line = data.decode().strip()
+        with self._lock:
+            self.written.append(line)
+        if time.monotonic() - self.t0 < self.deaf_s:
+            return len(data)
+        tag, body = split_tag(line)
+        self.lines.append(body)
+        if body.split(" ")[0] in self.busy:
+            return len(data)
+        if tag is not None and not self.tagged:
+            self._rx.put(b"ERR\n")
+            return len(data)
+        reply = "PONG" if body == "PING" else "DONE"
+        self._rx.put((f"#{tag} {reply}\n" if tag is not None else reply + "\n").encode())
+        return len(data)
+
+    def read(self, size=1):
+        if not self._buf:
+            try:
+                self._buf = self._rx.get(timeout=0.05)
+            except queue.Empty:
+                return b""
+        out, self._buf = self._buf[:size], self._buf[size:]
+        return out
+
+    def cancel_read(self):
+        self.is_open = False
+
+
+def transport(board, **kw):
+    t = SerialTransport(board, **kw)
+    t.start()
+    return t
+
+
+def test_handshake_survives_board_reset():
+    board = FakeBoard(deaf_s=1.5)
+    t = transport(board)
+    try:
+        ok = t.enable_tags(timeout_s=0.5, attempts=6)
+        f = t.submit("SET_RATE 1 1250 2500 400", "DONE", 5.0)
+        assert ok.result(5) is True
+        assert f.result(5) == "DONE"
+        # SET_RATE el sıkışmadan önce yazılmadı, kart onu gördü
+        assert board.written.index(next(w for w in board.written if "SET_RATE" in w)) > \
+            max(i for i, w in enumerate(board.written) if w.endswith("PING"))
+        assert "SET_RATE 1 1250 2500 400" in board.lines
+    finally:
+        t.stop()
+
+
+def test_old_firmware_stays_untagged():
+    board = FakeBoard(tagged=False)
+    t = transport(board)
+    try:
+        assert t.enable_tags(timeout_s=0.5).result(3) is False
+        assert sum(w.endswith("PING") for w in board.written) == 1   # ERR cevabı: tekrar yok
+        assert t.submit("CAMERA_TRIG", "DONE", 2.0).result(3) == "DONE"
+    finally:
+        t.stop()
+
+
+def test_long_commands_wait_behind_a_blocking_move():
+    # MOVE_MULTI cevapsız (motorlar dönüyor): arkasına RX tamponunu taşıracak satır yazılmamalı
+    board = FakeBoard(busy=("MOVE_MULTI",))
+    t = transport(board)
+    try:
+        assert t.enable_tags(timeout_s=0.5).result(3) is True
+        t.submit("MOVE_MULTI 1:38000 2:38000 3:38000", "DONE", 1.0)
+        rates = [t.submit(f"SET_RATE {i} 1250 2500 400", "DONE", 5.0) for i in (1, 2, 3)]
+        short = t.submit("PH_MEASURE", "DONE", 5.0)
+        time.sleep(0.3)
+        in_flight = [w for w in board.written if "PING" not in w]
+        assert sum(len(w) + 1 for w in in_flight) <= 64
+        assert len(in_flight) == 1                # 43 + 31 bayt bütçeyi aşar
+        # MOVE zaman aşımına düşünce kalanlar sırayla gider
+        assert [f.result(5) for f in rates] == ["DONE"] * 3
+        assert short.result(5) == "DONE"
+    finally:
+        t.stop()
+
+
+def test_short_commands_still_pipeline():
+    board = FakeBoard(busy=("CAMERA_TRIG",))
+    t = transport(board)
+    try:
+        t.enable_tags(timeout_s=0.5).result(3)
+        for _ in range(5):
+            t.submit("CAMERA_TRIG", "DONE", 1.0)
+        time.sleep(0.2)
+        assert sum("CAMERA_TRIG" in w for w in board.written) == 3   # 3 x 18 bayt <= 56
+    finally:
+        t.stop()
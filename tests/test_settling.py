@@ -0,0 +1,101 @@
+import random
+from concurrent.futures import Future
+
+from settling import SettlingDetector
+from titration_engine import FormulaParams, ManualScheduler, TitrationEngine
+
+
+def jittered(period, n, jitter=0.1, seed=1):
+    rnd = random.Random(seed)
+    return [i * period + rnd.uniform(-jitter, jitter) for i in range(n)]
+
+
+def first_stable(det, times, rgb=lambda t: (50, 60, 70)):
+    det.reset(0.0)
+    for t in times:
+        det.add(t, rgb(t))
+        if det.stable():
+            return t
+    return None
+
+
+def test_for_period_fires_on_jittered_triggers():
+    for seed in range(20):
+        t = first_stable(SettlingDetector.for_period(0.5), jittered(0.5, 20, seed=seed))
+        assert t is not None and t < 3.0, seed
+
+
+def test_drifting_colour_is_not_stable():
+    det = SettlingDetector.for_period(0.5)
+    assert first_stable(det, jittered(0.5, 20), rgb=lambda t: (50 + 5 * t, 60, 70)) is None
+
+
+def test_mean_of_window():
+    det = SettlingDetector.for_period(0.5)
+    for i, v in enumerate((48, 50, 52, 50)):
+        det.add(i * 0.5, (v, v, v))
+    assert det.mean() == (50, 50, 50)
+
+
+# ---- motor: çökme erken biter, karar pencere ortalamasıyla ----
+class StubDevice:
+    connected = False
+
+    def __init__(self, sch):
+        self.sch = sch
+        self.commands = []
+
+    def _later(self, delay, value="DONE"):
+        f = Future()
+        self.sch.call_later(delay, lambda: f.set_result(value))
+        return f
+
+    def steps_for(self, idx, ml):
+        return int(ml * 1000)
+
+    def ml_for(self, idx, steps):
+        return steps / 1000
+
+    def move_ml(self, ml):
+        return self._later(0.1)
+
+    def move_steps(self, steps):
+        return self._later(0.1)
+
+    def timed(self, name, s):
+        self.commands.append(name)
+        return self._later(s, f"END:{name}")
+
+    def measure_ph(self):
+        return self._later(0.1, None)
+
+    def camera_trigger(self):
+        self.commands.append("CAMERA_TRIG")
+        return self._later(0.05)
+
+    def command(self, cmd, token="DONE", timeout_s=5.0):
+        self.commands.append(cmd)
+        return self._later(0.01)
+
+
+def test_engine_settles_early_and_decides_on_mean():
+    sch = ManualScheduler()
+    dev = StubDevice(sch)
+    eng = TitrationEngine(dev, sch, settle_trigger_s=0.5)
+    events = []
+    eng.add_listener(lambda e, d: events.append((e, d)))
+    f = FormulaParams(titrant_ml=0.5, air_s=0.1, cokme_s=10, target=(100, 100, 100),
+                      thr_plus=(5, 5, 5), stream_settle=True)
+    assert eng.start(f)
+    rnd = random.Random(3)
+    t_settle = None
+    while sch.now() < 30 and eng.running:
+        sch.advance(0.5 + rnd.uniform(-0.1, 0.1))
+        if eng.state == eng.SETTLING:
+            t_settle = t_settle if t_settle is not None else sch.now()
+            eng.feed_rgb((100 + rnd.choice((-1, 0, 1)), 100, 100))
+    done = [d for e, d in events if e == "completed"]
+    assert done and done[0]["reason"] == "target"
+    assert "COKME_OFF" in dev.commands
+    assert sch.now() - t_settle < 5.0              # cokme_s (10 sn) beklenmedi
+    assert dev.commands.count("CAMERA_TRIG") >= 3   # yalnızca çökme sırasındaki tetikler
@@ -0,0 +1,92 @@
+import socket
+
+import pytest
+
+from traffic_log import (SERIAL_RX, SERIAL_TX, TCP_RX, RecordingSerial, ReplaySerial, ReplaySession,
+                         ReplayTcpServer, TrafficRecorder, parse_replay_spec, read_log)
+
+
+@pytest.mark.parametrize("spec, expected", [
+    ("olay.tlog", ("olay.tlog", 1.0)),
+    ("olay.tlog:0", ("olay.tlog", 0.0)),
+    ("logs/a:b.tlog:2.5", ("logs/a:b.tlog", 2.5)),
+    ("logs/a:b.tlog", ("logs/a:b.tlog", 1.0)),
+    ("C:\\logs\\run.bin", ("C:\\logs\\run.bin", 1.0)),
+    (":3", (":3", 1.0)),
+])
+def test_replay_spec(spec, expected):
+    assert parse_replay_spec(spec) == expected
+
+
+class FakePort:
+    def __init__(self, replies):
+        self.replies = list(replies)
+
+    def write(self, data):
+        return len(data)
+
+    def read(self, size=1):
+        return self.replies.pop(0) if self.replies else b""
+
+
+def record(path):
+    rec = TrafficRecorder(str(path))
+    ser = RecordingSerial(FakePort([b"#1 DONE\n", b"", b"#2 PH:7.0", b"1\n"]), rec)
+    ser.write(b"#1 MOVE3 100\n")
+    ser.read(64)
+    ser.read(64)                                 # boş okuma kayda girmez
+    rec.record(TCP_RX, b"101\r\n99\r\n")
+    ser.write(b"#2 PH\n")
+    ser.read(64)
+    rec.record(TCP_RX, b"100\r\n")
+    ser.read(64)
+    rec.close()
+
+
+def test_log_round_trip(tmp_path):
+    path = tmp_path / "olay.tlog"
+    record(path)
+    assert [(ch, d) for _, ch, d in read_log(str(path))] == [
+        (SERIAL_TX, b"#1 MOVE3 100\n"), (SERIAL_RX, b"#1 DONE\n"), (TCP_RX, b"101\r\n99\r\n"),
+        (SERIAL_TX, b"#2 PH\n"), (SERIAL_RX, b"#2 PH:7.0"), (TCP_RX, b"100\r\n"), (SERIAL_RX, b"1\n"),
+    ]
+
+
+def test_truncated_tail_is_ignored(tmp_path):
+    path = tmp_path / "olay.tlog"
+    record(path)
+    with open(path, "ab") as f:
+        f.write(b"\x01\x02")
+    assert len(read_log(str(path))) == 7
+
+
+def test_replay_is_byte_identical(tmp_path):
+    path = tmp_path / "olay.tlog"
+    record(path)
+    session = ReplaySession(str(path), speed=0, gate_timeout_s=2.0)
+    ser = ReplaySerial(session)
+    server = ReplayTcpServer(session).start()
+    try:
+        with socket.create_connection(server.address, timeout=5) as s:
+            ser.write(b"#1 MOVE3 100\n")
+            rx = ser.read(64)
+            tcp = s.recv(64)
+            ser.write(b"#2 PH\n")
+            while not ser.finished:
+                rx += ser.read(64)
+            while len(tcp) < len(b"101\r\n99\r\n100\r\n"):
+                tcp += s.recv(64)
+    finally:
+        ser.close()
+        server.close()
+    assert rx == b"#1 DONE\n#2 PH:7.01\n"
+    assert tcp == b"101\r\n99\r\n100\r\n"
+    assert session.mismatches == 0 and session.tx_count == 2
+
+
+def test_replay_counts_diverging_writes(tmp_path):
+    path = tmp_path / "olay.tlog"
+    record(path)
+    session = ReplaySession(str(path), speed=0)
+    session.on_write(b"#1 MOVE3 999\n")
+    assert session.mismatches == 1
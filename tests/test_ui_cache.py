@@ -0,0 +1,66 @@
+import pytest
+
+pytest.importorskip("PyQt5")
+
+from PyQt5.QtWidgets import QApplication, QWidget
+
+import ui_cache
+
+UI = """<?xml version="1.0" encoding="UTF-8"?>
+<ui version="4.0">
+ <class>Form</class>
+ <widget class="QWidget" name="Form">
+  <widget class="QLabel" name="{name}">
+   <property name="text"><string>{text}</string></property>
+  </widget>
+ </widget>
+</ui>
+"""
+
+
+@pytest.fixture(scope="module")
+def qapp():
+    return QApplication.instance() or QApplication([])
+
+
+def write_ui(path, name="label", text="a"):
+    path.write_text(UI.format(name=name, text=text), encoding="utf-8")
+
+
+def test_compiled_then_cached(qapp, tmp_path):
+    ui = tmp_path / "form.ui"
+    write_ui(ui)
+    cache = tmp_path / "cache"
+    w = QWidget()
+    assert ui_cache.load_ui(ui, w, cache) == "compiled"
+    assert w.label.text() == "a"
+    w2 = QWidget()
+    assert ui_cache.load_ui(ui, w2, cache) == "cached"
+    assert w2.label.text() == "a"
+
+
+def test_changed_ui_recompiles_and_drops_stale_module(qapp, tmp_path):
+    ui = tmp_path / "form.ui"
+    cache = tmp_path / "cache"
+    write_ui(ui)
+    ui_cache.load_ui(ui, QWidget(), cache)
+    old = ui_cache.cache_path(ui, cache)
+    write_ui(ui, name="renamed", text="b")
+    new = ui_cache.cache_path(ui, cache)
+    assert new != old
+    w = QWidget()
+    assert ui_cache.load_ui(ui, w, cache) == "compiled"
+    assert w.renamed.text() == "b" and not hasattr(w, "label")
+    assert [p.name for p in cache.glob("ui_form_*.py")] == [new.name]
+
+
+def test_broken_cache_falls_back_to_loadui(qapp, tmp_path):
+    ui = tmp_path / "form.ui"
+    cache = tmp_path / "cache"
+    write_ui(ui)
+    out = ui_cache.cache_path(ui, cache)
+    out.parent.mkdir()
+    out.write_text("raise RuntimeError('bozuk')\n")
+    w = QWidget()
+    assert ui_cache.load_ui(ui, w, cache) == "loadUi"
+    assert w.label.text() == "a"
@@ -0,0 +1,14 @@
+from view_model import ViewModel
+
+
+def test_only_latest_changed_values_are_drawn():
+    vm = ViewModel()
+    vm.publish("status_label", "a")
+    vm.publish("status_label", "b")
+    vm.publish_many({"lcd_R": 1, "lcd_G": 2})
+    assert vm.take_changes() == {"status_label": "b", "lcd_R": 1, "lcd_G": 2}
+    assert vm.take_changes() == {}
+    vm.publish("status_label", "b")              # ekrandakiyle aynı: çizilmez
+    vm.publish("lcd_R", 5)
+    assert vm.take_changes() == {"lcd_R": 5}
+    assert vm.get("lcd_G") == 2 and vm.get("yok", 0) == 0
@@ -0,0 +1,516 @@
+"""Titrasyon döngüsünün UI'den bağımsız durum makinesi.
+
+TitrationEngine tek bir "olay döngüsü" üzerinde çalışır: zamanlama ve thread
+geçişleri enjekte edilen scheduler üzerinden yapılır (Qt'de QTimer, başsız
+kullanımda ThreadScheduler, testlerde sanal saatli ManualScheduler). Motor /
+pompa komutları TitrationDevice'a gider; olaylar add_listener ile kayıtlı
+fonksiyonlara fn(olay, veri) olarak iletilir, UI yalnızca bunları çizer.
+"""
+import heapq
+import itertools
+import threading
+import time
+
+from device import is_error
+from dosing import DosePlanner
+from settling import SettlingDetector
+from rgb_filter import EndpointClassifier
+
+
+# ---------------- Formül parametreleri ----------------
+def _fnum(x, d):
+    try:
+        return float(str(x).replace(',', '.')) if str(x).strip() != "" else d
+    except Exception:
+        return d
+
+
+class FormulaParams:
+    """Bir ölçümün bütün ayarları; test başında bir kez ayrıştırılır."""
+    __slots__ = ("name", "sample_ml", "indicator_ml", "titrant_ml", "preload_ml",
+                 "air_s", "water_s", "valve_s", "cokme_s",
+                 "target", "thr_plus", "thr_minus", "lo", "hi", "math_formula", "adaptive",
+                 "expected_ml", "stream_settle")
+
+    def __init__(self, name="", sample_ml=0.0, indicator_ml=0.0, titrant_ml=0.0, preload_ml=0.0,
+                 air_s=5.0, water_s=3.0, valve_s=3.0, cokme_s=10.0,
+                 target=(0, 0, 0), thr_plus=(20, 20, 20), thr_minus=None, math_formula="",
+                 adaptive=False, expected_ml=None, stream_settle=False):
+        self.name = name
+        self.sample_ml = float(sample_ml)
+        self.indicator_ml = float(indicator_ml)
+        self.titrant_ml = float(titrant_ml)
+        self.preload_ml = float(preload_ml)
+        self.air_s = float(air_s)
+        self.water_s = float(water_s)
+        self.valve_s = float(valve_s)
+        self.cokme_s = float(cokme_s)
+        self.target = tuple(int(v) for v in target)
+        self.thr_plus = tuple(int(v) for v in thr_plus)
+        self.thr_minus = tuple(int(v) for v in (thr_minus if thr_minus is not None else thr_plus))
+        # Hedef kutusu bir kez hesaplanır; ölçüm başına yalnızca karşılaştırma yapılır
+        self.lo = tuple(t - m for t, m in zip(self.target, self.thr_minus))
+        self.hi = tuple(t + p for t, p in zip(self.target, self.thr_plus))
+        self.math_formula = math_formula
+        self.adaptive = bool(adaptive)          # titrant dozunu RGB izine göre büyüt
+        self.expected_ml = expected_ml          # geçmiş testlerin dönüm noktası (EndpointHistory)
+        self.stream_settle = bool(stream_settle)  # renk oturunca çökmeyi erken bitir
+
+    @classmethod
+    def from_fields(cls, p):
+        """
+        v3 şeması: name,m1,m2,m3,m3_preload,m4,m5,air,water,selenoid,cokme,R,G,B,thrR+,thrG+,thrB+,thrR-,thrG-,thrB-,math
+        Eksik kolonlarda MyApp.apply_formula ile aynı varsayılanlar kullanılır.
+        """
+        p = list(p)
+
+        def get(i, dflt=""):
+            return p[i] if i < len(p) else dflt
+
+        def inum(x, d):
+            return int(_fnum(x, d))
+
+        plus = tuple(inum(get(i, "20"), 20) for i in (14, 15, 16))
+        minus = tuple(inum(get(i, "20"), plus[k]) for k, i in enumerate((17, 18, 19)))
+        return cls(
+            name=get(0),
+            sample_ml=_fnum(get(1), 0), indicator_ml=_fnum(get(2), 0),
+            titrant_ml=_fnum(get(3), 0), preload_ml=_fnum(get(4), 0),
+            air_s=_fnum(get(7, "1"), 5), water_s=_fnum(get(8, "1"), 3),
+            valve_s=_fnum(get(9, "1"), 3), cokme_s=_fnum(get(10, "1"), 10),
+            target=tuple(inum(get(i, "0"), 0) for i in (11, 12, 13)),
+            thr_plus=plus, thr_minus=minus,
+            math_formula=get(20, ""),
+        )
+
+    def in_target(self, rgb) -> bool:
+        return all(lo <= v <= hi for v, lo, hi in zip(rgb, self.lo, self.hi))
+
+
+# ---------------- Zamanlayıcılar ----------------
+class TimerHandle:
+    __slots__ = ("when", "fn", "cancelled")
+
+    def __init__(self, when: float, fn):
+        self.when = when
+        self.fn = fn
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class ThreadScheduler:
+    """Gerçek zamanlı, kendi thread'inde çalışan basit olay döngüsü (başsız kullanım)."""
+    def __init__(self):
+        self._heap = []
+        self._seq = itertools.count()
+        self._cv = threading.Condition()
+        self._running = False
+        self._thread = None
+
+    def now(self) -> float:
+        return time.monotonic()
+
+    def call_later(self, delay_s: float, fn) -> TimerHandle:
+        h = TimerHandle(self.now() + max(0.0, delay_s), fn)
+        with self._cv:
+            heapq.heappush(self._heap, (h.when, next(self._seq), h))
+            self._cv.notify()
+        return h
+
+    def call_soon_threadsafe(self, fn):
+        return self.call_later(0.0, fn)
+
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="engine-loop", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout_s: float = 1.0):
+        with self._cv:
+            self._running = False
+            self._cv.notify()
+        if self._thread is not None:
+            self._thread.join(timeout_s)
+            self._thread = None
+
+    def _run(self):
+        while True:
+            with self._cv:
+                while self._running:
+                    if self._heap:
+                        wait_s = self._heap[0][0] - self.now()
+                        if wait_s <= 0:
+                            break
+                        self._cv.wait(wait_s)
+                    else:
+                        self._cv.wait()
+                if not self._running:
+                    return
+                _, _, h = heapq.heappop(self._heap)
+            if not h.cancelled:
+                try:
+                    h.fn()
+                except Exception as e:
+                    print("Engine callback hatası:", e)
+
+
+class ManualScheduler:
+    """
+    Sanal saatli zamanlayıcı: zaman yalnızca advance() ile ilerler. Başka
+    thread'lerden gelen işler run_pending()'de çalışır. Testlerde ve
+    benchmark'ta döngüyü gerçek süreyi beklemeden koşturmak içindir.
+    """
+    def __init__(self, start: float = 0.0):
+        self._now = start
+        self._heap = []
+        self._seq = itertools.count()
+        self._ready = []
+        self._lock = threading.Lock()
+
+    def now(self) -> float:
+        return self._now
+
+    def call_later(self, delay_s: float, fn) -> TimerHandle:
+        h = TimerHandle(self._now + max(0.0, delay_s), fn)
+        heapq.heappush(self._heap, (h.when, next(self._seq), h))
+        return h
+
+    def call_soon_threadsafe(self, fn):
+        with self._lock:
+            self._ready.append(fn)
+
+    def run_pending(self) -> int:
+        """Hazır işleri ve vakti gelmiş zamanlayıcıları çalıştırır; çalışan iş sayısı."""
+        n = 0
+        while True:
+            with self._lock:
+                ready, self._ready = self._ready, []
+            for fn in ready:
+                fn()
+                n += 1
+            if self._heap and self._heap[0][0] <= self._now:
+                _, _, h = heapq.heappop(self._heap)
+                if not h.cancelled:
+                    h.fn()
+                    n += 1
+                continue
+            if not ready:
+                return n
+
+    def advance(self, dt: float):
+        """Saati dt kadar ilerletir; aradaki zamanlayıcılar sırasıyla çalışır."""
+        end = self._now + dt
+        self.run_pending()
+        while self._heap and self._heap[0][0] <= end:
+            self._now = max(self._now, self._heap[0][0])
+            self.run_pending()
+        self._now = end
+        self.run_pending()
+
+    def next_deadline(self):
+        return self._heap[0][0] if self._heap else None
+
+
+# ---------------- Titrasyon Motoru ----------------
+class TitrationEngine:
+    """
+    Döngü: numune+indikatör -> [titrant dozu -> hava -> çökme (+pH) -> kamera -> RGB]*
+    RGB hedef kutusuna girince test biter. Olaylar:
+      state(state), status(text), cycle(cycle, dose, m3, endpoint), ph(value), rgb(rgb),
+      completed(rgb, m3, cycles, reason, duration_s, ph), error(message)
+    feed_rgb/complete/abort scheduler'ın thread'inden çağrılmalıdır.
+
+    Karar tek ölçümle verilmez: EndpointClassifier aykırı ölçümleri atar,
+    medyan + EMA ile yumuşatır; filtreli değer kutudaysa ama henüz art arda
+    confirm_n kez görülmediyse titrant eklenmeden kamera yeniden tetiklenir.
+
+    stream_settle açıksa çökme sırasında kamera settle_trigger_s aralıkla
+    tetiklenir (0: FQ2 zaten sürekli ölçüyor); gelen RGB'ler SettlingDetector'a
+    akar ve renk oturunca COKME_OFF ile pencere erken kapanır. cokme_s üst sınırdır.
+    """
+    IDLE, DOSING, TITRANT, SETTLING, CAMERA, WAIT_RGB, DONE, ABORTED = (
+        "idle", "dosing", "titrant", "settling", "camera", "wait_rgb", "done", "aborted")
+
+    def __init__(self, device, scheduler, rgb_timeout_s: float = 15.0, max_cycles: int = 500,
+                 settle_trigger_s: float = 0.5, confirm_n: int = 3):
+        self.device = device
+        self.scheduler = scheduler
+        self.rgb_timeout_s = rgb_timeout_s
+        self.max_cycles = max_cycles
+        self.settle_trigger_s = settle_trigger_s
+        self.confirm_n = confirm_n
+        # False: RGB kaynağı sürekli ölçüyor (yerel kamera), CAMERA_TRIG gönderilmez
+        self.external_trigger = True
+        self.listeners = []
+        self.state = self.IDLE
+        self.formula = None
+        self.planner = None
+        self.settler = None
+        self.classifier = None
+        self._confirm_triggers = 0
+        self.cycles = 0
+        self.m3_dispensed = 0.0
+        self.last_rgb = None
+        self.ph_values = []
+        self.t_start = None
+        self._gen = 0
+        self._inflight = []
+        self._rgb_timer = None
+        self._settle_fut = None
+        self._settle_timer = None
+        self._camera_retries = 0
+
+    # ---- olaylar ----
+    def add_listener(self, fn):
+        self.listeners.append(fn)
+
+    def _emit(self, event: str, **data):
+        for fn in list(self.listeners):
+            try:
+                fn(event, data)
+            except Exception as e:
+                print("Engine dinleyici hatası:", e)
+
+    def _set_state(self, state: str):
+        self.state = state
+        self._emit("state", state=state)
+
+    def _status(self, text: str):
+        self._emit("status", text=text)
+
+    @property
+    def running(self) -> bool:
+        return self.state not in (self.IDLE, self.DONE, self.ABORTED)
+
+    # ---- dış API ----
+    def start(self, formula: FormulaParams) -> bool:
+        if self.running or formula.titrant_ml <= 0:
+            return False
+        self._cancel_all()
+        self.formula = formula
+        self.planner = DosePlanner(formula.titrant_ml, formula.target, expected_ml=formula.expected_ml) \
+            if formula.adaptive else None
+        # Pencere tetik periyoduna göre (sürekli akışta varsayılan pencere)
+        self.settler = SettlingDetector.for_period(self.settle_trigger_s) if formula.stream_settle else None
+        self.classifier = EndpointClassifier(formula.lo, formula.hi, self.confirm_n)
+        self.cycles = 0
+        self.m3_dispensed = 0.0
+        self.last_rgb = None
+        self.ph_values = []
+        self.t_start = self.scheduler.now()
+        self._set_state(self.DOSING)
+        self._status("Test başlatıldı")
+        # Numune ve indikatör aynı anda dozlanır
+        self._await(self.device.move_ml({1: formula.sample_ml, 2: formula.indicator_ml}),
+                    lambda _r: self._next_cycle(), critical=True)
+        return True
+
+    def feed_rgb(self, rgb, t: float = None):
+        """Yeni RGB ölçümü. Kamera tetiklendikten (ya da akışta renk oturduktan) sonra karar verir."""
+        self.last_rgb = tuple(rgb)
+        self._emit("rgb", rgb=self.last_rgb)
+        if self.state == self.SETTLING and self.settler is not None:
+            if self.classifier.add(self.last_rgb) != EndpointClassifier.OUTLIER:
+                self.settler.add(self.scheduler.now() if t is None else t, self.last_rgb)
+                if self.settler.stable():
+                    self._on_stable()
+            return
+        if self.state != self.WAIT_RGB:
+            return
+        self._cancel_rgb_timer()
+        self._decide(self.classifier.add(self.last_rgb))
+
+    def _decide(self, verdict: str):
+        c = self.classifier
+        if c.confirmed:
+            self.last_rgb = c.value
+            self._status("Hedef RGB’ye ulaşıldı")
+            self._finish("target")
+        elif verdict == EndpointClassifier.OUT:
+            self._not_in_target(c.value)
+        elif self._confirm_triggers < self.confirm_n + 2:
+            # Kutuda ama doğrulanmadı (ya da aykırı ölçüm): titrant eklemeden yeniden ölç
+            self._confirm_triggers += 1
+            if verdict == EndpointClassifier.OUTLIER:
+                self._status("Aykırı RGB ölçümü yok sayıldı")
+            else:
+                self._status(f"Hedefte, doğrulanıyor ({c.consecutive}/{c.confirm_n})")
+            self._trigger_camera()
+        else:
+            self._fail("RGB ölçümü doğrulanamadı")
+
+    def _not_in_target(self, rgb):
+        r, g, b = rgb
+        self._status(f"RGB hedefte değil: ({r},{g},{b})")
+        if self.planner is not None:
+            self.planner.observe(self.m3_dispensed, rgb)
+        self._next_cycle()
+
+    def complete(self):
+        """Elle bitirme (complete_button)."""
+        if self.running:
+            self._finish("manual")
+
+    def abort(self, message: str = "Test iptal edildi"):
+        if self.running:
+            self._cancel_all()
+            self._set_state(self.ABORTED)
+            self._status(message)
+
+    # ---- döngü adımları ----
+    def _next_dose(self) -> float:
+        if self.cycles == 0:
+            return self.formula.titrant_ml + max(0.0, self.formula.preload_ml)
+        if self.planner is not None:
+            return self.planner.next_dose()
+        return self.formula.titrant_ml
+
+    def _next_cycle(self):
+        if self.cycles >= self.max_cycles:
+            self._fail("Maksimum döngü sayısına ulaşıldı")
+            return
+        # M3 motorun attığı adımdan sayılır: formüle giden hacim birebir dozlanan hacimdir
+        steps = self.device.steps_for(3, self._next_dose())
+        dose = self.device.ml_for(3, steps)
+        self.cycles += 1
+        self.m3_dispensed += dose
+        self._set_state(self.TITRANT)
+        self._emit("cycle", cycle=self.cycles, dose=dose, m3=self.m3_dispensed,
+                   endpoint=self.planner.predicted_endpoint() if self.planner is not None else None)
+        # Doz ve hava art arda kuyruğa alınır; hava bitince (END:AIR) çökme başlar
+        self._await(self.device.move_steps({3: steps}), lambda _r: self._status("Titrant eklendi"), critical=True)
+        self._await(self.device.timed("AIR", self.formula.air_s), self._on_air_done, critical=True)
+
+    def _on_air_done(self, _res):
+        self._set_state(self.SETTLING)
+        self._status("Çökme bekleniyor")
+        self.classifier.reset()
+        self._confirm_triggers = 0
+        # Çökme penceresi cihazda zamanlanır; kart bu sırada pH ölçümünü de cevaplar
+        self._settle_fut = self._await(self.device.timed("COKME", self.formula.cokme_s),
+                                       self._on_settled, critical=True)
+        self._await(self.device.measure_ph(), self._on_ph)
+        if self.settler is not None:
+            self.settler.reset(self.scheduler.now())
+            if self.settle_trigger_s > 0:
+                self._settle_timer = self.scheduler.call_later(self.settle_trigger_s, self._settle_tick)
+
+    def _settle_tick(self):
+        # Tetikli FQ2 için çökme boyunca periyodik ölçüm; cevabı beklenmez, RGB TCP'den gelir
+        self._settle_timer = None
+        if self.state != self.SETTLING or not self.external_trigger:
+            return
+        self._await(self.device.camera_trigger(), lambda _r: None)
+        self._settle_timer = self.scheduler.call_later(self.settle_trigger_s, self._settle_tick)
+
+    def _on_stable(self):
+        """Renk oturdu: çökme penceresini kapatıp pencere ortalamasıyla karar ver."""
+        waited = self.scheduler.now() - self.settler.t0
+        self._cancel_settle()
+        self.device.command("COKME_OFF", "DONE", 2.0)
+        self._status(f"Renk oturdu ({waited:.1f} sn)")
+        # Oturmuş pencerenin ortalaması tek başına yeterli ölçümdür; yeniden tetiklenmez
+        self.last_rgb = self.settler.mean()
+        if self.formula.in_target(self.last_rgb):
+            self._status("Hedef RGB’ye ulaşıldı")
+            self._finish("target")
+        else:
+            self._not_in_target(self.last_rgb)
+
+    def _on_ph(self, value):
+        if value is not None:
+            self.ph_values.append(value)
+            self._emit("ph", value=value)
+
+    def _on_settled(self, _res):
+        if self.state != self.SETTLING:
+            return
+        self._cancel_settle()
+        self._camera_retries = 0
+        self._trigger_camera()
+
+    def _trigger_camera(self):
+        if not self.external_trigger:
+            self._on_camera(None)                # sıradaki kare ölçümdür
+            return
+        self._set_state(self.CAMERA)
+        self._await(self.device.camera_trigger(), self._on_camera, critical=True)
+
+    def _on_camera(self, _res):
+        self._set_state(self.WAIT_RGB)
+        if self.external_trigger:
+            self._status("Kamera tetiklendi.")
+        self._rgb_timer = self.scheduler.call_later(self.rgb_timeout_s, self._on_rgb_timeout)
+
+    def _on_rgb_timeout(self):
+        self._rgb_timer = None
+        if self.state != self.WAIT_RGB:
+            return
+        if self._camera_retries < 1:
+            self._camera_retries += 1
+            self._status("RGB gelmedi, kamera yeniden tetikleniyor")
+            self._trigger_camera()
+        else:
+            self._fail("Kameradan RGB alınamadı")
+
+    def _finish(self, reason: str):
+        self._cancel_all()
+        self._set_state(self.DONE)
+        self._emit("completed", rgb=self.last_rgb, m3=self.m3_dispensed, cycles=self.cycles,
+                   reason=reason, duration_s=self.scheduler.now() - self.t_start,
+                   ph=self.ph_values[-1] if self.ph_values else None)
+
+    def _fail(self, message: str):
+        self._cancel_all()
+        self._set_state(self.ABORTED)
+        self._emit("error", message=message)
+
+    # ---- Future -> döngü ----
+    def _await(self, fut, fn, critical: bool = False):
+        """fut tamamlanınca fn(sonuç) döngü thread'inde çalışır; eski testten gelenler yok sayılır."""
+        gen = self._gen
+        self._inflight.append(fut)
+
+        def done(f):
+            if not f.cancelled():
+                self.scheduler.call_soon_threadsafe(lambda: self._resume(gen, f, fn, critical))
+        fut.add_done_callback(done)
+        return fut
+
+    def _resume(self, gen, fut, fn, critical):
+        if fut in self._inflight:
+            self._inflight.remove(fut)
+        if gen != self._gen or not self.running:
+            return
+        res = fut.result()
+        if critical and self.device.connected and is_error(res):
+            self._fail(f"Komut hatası: {res}")
+            return
+        fn(res)
+
+    def _cancel_rgb_timer(self):
+        if self._rgb_timer is not None:
+            self._rgb_timer.cancel()
+            self._rgb_timer = None
+
+    def _cancel_settle(self):
+        if self._settle_timer is not None:
+            self._settle_timer.cancel()
+            self._settle_timer = None
+        if self._settle_fut is not None:
+            self._settle_fut.cancel()
+            if self._settle_fut in self._inflight:
+                self._inflight.remove(self._settle_fut)
+            self._settle_fut = None
+
+    def _cancel_all(self):
+        self._gen += 1
+        self._cancel_rgb_timer()
+        self._cancel_settle()
+        for f in self._inflight:
+            f.cancel()
+        self._inflight = []
@@ -1,91 +1,162 @@
-import sys, socket, time, os, datetime, serial, serial.tools.list_ports, re
-from PyQt5 import uic, QtWidgets
-from PyQt5.QtCore import Qt, QTimer, QThread, pyqtSignal, QThreadPool
-from PyQt5.QtWidgets import QApplication, QMainWindow, QGraphicsScene, QGraphicsView
+import sys, socket, time, os, datetime, serial, serial.tools.list_ports, re, threading
+START_T0 = time.perf_counter()                   # açılış süreleri buna göre (import'lar dahil)
+import importlib.util
+import numpy as np
+from PyQt5 import QtWidgets
+from PyQt5.QtCore import Qt, QObject, QTimer, QThread, pyqtSignal, QThreadPool
+from PyQt5.QtWidgets import (QApplication, QMainWindow, QGraphicsScene, QGraphicsView, QLCDNumber, QLabel,
+                             QPlainTextEdit)
 from PyQt5.QtGui import QImage, QPixmap, QFont
 from pathlib import Path
+from concurrent.futures import Future
+from serial_transport import SerialTransport, startswith_token, split_tag
+from device import TitrationDevice, is_error
+from titration_engine import TitrationEngine, FormulaParams
+from dosing import EndpointHistory
+from rgb_stream import Fq2Framer, RgbRing
+from color_meter import RoiColorMeter
+from camera_capture import CaptureProcess
+from view_model import ViewModel
+from metrics import Metrics, PhaseTimer
+from traffic_log import TCP_RX, RecordingSerial, TrafficRecorder, open_replay
+from formula_store import FormulaStore, from_v3, normalize
+from formula_expr import CH2O_FORMULA, DEFAULT_NAMES, compile_formula
+from run_archive import RunArchive, RunRecorder
+from ui_cache import load_ui
 
 APP_DIR = Path(__file__).resolve().parent
 
-# Kamera (RPi varsa kullanılacak)
-try:
-    from picamera2.picamera2 import Picamera2, libcamera
-    HAS_PI_CAM = True
-except Exception:
-    Picamera2 = None
-    libcamera = None
-    HAS_PI_CAM = False
-
-# ---------------- Yardımcı: güvenli seri gönder/al ----------------
-def normalize_line(s: str) -> str:
-    return s.strip()
-
-def _upper(s: str) -> str:
-    return s.strip().upper()
-
-def is_interesting(s: str) -> bool:
-    
-    """DONE/OK/PONG/ERR ve ölçüm ön ekleri (WEIGHT:/PH:/RAW:) — case-insensitive."""
-    if not s:
-        return False
-    su = _upper(s)
-    return su.startswith(("DONE", "OK", "PONG", "ERR", "WEIGHT:", "PH:", "RAW:"))
+# Kamera (RPi varsa kullanılacak); picamera2 import'u yavaş, ilk kullanımda kamera thread'inde yüklenir
+Picamera2 = None
+libcamera = None
+HAS_PI_CAM = None                                # None: henüz denenmedi
+_picam_lock = threading.Lock()
+
+
+def load_picamera() -> bool:
+    global Picamera2, libcamera, HAS_PI_CAM
+    with _picam_lock:
+        if HAS_PI_CAM is None:
+            try:
+                from picamera2.picamera2 import Picamera2, libcamera
+                HAS_PI_CAM = True
+            except Exception:
+                HAS_PI_CAM = False
+        return HAS_PI_CAM
+
+# Qt >= 5.14: Picamera2'nin BGR düzeni kanal çevirmeden gösterilebilir
+HAS_BGR888 = hasattr(QImage, "Format_BGR888")
+
+# 1: kamera ayrı süreçte yakalar, kareler paylaşımlı bellekten okunur (Pi'de diğer çekirdekler)
+USE_CAPTURE_PROCESS = os.environ.get("TITRATION_CAPTURE_PROCESS", "0") == "1"
 
-def startswith_token(line: str, token_prefix: str) -> bool:
-    return _upper(line).startswith(_upper(token_prefix))
+# Simülatör / tezgâh dışı: seri port ve FQ2 adresi ortamdan verilebilir (simulator.py yazdırır)
+SERIAL_PORT = os.environ.get("TITRATION_SERIAL_PORT")
+FQ2_HOST, _, FQ2_PORT = os.environ.get("TITRATION_FQ2_ADDR", "192.158.56.1:9876").rpartition(":")
 
+# Zamanlama metrikleri: HTTP /metrics portu ve/veya Prometheus textfile yolu (boşsa kapalı)
+METRICS_PORT = os.environ.get("TITRATION_METRICS_PORT")
+METRICS_FILE = os.environ.get("TITRATION_METRICS_FILE")
 
+# Saha olayları: seri + TCP trafiğini kaydet / kayıttan oynat ("yol[:hız]", hız 0 = beklemesiz)
+TRAFFIC_LOG = os.environ.get("TITRATION_TRAFFIC_LOG")
+REPLAY = os.environ.get("TITRATION_REPLAY")
+
+# Veri dosyaları (arşiv, formüller, dönüm geçmişi) çalışma dizinine değil bu klasöre yazılır
+# (autostart / farklı cwd ile açılışta da aynı dosyalar); ölçüm / test için değiştirilebilir
+DATA_DIR = Path(os.environ.get("TITRATION_DATA_DIR") or APP_DIR)
+
+# Test arşivi (SQLite): test başına satır + döngü izi (boşsa DATA_DIR/runs.sqlite)
+RUN_ARCHIVE = os.environ.get("TITRATION_RUN_ARCHIVE")
+
+# ---------------- Seri: taşıyıcı üzerinde uyumlu API ----------------
 class SerialWorker:
-    """UI thread içinde kısa bloklar için basit yardımcı."""
+    """Seri taşıyıcıyı sarar: submit() Future döndürür, send_command() eski senkron API."""
     def __init__(self, ser: serial.Serial):
         self.ser = ser
+        self.transport = SerialTransport(ser)
+        self.transport.start()
+        # Firmware "#n" etiketlerini destekliyorsa komutlar boru hattı halinde gider
+        self.transport.enable_tags()
+
+    def submit(self, cmd: str, wait_token_prefix: str = None, timeout_s: float = 5.0) -> Future:
+        """Komutu kuyruğa bırakır; Future sonucu cevap satırıdır (ya da None/"ERR: ...")."""
+        return self.transport.submit(cmd, wait_token_prefix, timeout_s)
+
+    def submit_timed(self, cmd: str, event: str, timeout_s: float) -> Future:
+        """Süreli aktüatör komutu; Future cihazdan END:<event> gelince tamamlanır."""
+        return self.transport.submit_timed(cmd, event, timeout_s)
 
     def send_command(self, cmd: str, wait_token_prefix: str = None, timeout_s: float = 5.0):
         """
-        cmd -> Arduino'ya gönderir. wait_token_prefix verilirse bu prefix ile başlayan satırı bekler.
+        cmd -> Arduino'ya gönderir ve cevabı bekler (bloklayıcı; UI thread'inde kullanmayın).
+        wait_token_prefix verilirse bu prefix ile başlayan satırı bekler.
         Yoksa DONE/OK/PONG/ERR/WEIGHT:/PH:/RAW: gibi 'ilginç' ilk satırı döndürür.
         """
-        if not self.ser or not self.ser.is_open:
-            return None
-        if not cmd.endswith("\n"):
-            cmd = cmd + "\n"
+        return self.submit(cmd, wait_token_prefix, timeout_s).result()
+
+    def close(self):
+        self.transport.stop()
+
+
+class UiDispatcher(QObject):
+    """Başka thread'den gelen callable'ı UI thread'inde çalıştırır (queued sinyal)."""
+    call = pyqtSignal(object)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.call.connect(self._invoke, Qt.QueuedConnection)
+
+    @staticmethod
+    def _invoke(fn):
+        fn()
+
+
+class _QtTimerHandle:
+    __slots__ = ("timer",)
+
+    def __init__(self, timer: QTimer):
+        self.timer = timer
+
+    def cancel(self):
         try:
-            self.ser.reset_input_buffer()
-        except Exception:
-            pass
+            self.timer.stop()
+        except RuntimeError:
+            pass                                 # zaten silinmiş
 
-        self.ser.write(cmd.encode())
 
-        start = time.time()
-        last_line = None
-        while time.time() - start < timeout_s:
-            try:
-                if self.ser.in_waiting:
-                    line = normalize_line(self.ser.readline().decode(errors="ignore"))
-                    if not line:
-                        continue
-                    if is_interesting(line):
-                        last_line = line
-                        if wait_token_prefix is not None:
-                            if startswith_token(line, wait_token_prefix):
-                                return line
-                        else:
-                            return line
-                time.sleep(0.02)
-            except Exception as e:
-                return f"ERR: {e}"
-        return last_line or "ERR: TIMEOUT"
+class QtScheduler:
+    """TitrationEngine'i UI thread'inde koşturur: zamanlayıcılar QTimer, thread geçişi UiDispatcher."""
+    def __init__(self, dispatcher: UiDispatcher):
+        self.dispatcher = dispatcher
+
+    def now(self) -> float:
+        return time.monotonic()
+
+    def call_later(self, delay_s: float, fn):
+        t = QTimer(self.dispatcher)
+        t.setSingleShot(True)
+        t.timeout.connect(fn)
+        t.timeout.connect(t.deleteLater)
+        t.start(max(0, int(delay_s * 1000)))
+        return _QtTimerHandle(t)
+
+    def call_soon_threadsafe(self, fn):
+        self.dispatcher.call.emit(fn)
 
 
 # ---------------- TCP İstemci Thread ----------------
 class TcpClientThread(QThread):
-    data_received = pyqtSignal(str)
+    """FQ2 akışını kayıtlara ayırıp halka tampona yazar; samples_ready(seq) ile haber verir."""
+    samples_ready = pyqtSignal(int)
     connection_error = pyqtSignal(str)
 
-    def __init__(self, server_ip: str, server_port: int):
+    def __init__(self, server_ip: str, server_port: int, ring: RgbRing = None, recorder=None):
         super().__init__()
         self.server_ip = server_ip
         self.server_port = server_port
+        self.ring = ring if ring is not None else RgbRing()
+        self.recorder = recorder
         self.running = True
 
     def run(self):
@@ -94,27 +165,67 @@ class TcpClientThread(QThread):
                 with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
                     s.settimeout(5.0)                    # sadece connect için
                     s.connect((self.server_ip, self.server_port))
-                    s.settimeout(None)                   # bağlandıktan sonra bloklayıcı
+                    # Kısa timeout: akış susunca yarım kalan son satır kayıt sayılır
+                    s.settimeout(0.2)
+                    framer = Fq2Framer()                 # her bağlantı temiz başlar
                     while self.running:
-                        data = s.recv(4096)              # veri gelene kadar bekler
+                        try:
+                            data = s.recv(4096)
+                        except socket.timeout:
+                            self._publish(framer.flush())
+                            continue
                         if not data:
                             raise ConnectionError("Empty TCP read")
-                        self.data_received.emit(data.decode(errors="ignore"))
+                        if self.recorder is not None:
+                            self.recorder.record(TCP_RX, data)
+                        self._publish(framer.feed(data))
             except Exception as e:
                 self.connection_error.emit(f"Bağlantı hatası: {e}")
                 time.sleep(3)
 
+    def _publish(self, records):
+        if records:
+            self.ring.extend(time.monotonic(), records)
+            self.samples_ready.emit(self.ring.seq)
+
 
 # ---------------- Kamera Thread ----------------
 class CameraThread(QThread):
-    update_image = pyqtSignal(QImage, bytes)
-
-    def __init__(self):
+    """
+    Önizleme kareleri; measure_enabled iken ROI rengi de ölçülüp halka tampona yazılır.
+    Önizleme preview_fps ile sınırlıdır ve UI önceki kareyi çizmeden yenisi gönderilmez
+    (frame_consumed); QImage kare tamponunu kopyalamadan sarar, dizi sinyalle birlikte taşınır.
+    """
+    update_image = pyqtSignal(QImage, object)
+    samples_ready = pyqtSignal(int)
+
+    def __init__(self, ring: RgbRing = None, meter: RoiColorMeter = None, preview_fps: float = 10.0):
         super().__init__()
         self.picam2 = None
+        self.ring = ring if ring is not None else RgbRing()
+        self.meter = meter if meter is not None else RoiColorMeter()
+        self.measure_enabled = False
+        self.preview_fps = preview_fps
+        self.running = True
+        self._preview_busy = threading.Event()
+        self._last_preview = 0.0
+        self.dropped_frames = 0
+
+    def frame_consumed(self):
+        """UI kareyi çizdi; sıradaki önizleme karesi gönderilebilir."""
+        self._preview_busy.clear()
+
+    def _want_preview(self) -> bool:
+        now = time.monotonic()
+        if self._preview_busy.is_set() or now - self._last_preview < 1.0 / self.preview_fps:
+            self.dropped_frames += 1
+            return False
+        self._last_preview = now
+        self._preview_busy.set()
+        return True
 
     def init_camera(self):
-        if not HAS_PI_CAM:
+        if not load_picamera():
             return False
         try:
             info = Picamera2.global_camera_info()
@@ -132,31 +243,102 @@ class CameraThread(QThread):
             self.picam2 = None
             return False
 
+    # Kare kaynağı; ProcessCameraThread bunları paylaşımlı bellekle değiştirir
+    def camera_available(self) -> bool:
+        return load_picamera()
+
+    def open_source(self) -> bool:
+        return self.init_camera()
+
+    def next_frame(self):
+        return self.picam2.capture_array()
+
+    def frame_valid(self) -> bool:
+        return True
+
+    def close_source(self):
+        pass
+
     def run(self):
-        if not self.init_camera():
+        if not self.open_source():
             return
-        while True:
+        while self.running:
             try:
-                frame = self.picam2.capture_array()  
+                frame = self.next_frame()
+                if frame is None:
+                    continue
+                if self.measure_enabled:
+                    # Ölçüm yakalama tamponu üzerinde, BGR->RGB çevriminden önce
+                    rgb = self.meter.measure(frame)
+                    if self.frame_valid():
+                        self.ring.push(time.monotonic(), rgb)
+                        self.samples_ready.emit(self.ring.seq)
+                if not self._want_preview():
+                    continue
                 h, w, c = frame.shape
-                try:
-                    qimg = QImage(frame.data, w, h, 3*w, QImage.Format_BGR888)
-                except AttributeError:
-                    frame = frame[..., [2,1,0]].copy()
-                    qimg = QImage(frame.data, w, h, 3*w, QImage.Format_RGB888)
-                self.update_image.emit(qimg.copy(), frame.tobytes())
+                if HAS_BGR888:
+                    qimg = QImage(frame.data, w, h, frame.strides[0], QImage.Format_BGR888)
+                else:
+                    # Eski Qt: BGR biçimi yok, tek kopya ile kanal sırası çevrilir
+                    frame = np.ascontiguousarray(frame[..., ::-1])
+                    qimg = QImage(frame.data, w, h, frame.strides[0], QImage.Format_RGB888)
+                self.update_image.emit(qimg, frame)
             except Exception:
                 time.sleep(0.2)
+        self.close_source()
+
+
+class ProcessCameraThread(CameraThread):
+    """
+    Yakalama ayrı süreçte (camera_capture.CaptureProcess); bu thread yalnızca
+    paylaşımlı halkadaki yeni kareyi kopyalamadan eşler, ölçer ve önizlemeye yollar.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.capture = CaptureProcess((320, 240))
+        self.frames = None
+        self._seq = 0
+
+    def camera_available(self) -> bool:
+        # picamera2 yalnızca alt süreçte import edilir; burada sadece kurulu mu bakılır
+        return importlib.util.find_spec("picamera2") is not None
+
+    def open_source(self) -> bool:
+        if not self.camera_available():
+            return False
+        try:
+            self.frames = self.capture.start()
+            return True
+        except Exception as e:
+            print("Yakalama süreci başlatılamadı:", e)
+            return False
+
+    def next_frame(self):
+        self._seq, frame = self.frames.wait_next(self._seq)
+        return frame
+
+    def frame_valid(self) -> bool:
+        # Ölçüm sürerken yazar bu slota yeni kare yazdıysa ölçüm atılır
+        return self.frames.valid(self._seq)
+
+    def close_source(self):
+        self.capture.stop()
 
 
 # ---------------- Ana Uygulama ----------------
 class MyApp(QMainWindow):
-    def __init__(self):
+    def __init__(self, defer_hardware: bool = False):
+        """defer_hardware: seri / TCP / kamera ilk çizimden sonra arka planda açılır."""
         super().__init__()
+        self.startup_times = {"imports": time.perf_counter() - START_T0}
+        self.defer_hardware = defer_hardware
+        self._hardware_started = False
+        self._closing = False
 
         self.thread_pool = QThreadPool.globalInstance()
         self.ser = None
         self.worker = None
+        self.ui_dispatcher = UiDispatcher(self)
 
         # UI'yi mutlak yolla yükle
         ui_path = APP_DIR / "frontend_titration_main.ui"
@@ -164,28 +346,46 @@ class MyApp(QMainWindow):
             print("UI bulunamadı:", ui_path)
             print("Klasör içeriği:", [p.name for p in APP_DIR.iterdir()])
             raise FileNotFoundError(f"UI dosyası yok: {ui_path}")
-        uic.loadUi(str(ui_path), self)
-        
+        # Derlenmiş form önbellekten (.ui değişince yeniden üretilir)
+        self.ui_source = load_ui(ui_path, self)
+        self._startup_mark("ui")
+
         # Ana sayfa (tab_main) ile başlat
         if hasattr(self, "mainPage") and hasattr(self, "tab_main"):
             self.mainPage.setCurrentWidget(self.tab_main)
             
         # Durum değişkenleri
-        self.rgb_received = False
-        self.motor3_working = False
-        self.last_camera_process_time = 0.0
         self.current_rgb = None
-        self.test_in_progress = False
         self.successful_tests_count = 0
         self.motor_units = {"motor1": "ml", "motor2": "ml", "motor3": "ml"}
         self.motor_resolution = {"motor1": 8526.32, "motor2": 8526.32, "motor3": 8526.32}
-        self.motor3_preload_done = False
+
+        # Cihaz komutları ve test döngüsü UI'den ayrı; MyApp yalnızca olayları çizer
+        self.device = TitrationDevice(None, self.motor_resolution)
+        # Hız profilleri (adım/sn, adım/sn²); bağlanınca SET_RATE ile karta yazılır
+        self.motor_profiles = self.device.profiles
+        self.engine = TitrationEngine(self.device, QtScheduler(self.ui_dispatcher))
+        self.engine.add_listener(self.on_engine_event)
+        # Faz / seri komut süreleri (geliştirici sekmesi + Prometheus)
+        self.metrics = Metrics()
+        self.metrics.describe("serial_rtt_seconds", "Seri komutun gönderimden cevaba süresi")
+        self.metrics.describe("startup_seconds", "Süreç başından açılış aşamasına kadar geçen süre")
+        self.engine.add_listener(PhaseTimer(self.metrics))
+        # Formül başına dönüm noktası geçmişi (öğrenilmiş ön yükleme)
+        self.endpoint_history = EndpointHistory(str(DATA_DIR / "endpoint_history.json"))
 
         # Dev sayfası ON/OFF state
         self.air_on = False
         self.water_on = False
         self.valve_on = False
 
+        # Formüller: formulas.json (ilk açılışta formulas.txt içe aktarılır; veri klasöründe
+        # yoksa uygulamayla gelen)
+        legacy = DATA_DIR / "formulas.txt"
+        if not legacy.exists():
+            legacy = APP_DIR / "formulas.txt"
+        self.formula_store = FormulaStore(str(DATA_DIR / "formulas.json"), str(legacy))
+
         # Formül varsayılanları
         self.formul_air_pump_time = 5
         self.formul_water_pump_time = 3
@@ -193,6 +393,11 @@ class MyApp(QMainWindow):
         self.formul_cokme_valve_time = 10
         self.math_formul = ""
         self.math_constants = {"N": 1, "F": 1, "3": 3}
+        # Biten / iptal edilen her test arşive yazılır (yazıcı thread, toplu commit)
+        self.archive = RunArchive(RUN_ARCHIVE or str(DATA_DIR / "runs.sqlite"))
+        self.engine.add_listener(RunRecorder(
+            self.archive, self.engine, self.math_constants,
+            on_commit=lambda run: self.set_status(f"Test arşive eklendi ({run['result']}).")))
 
         # Sahne/ görüntü
         self.scene = QGraphicsScene(self)
@@ -202,19 +407,45 @@ class MyApp(QMainWindow):
         for gv in (self.graphics_view_1, self.graphics_view_2, self.graphics_view_3):
             if gv:
                 gv.setScene(self.scene)
-
-        # Kamera ve TCP
-        self.camera_thread = CameraThread()
+        self.preview_item = self.scene.addPixmap(QPixmap())
+        self._preview_size = None
+
+        # Ekran güncellemeleri: kaynaklar view'e yazar, ui_timer sabit hızda yalnız değişeni çizer
+        self.view = ViewModel()
+        self._text_scenes = {}
+        self.ui_timer = QTimer(self)
+        self.ui_timer.setInterval(40)            # 25 Hz
+        self.ui_timer.timeout.connect(self.refresh_ui)
+        self.ui_timer.start()
+        self.metrics_timer = QTimer(self)
+        self.metrics_timer.setInterval(1000)
+        self.metrics_timer.timeout.connect(self.refresh_metrics)
+        self.metrics_timer.start()
+        if METRICS_PORT:
+            try:
+                self.metrics.serve(int(METRICS_PORT))
+            except Exception as e:
+                print("Metrik sunucusu açılamadı:", e)
+
+        # Kamera ve TCP (FQ2 ölçümleri halka tampondan okunur, hiçbiri atlanmaz)
+        # Yerel kamera ölçümü ayrı tampona yazar; hangisinin okunacağını set_rgb_source seçer
+        self.camera_roi = (0.4, 0.4, 0.2, 0.2)   # karenin oranı olarak x, y, w, h
+        self.camera_ring = RgbRing()
+        camera_cls = ProcessCameraThread if USE_CAPTURE_PROCESS else CameraThread
+        self.camera_thread = camera_cls(self.camera_ring, RoiColorMeter(self.camera_roi))
         self.camera_thread.update_image.connect(self.update_graphics_view)
-        self.tcp_thread = TcpClientThread('192.158.56.1', 9876)  # Gerekirse IP'yi değiştir
+        self.rgb_ring = RgbRing()
+        self.active_ring = self.rgb_ring
+        self.rgb_framer = Fq2Framer()
+        self.rgb_seq = 0
+        self.traffic = TrafficRecorder(TRAFFIC_LOG) if TRAFFIC_LOG else None
+        self.replay = open_replay(REPLAY) if REPLAY else None
+        fq2_host, fq2_port = self.replay[2].address if self.replay else (FQ2_HOST, int(FQ2_PORT))
+        self.tcp_thread = TcpClientThread(fq2_host, fq2_port, self.rgb_ring, self.traffic)  # Gerekirse TITRATION_FQ2_ADDR
 
         self.setup_signals()
-        self.select_com_port()
-
-        # Başlat
-        self.tcp_thread.start()
-        self.camera_thread.start()
-
+        if not defer_hardware:
+            self.start_hardware(background=False)
 
         # Sayfa geçiş butonları (QTabWidget: mainPage)
         if hasattr(self, "olcum_pushButton") and hasattr(self, "mainPage") and hasattr(self, "tab_measure"):
@@ -231,6 +462,42 @@ class MyApp(QMainWindow):
             self.bulaniklik_pushButton.clicked.connect(lambda: self.mainPage.setCurrentWidget(self.tab_bulaniklik))
 
         self.loadFormulas()
+        self._startup_mark("init")
+        if not defer_hardware:
+            self.report_startup()
+
+    # ---------- Açılış ----------
+    def _startup_mark(self, phase: str):
+        self.startup_times[phase] = time.perf_counter() - START_T0
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        if "shown" not in self.startup_times:
+            self._startup_mark("shown")
+            if self.defer_hardware:
+                # 0 ms: kuyruktaki ilk çizim olaylarından sonra çalışır
+                QTimer.singleShot(0, self.start_hardware)
+
+    def start_hardware(self, background: bool = True):
+        """FQ2 TCP ve kamera thread'leri + seri port (background: port ayrı thread'de açılır)."""
+        if self._hardware_started:
+            return
+        self._hardware_started = True
+        self.tcp_thread.start()
+        self.camera_thread.start()
+        if background:
+            def open_port():
+                opened = self._open_serial()
+                self.ui_dispatcher.call.emit(lambda: self._attach_serial(*opened))
+            threading.Thread(target=open_port, name="serial-open", daemon=True).start()
+        else:
+            self.select_com_port()
+
+    def report_startup(self):
+        for phase, t in self.startup_times.items():
+            self.metrics.observe("startup_seconds", t, phase=phase)
+        print("Açılış süreleri (sn): " + " ".join(f"{k}={v:.2f}" for k, v in self.startup_times.items())
+              + f" [UI: {self.ui_source}]")
 
     # ---------- Genel ----------
     @staticmethod
@@ -238,23 +505,69 @@ class MyApp(QMainWindow):
         QThreadPool.globalInstance().clear()
 
     def closeEvent(self, event):
+        self._closing = True
+        self.engine.abort()
+        self.metrics.close()
+        if self.replay:
+            self.replay[2].close()
         try:
             self.tcp_thread.running = False
             self.tcp_thread.wait(1000)
+            self.camera_thread.running = False
+            self.camera_thread.wait(2000)
         except Exception:
             pass
+        if self.worker:
+            self.worker.close()
+        if self.traffic is not None:
+            self.traffic.close()
+        self.archive.close()
         event.accept()
 
     def select_com_port(self):
+        self._attach_serial(*self._open_serial())
+
+    def _open_serial(self):
+        """Portu açıp taşıyıcıyı başlatır; UI dışındaki thread'de de çalışır -> (ser, worker, ad)."""
         ports = list(serial.tools.list_ports.comports())
-        port_name = None
-        if ports:
+        port_name = SERIAL_PORT
+        if port_name is None and ports:
             port_name = ports[0].device
         if port_name is None:
             port_name = '/dev/ttyUSB0'  # Arduino buradaysa sabitle
         try:
-            self.ser = serial.Serial(port_name, 9600, timeout=0.2)
-            self.worker = SerialWorker(self.ser)
+            # timeout=None: okuyucu thread veri gelene kadar bloklar (kapatırken cancel_read)
+            if self.replay:
+                ser, port_name = self.replay[1], f"kayıt {REPLAY}"
+            else:
+                ser = serial.Serial(port_name, 9600, timeout=None)
+            if self.traffic is not None:
+                ser = RecordingSerial(ser, self.traffic)
+            return ser, SerialWorker(ser), port_name
+        except Exception as e:
+            print(f"Seri bağlanamadı: {e}")
+            return None, None, port_name
+
+    def _attach_serial(self, ser, worker, port_name: str):
+        """UI thread'i: açılan portu cihaz / motor / metriklere bağlar."""
+        if worker is not None and self._closing:
+            worker.close()
+            worker = None
+        self.ser, self.worker = ser, worker
+        if "serial" not in self.startup_times:
+            self._startup_mark("serial")
+            if self.defer_hardware:
+                self.report_startup()
+        if worker is None:
+            self.ser = None
+            return
+        try:
+            self.worker.transport.add_listener(
+                lambda line: self.ui_dispatcher.call.emit(lambda: self.handle_serial_event(line)))
+            self.device.transport = self.worker.transport
+            self.worker.transport.on_rtt = \
+                lambda name, dt: self.metrics.observe("serial_rtt_seconds", dt, command=name)
+            self.device.apply_profiles()
             print(f"Seri port bağlandı: {port_name}")
         except Exception as e:
             print(f"Seri bağlanamadı: {e}")
@@ -263,7 +576,8 @@ class MyApp(QMainWindow):
 
     # ---------- Sinyaller ----------
     def setup_signals(self):
-        self.tcp_thread.data_received.connect(self.process_camera_data)
+        self.tcp_thread.samples_ready.connect(self.consume_rgb_samples)
+        self.camera_thread.samples_ready.connect(self.consume_rgb_samples)
         self.tcp_thread.connection_error.connect(self.handle_connection_error)
 
         # Ölçüm sayfası
@@ -279,6 +593,8 @@ class MyApp(QMainWindow):
             self.report_button.clicked.connect(self.save_report)
         if hasattr(self, "clean_button"):
             self.clean_button.clicked.connect(self.clean_system)
+        if hasattr(self, "camera_rgb_checkbox"):
+            self.camera_rgb_checkbox.toggled.connect(self.set_rgb_source)
 
         # Dev sayfası
         if hasattr(self, "dev_motor1_button"):
@@ -304,11 +620,11 @@ class MyApp(QMainWindow):
 
         # Yoğunluk/pH sekmesi
         if hasattr(self, "weight_button"):
-            self.weight_button.clicked.connect(self.get_weight)
+            self.weight_button.clicked.connect(lambda: self.get_weight())
         if hasattr(self, "calculate_button"):
             self.calculate_button.clicked.connect(self.calculate_density)
         if hasattr(self, "ph_button"):
-            self.ph_button.clicked.connect(self.get_ph)
+            self.ph_button.clicked.connect(lambda: self.get_ph())
 
         # Formül sekmesi
         if hasattr(self, "save_formul_button"):
@@ -319,182 +635,200 @@ class MyApp(QMainWindow):
     # ---------- Seri: Non-blocking gönderim yardımcı ----------
     def send_nowait(self, cmd: str):
         """Serial'e beklemeden komut gönder (UI'yi bloklama)."""
-        if self.ser and self.ser.is_open:
-            if not cmd.endswith("\n"):
-                cmd += "\n"
-            try:
-                self.ser.reset_input_buffer()
-            except Exception:
-                pass
-            self.ser.write(cmd.encode())
+        if self.worker and self.worker.transport.is_open:
+            self.worker.submit(cmd, None, 0)
             return True
         return False
 
+    def _send(self, cmd: str, wait_token_prefix: str = "DONE", timeout_s: float = 5.0, on_done=None):
+        """
+        Komutu seri kuyruğa bırakır, Future döndürür. on_done(cevap) cevap geldiğinde
+        UI thread'inde çağrılır. Seri yoksa on_done(None) bir sonraki olay turunda çağrılır.
+        """
+        return self._then(self.device.command(cmd, wait_token_prefix, timeout_s), on_done)
+
+    def _send_timed(self, name: str, duration_s, on_done=None):
+        """
+        <name>_DUR komutu: cihaz hemen OK döner, pencereyi kendi zamanlar ve bitince
+        END:<name> yollar. on_done(olay) bu olay geldiğinde UI thread'inde çağrılır.
+        """
+        try:
+            d = float(str(duration_s).replace(',', '.'))
+        except Exception:
+            return None
+        return self._then(self.device.timed(name, d), on_done)
+
+    def _then(self, fut: Future, callback):
+        """Future tamamlanınca callback(sonuç) UI thread'inde çalışır."""
+        if callback is None:
+            return fut
+
+        def done(f):
+            if not f.cancelled():
+                self.ui_dispatcher.call.emit(lambda: callback(f.result()))
+        fut.add_done_callback(done)
+        return fut
+
     # ---------- Görüntü ----------
-    def update_graphics_view(self, qImg: QImage, raw_data: bytes):
-        self.scene.clear()
-        # sadece görüntü amaçlı; sayısal RGB'yi FQ2 veriyor
-        self.scene.addPixmap(QPixmap.fromImage(qImg))
-        for gv in (self.graphics_view_1, self.graphics_view_2, self.graphics_view_3):
-            if gv:
-                gv.fitInView(self.scene.itemsBoundingRect(), Qt.KeepAspectRatio)
+    def update_graphics_view(self, qImg: QImage, frame=None):
+        # Tek pixmap öğesi yeniden kullanılır; görünüm yalnızca kare boyutu değişince sığdırılır
+        self.preview_item.setPixmap(QPixmap.fromImage(qImg))
+        self.camera_thread.frame_consumed()
+        size = (qImg.width(), qImg.height())
+        if size != self._preview_size:
+            self._preview_size = size
+            self.scene.setSceneRect(self.preview_item.boundingRect())
+            for gv in (self.graphics_view_1, self.graphics_view_2, self.graphics_view_3):
+                if gv:
+                    gv.fitInView(self.preview_item, Qt.KeepAspectRatio)
 
     # ---------- Ölçüm Akışı ----------
     def preprocess(self):
         self.set_status("Hazırlık")
-        for i, ml in enumerate((38000, 38000, 38000), start=1):
-            if self.worker:
-                self.worker.send_command(f"MOVE{i} {ml}", "DONE", 15.0)
+        if not self.worker:
+            return
+        # Üç pompa tek MOVE_MULTI ile aynı anda dolar (süre = en uzun hareket)
+        self._move_steps({1: 38000, 2: 38000, 3: 38000},
+                         on_done=lambda res: self.set_status(
+                             f"Hazırlık hatası: {res}" if is_error(res) else "Hazırlık tamamlandı"))
 
     def start_test(self):
-        self.test_in_progress = True
-        self.current_rgb = None
-        self.rgb_received = False
-        self.clear_rgb_lcds()
-        self.set_status("Test başlatıldı")
+        if self.engine.running:
+            self.set_status("Test zaten sürüyor")
+            return
         try:
-            ml1 = float(self.sample_input.text().replace(',', '.'))
-            ml2 = float(self.indicator_input.text().replace(',', '.'))
-            self.control_motor1(ml1)
-            self.control_motor2(ml2)
-            QTimer.singleShot(3000, self.repeat_actions)
+            formula = self.formula_params()
         except Exception:
             self.set_status("Geçersiz giriş")
-
-    def repeat_actions(self):
-        if not self.test_in_progress or self.motor3_working:
-            return
-        if not self.motor3_preload_done:
-            pv = self.formul_motor3_preload_input.text()
-            try:
-                val = float(pv.replace(',', '.')) if pv else 0
-                if val > 0:
-                    self.control_motor3(val)
-                    self.motor3_preload_done = True
-            except Exception:
-                pass
-        self.motor3_working = True
-        ml3 = float(self.titrant_input.text().replace(',', '.'))
-        self.control_motor3(ml3)
-        QTimer.singleShot(3000, self.after_motor3)
-
-    def after_motor3(self):
-        if not self.motor3_working:
             return
-        air_s = float(self.formul_air_pump_time or 5)
-        self.trigger_air_pump(air_s)
-        QTimer.singleShot(int(air_s * 1000), self.after_air_pump_done)
+        self.current_rgb = None
+        self.successful_tests_count = 0
+        self.clear_rgb_lcds()
+        if not self.engine.start(formula):
+            self.set_status("Geçersiz giriş")
+        elif formula.expected_ml is not None:
+            self.set_status(f"Öğrenilmiş ön yükleme: {formula.preload_ml:.2f} ml "
+                            f"(beklenen dönüm {formula.expected_ml:.2f} ml)")
+
+    def formula_params(self) -> FormulaParams:
+        """Ekrandaki formül değerleri; test başında bir kez okunur, döngü boyunca sabittir."""
+        def num(widget, dflt=None):
+            txt = widget.text().replace(',', '.')
+            return float(txt) if txt or dflt is None else dflt
 
-    def after_air_pump_done(self):
+        trg = self.read_target_rgb()
+        if trg is None:
+            raise ValueError("Hatalı RGB hedef")
+        # Artı / eksi thresholdlar (eksi boşsa artı ile aynı)
+        plus = tuple(int(getattr(self, f"formul_threshold_input_{c}").text() or 20) for c in "RGB")
+        minus = tuple(int(getattr(self, f"formul_threshold_input_{c}_2").text() or plus[i])
+                      if hasattr(self, f"formul_threshold_input_{c}_2") else plus[i]
+                      for i, c in enumerate("RGB"))
+        name = self.formula_combobox.currentText() if hasattr(self, "formula_combobox") else ""
+        preload, expected = num(self.formul_motor3_preload_input, 0), None
+        if hasattr(self, "auto_preload_checkbox") and self.auto_preload_checkbox.isChecked():
+            # Aynı üründe geçmiş dönüm noktalarının düşük quantile'ına kadar tek seferde doz
+            learned = self.endpoint_history.suggested_preload(name)
+            if learned is not None:
+                preload, expected = learned, self.endpoint_history.quantile(name, 0.5)
+        return FormulaParams(
+            name=name,
+            sample_ml=num(self.sample_input),
+            indicator_ml=num(self.indicator_input),
+            titrant_ml=num(self.titrant_input),
+            preload_ml=preload,
+            air_s=float(self.formul_air_pump_time or 5),
+            water_s=float(self.formul_water_pump_time or 3),
+            valve_s=float(self.formul_selenoid_valve_time or 3),
+            cokme_s=self._cokme_ms() / 1000,
+            target=trg, thr_plus=plus, thr_minus=minus,
+            math_formula=self.math_formul_input.text() if hasattr(self, "math_formul_input") else "",
+            adaptive=hasattr(self, "adaptive_checkbox") and self.adaptive_checkbox.isChecked(),
+            expected_ml=expected,
+            stream_settle=hasattr(self, "stream_settle_checkbox") and self.stream_settle_checkbox.isChecked(),
+        )
+
+    def on_engine_event(self, event: str, data: dict):
+        """TitrationEngine olaylarını ekrana yansıtır (UI thread'inde gelir)."""
+        if event == "status":
+            self.set_status(data["text"])
+        elif event == "cycle":
+            self.successful_tests_count = data["cycle"]
+            txt = f"Transfer count: {self.successful_tests_count}"
+            if data.get("endpoint") is not None:
+                txt += f" (tahmini dönüm: {data['endpoint']:.2f} ml)"
+            self.set_status(txt)
+        elif event == "ph":
+            self._set_scene_text("ph_output", f"pH: {data['value']:.2f}")
+        elif event == "completed":
+            self.set_status("Test tamamlandı.")
+            if data["reason"] == "target":
+                self.endpoint_history.record(self.engine.formula.name, data["m3"])
+            if data["rgb"]:
+                self.current_rgb = data["rgb"]
+                self.calculate_math_formula_result(m3=data["m3"], repeat_count=data["cycles"])
+            self.successful_tests_count = 0
+            self.current_rgb = None
+        elif event == "error":
+            self.set_status(data["message"])
+
+    def _cokme_ms(self) -> int:
         # Çökme süresi
         try:
             c = self.formul_cokme_valve_time
             if isinstance(c, str):
-                cokme_ms = int(float(c.replace(',', '.')) * 1000)
-            else:
-                cokme_ms = int(float(c) * 1000)
+                return int(float(c.replace(',', '.')) * 1000)
+            return int(float(c) * 1000)
         except Exception:
-            cokme_ms = 3000
-
-        self.send_nowait(f"COKME_DUR {cokme_ms}")
-        QTimer.singleShot(cokme_ms, self.trigger_camera)
+            return 3000
 
     # ---------- Kamera tetik ----------
     def control_camera(self):
         """Arduino'ya kamera tetik komutu gönderir."""
         if self.worker:
-            self.worker.send_command("CAMERA_TRIG", "DONE", 3.0)
-            self.set_status("Kamera tetiklendi.")
+            return self._then(self.device.camera_trigger(), self.camera_triggered)
+        return None
 
     def trigger_camera(self):
         self.control_camera()
 
-    def camera_triggered(self):
-        pass  # kullanılmıyor
-
-    def check_and_repeat_rgb(self):
-        if not (self.test_in_progress and self.rgb_received):
-            return
-        r, g, b = self.get_current_rgb()
-        trg = self.read_target_rgb()
-        if not trg:
-            return
-        tr, tg, tb = trg
-
-        # Artı thresholdlar
-        thr_r_plus = int(self.formul_threshold_input_R.text() or 20)
-        thr_g_plus = int(self.formul_threshold_input_G.text() or 20)
-        thr_b_plus = int(self.formul_threshold_input_B.text() or 20)
-        # Eksi thresholdlar
-        thr_r_minus = int(self.formul_threshold_input_R_2.text() or thr_r_plus) if hasattr(self, "formul_threshold_input_R_2") else thr_r_plus
-        thr_g_minus = int(self.formul_threshold_input_G_2.text() or thr_g_plus) if hasattr(self, "formul_threshold_input_G_2") else thr_g_plus
-        thr_b_minus = int(self.formul_threshold_input_B_2.text() or thr_b_plus) if hasattr(self, "formul_threshold_input_B_2") else thr_b_plus
-
-        ok = (tr - thr_r_minus <= r <= tr + thr_r_plus and
-              tg - thr_g_minus <= g <= tg + thr_g_plus and
-              tb - thr_b_minus <= b <= tb + thr_b_plus)
-        if ok:
-            self.set_status("Hedef RGB’ye ulaşıldı")
-            self.complete_test()
-        else:
-            self.set_status(f"RGB hedefte değil: ({r},{g},{b})")
-            self.motor3_working = False
-            self.repeat_actions()
+    def camera_triggered(self, _res=None):
+        self.set_status("Kamera tetiklendi.")
 
     def complete_test(self):
-        if not self.test_in_progress:
-            return
-        self.test_in_progress = False
-        self.motor3_working = False
-        self.motor3_preload_done = False
-        self.set_status("Test tamamlandı.")
-        if self.current_rgb:
-            r, g, b = self.current_rgb
-            self.save_report(r, g, b)
-            self.calculate_math_formula_result()  
-        self.successful_tests_count = 0
-        self.current_rgb = None
-        self.rgb_received = False
+        """Elle bitirme: motor testi sonlandırır, rapor 'completed' olayında yazılır."""
+        self.engine.complete()
 
-    def calculate_math_formula_result(self):
+    def calculate_math_formula_result(self, m3=None, repeat_count=None):
         """
         Ölçüm sayfasındaki math_formul_input alanındaki formülü değerlendirir.
         M1, M2, M3 değişkenleri ile sonucu hesaplar ve graphicsView_output'a yazar.
+        m3 verilirse (motorun saydığı gerçek titrant) ekrandaki değerlerden türetilmez.
         """
         try:
             # Motor sarfiyatlarını al
             M1 = float(self.sample_input.text().replace(',', '.') or 0)
             M2 = float(self.indicator_input.text().replace(',', '.') or 0)
-            preload = float(self.formul_motor3_preload_input.text().replace(',', '.') or 0)
-            titrant = float(self.titrant_input.text().replace(',', '.') or 0)
-            repeat_count = max(1, self.successful_tests_count)
-            M3 = preload + titrant * repeat_count
-
-            # Formülü al
-            formula = self.math_formul_input.text()
-            # Güvenli ortamda değerlendir
-            allowed_names = {"M1": M1, "M2": M2, "M3": M3}
-            result = eval(formula, {"__builtins__": None}, allowed_names)
+            if repeat_count is None:
+                repeat_count = max(1, self.successful_tests_count)
+            if m3 is None:
+                preload = float(self.formul_motor3_preload_input.text().replace(',', '.') or 0)
+                titrant = float(self.titrant_input.text().replace(',', '.') or 0)
+                m3 = preload + titrant * repeat_count
+            M3 = m3
+
+            # Formül bir kez doğrulanıp derlenir (metne göre önbellekte)
+            expr = compile_formula(self.math_formul_input.text(), DEFAULT_NAMES, self.math_constants)
+            result = expr.evaluate(self.math_constants, M1=M1, M2=M2, M3=M3)
 
             # Sonucu graphicsView_output'a yaz
-            if hasattr(self, "graphicsView_output") and self.graphicsView_output is not None:
-                sc = QGraphicsScene()
-                sc.addText(f"Formül Sonucu: {result:.2f}")
-                self.graphicsView_output.setScene(sc)
-            else:
-                print(f"Formül Sonucu: {result:.2f}")
+            self._set_scene_text("graphicsView_output", f"Formül Sonucu: {result:.2f}")
 
             # Tekrar sayısını status_label'a yaz
-            if hasattr(self, "status_label") and self.status_label is not None:
-                self.status_label.setText(f"Tespit edilen tekrar sayısı: {repeat_count}")
+            self.set_status(f"Tespit edilen tekrar sayısı: {repeat_count}")
 
         except Exception as e:
-            if hasattr(self, "graphicsView_output") and self.graphicsView_output is not None:
-                sc = QGraphicsScene()
-                sc.addText(f"Formül hatası: {e}")
-                self.graphicsView_output.setScene(sc)
-            else:
-                print(f"Formül hatası: {e}")
+            self._set_scene_text("graphicsView_output", f"Formül hatası: {e}")
 
     # ---------- Temizlik ----------
     def clean_system(self):
@@ -508,75 +842,70 @@ class MyApp(QMainWindow):
 
         if not self.worker:
             return
-        self.worker.send_command("VALVE_ON", "DONE", 2.0)
-        QTimer.singleShot(valve_ms, lambda: self.worker.send_command("VALVE_OFF", "DONE", 2.0))
-        QTimer.singleShot(valve_ms + 1000, lambda: self.worker.send_command("AIR_ON", "DONE", 2.0))
-        QTimer.singleShot(valve_ms + 1000, lambda: self.worker.send_command("WATER_ON", "DONE", 2.0))
-        QTimer.singleShot(valve_ms + water_ms + 1000, lambda: self.worker.send_command("WATER_OFF", "DONE", 2.0))
-        QTimer.singleShot(valve_ms + water_ms + 1500, lambda: self.worker.send_command("VALVE_ON", "DONE", 2.0))
-        QTimer.singleShot(valve_ms + air_ms + water_ms + 2000, lambda: (
-            self.worker.send_command("AIR_OFF", "DONE", 2.0),
-            self.worker.send_command("VALVE_OFF", "DONE", 2.0)
-        ))
-
-    # ---------- TCP/Kamera Veri ----------
-    def process_camera_data(self, data: str):
-        # Ham mesaj:
-        print("FQ2 RAW:", repr(data))
+        valve_s, water_s, air_s = valve_ms / 1000, water_ms / 1000, air_ms / 1000
 
-        now = time.time()
-        if now - self.last_camera_process_time < 0.2:
-            return
-        self.last_camera_process_time = now
+        # 1) Valf açık: boşalt  2) Hava + su birlikte  3) Su bitince valf açılır,
+        # hava ile birlikte kapanır. Süreleri cihaz zamanlar; tahmini boşluk yok.
+        def rinse(_res):
+            self._send_timed("AIR", water_s + air_s,
+                             on_done=lambda _r: self.set_status("Temizlik tamamlandı"))
+            self._send_timed("WATER", water_s, on_done=lambda _r: self._send_timed("VALVE", air_s))
 
-        # 1) FQ2 -> 3 satır float (R,G,B)
-        lines = [ln.strip() for ln in data.splitlines() if ln.strip()]
-        r = g = b = None
-        try:
-            if len(lines) >= 3:
-                r = float(lines[0]); g = float(lines[1]); b = float(lines[2])
-            else:
-                # 2) Fallback: tek satır / virgüllü
-                toks = re.findall(r'-?\d+(?:\.\d+)?', data)
-                if len(toks) >= 3:
-                    r, g, b = map(float, toks[:3])
-        except Exception:
-            pass
+        self._send_timed("VALVE", valve_s, on_done=rinse)
 
-        if r is None or g is None or b is None:
+    # ---------- TCP/Kamera Veri ----------
+    def process_camera_data(self, data: str):
+        """Elle verilen FQ2 metni (tek mesaj): halka tampona yazılır ve işlenir."""
+        records = self.rgb_framer.feed(data.encode()) + self.rgb_framer.flush()
+        if not records:
             print("RGB verisi anlaşılamadı:", data)
-            self.rgb_received = False
             return
-
+        self.rgb_ring.extend(time.monotonic(), records)
+        self.consume_rgb_samples()
+
+    def consume_rgb_samples(self, _seq: int = None):
+        """Halka tampondaki yeni ölçümlerin hepsi motora, sonuncusu LCD'lere."""
+        self.rgb_seq, ts, rgbs, lost = self.active_ring.since(self.rgb_seq)
+        if lost:
+            print(f"RGB tamponu taştı, {lost} ölçüm kaçırıldı")
+        if not len(rgbs):
+            return
         # Yuvarla ve 0..255
-        r = max(0, min(255, int(round(r))))
-        g = max(0, min(255, int(round(g))))
-        b = max(0, min(255, int(round(b))))
-
-        # LCD'ler
-        if hasattr(self, "lcdNumber_Pointer_R"):
-            self.lcdNumber_Pointer_R.display(r)
-            self.lcdNumber_Pointer_G.display(g)
-            self.lcdNumber_Pointer_B.display(b)
-        if hasattr(self, "lcdNumber_Pointer_R_Dev"):
-            self.lcdNumber_Pointer_R_Dev.display(r)
-            self.lcdNumber_Pointer_G_Dev.display(g)
-            self.lcdNumber_Pointer_B_Dev.display(b)
-
-        QApplication.processEvents()
-
-        # Durum ve hedef kontrol
-        self.current_rgb = (r, g, b)
-        self.rgb_received = True
-        if self.test_in_progress:
-            self.successful_tests_count += 1
-            if hasattr(self, "status_label"):
-                self.status_label.setText(f"Transfer count: {self.successful_tests_count}")
-        self.check_and_repeat_rgb()
+        vals = rgbs.round().clip(0, 255).astype(int)
+        for t, rgb in zip(ts, vals.tolist()):
+            self.current_rgb = tuple(rgb)
+            self.engine.feed_rgb(self.current_rgb, t)
+        self._publish_rgb(*vals[-1].tolist())
+
+    def _publish_rgb(self, r, g, b):
+        # LCD'ler (ölçüm sayfası + dev sayfası)
+        self.view.publish_many({
+            "lcdNumber_Pointer_R": r, "lcdNumber_Pointer_G": g, "lcdNumber_Pointer_B": b,
+            "lcdNumber_Pointer_R_Dev": r, "lcdNumber_Pointer_G_Dev": g, "lcdNumber_Pointer_B_Dev": b,
+        })
+
+    def set_rgb_source(self, use_camera: bool):
+        """RGB kaynağı: FQ2 (TCP, CAMERA_TRIG ile tetikli) ya da yerel kamera ROI'si (sürekli)."""
+        use_camera = bool(use_camera) and self.camera_thread.camera_available()
+        self.camera_thread.measure_enabled = use_camera
+        self.active_ring = self.camera_ring if use_camera else self.rgb_ring
+        self.rgb_seq = self.active_ring.seq
+        self.engine.external_trigger = not use_camera
+        self.set_status("RGB kaynağı: kamera ROI" if use_camera else "RGB kaynağı: FQ2")
 
     def handle_connection_error(self, error: str):
         self.set_status(error)
 
+    def handle_serial_event(self, line: str):
+        """Bekleyen bir komuta ait olmayan (geç gelen/kendiliğinden) seri satırlar."""
+        _tag, body = split_tag(line)
+        if startswith_token(body, "PROGRESS:"):
+            text = self.device.progress_text(body)
+            if text:
+                self.set_status(text)
+            return
+        print("Seri olay:", line)
+
     # ---------- Kayıt / Formül ----------
     def save_report(self, r=None, g=None, b=None):
         if self.current_rgb:
@@ -584,27 +913,56 @@ class MyApp(QMainWindow):
         if r is None or g is None or b is None:
             self.set_status("RGB yok, rapor kaydedilemedi.")
             return
-        now = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        d = os.path.join("reports", now.split(" ")[0])
-        os.makedirs(d, exist_ok=True)
-        with open(os.path.join(d, "report.txt"), "a") as f:
-            f.write(f"{now}, RGB: ({r}, {g}, {b})\n")
+        # Elle rapor: test dışı anlık RGB kaydı (biten testleri RunRecorder arşivler)
+        self.archive.add({
+            "started_at": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "formula": self.formula_combobox.currentText() if hasattr(self, "formula_combobox") else "",
+            "result": "manual", "r": r, "g": g, "b": b,
+        })
         self.set_status("Rapor kaydedildi.")
 
     # ---- yardımcı: güvenli yazı çıkışı (math vs. için) ----
     def _set_scene_text(self, view_attr: str, text: str):
-        try:
-            view = getattr(self, view_attr, None)
-            if view is not None:
-                sc = QGraphicsScene()
-                sc.addText(text)
-                view.setScene(sc)
-            elif hasattr(self, "status_label") and self.status_label is not None:
-                self.status_label.setText(text)
-            else:
-                print(text)
-        except Exception as e:
-            print("Output yazılamadı:", e, "->", text)
+        if getattr(self, view_attr, None) is not None:
+            self.view.publish(view_attr, text)
+        elif hasattr(self, "status_label") and self.status_label is not None:
+            self.set_status(text)
+        else:
+            print(text)
+
+    def refresh_ui(self):
+        """ui_timer: view'de değişen değerleri widget'lara yazar (widget türüne göre)."""
+        for key, value in self.view.take_changes().items():
+            w = getattr(self, key, None)
+            try:
+                if isinstance(w, QLCDNumber):
+                    w.display(value)
+                elif isinstance(w, QLabel):
+                    w.setText(value)
+                elif isinstance(w, QGraphicsView):
+                    self._show_scene_text(w, value)
+                elif isinstance(w, QPlainTextEdit):
+                    w.setPlainText(value)
+            except Exception as e:
+                print("Output yazılamadı:", e, "->", value)
+
+    def refresh_metrics(self):
+        """metrics_timer: geliştirici sekmesindeki özet ve isteğe bağlı textfile."""
+        self.view.publish("metrics_view", self.metrics.summary_text())
+        if METRICS_FILE:
+            try:
+                self.metrics.write_textfile(METRICS_FILE)
+            except OSError as e:
+                print("Metrik dosyası yazılamadı:", e)
+
+    def _show_scene_text(self, view: QGraphicsView, text: str):
+        # Her görünüm için tek sahne ve tek metin öğesi; yalnızca metin değişir
+        entry = self._text_scenes.get(view)
+        if entry is None:
+            sc = QGraphicsScene(view)
+            entry = self._text_scenes[view] = (sc, sc.addText(""))
+            view.setScene(sc)
+        entry[1].setPlainText(text)
 
     # ---- FORMÜL KAYDET (tek şema) ----
     def saveFormula(self):
@@ -626,44 +984,31 @@ class MyApp(QMainWindow):
             thrG_minus = self.formul_threshold_input_G_2.text() if hasattr(self, "formul_threshold_input_G_2") else thrG_plus
             thrB_minus = self.formul_threshold_input_B_2.text() if hasattr(self, "formul_threshold_input_B_2") else thrB_plus
 
-            data = [
-                name,
-                self.formul_motor1_input.text(),
-                self.formul_motor2_input.text(),
-                self.formul_motor3_input.text(),
-                self.formul_motor3_preload_input.text(),
-                m4_txt,
-                m5_txt,
-                air_txt,
-                water_txt,
-                selen_txt,
-                self.formul_cokme_valve_input.text(),
-                self.formul_target_input_R.text(),
-                self.formul_target_input_G.text(),
-                self.formul_target_input_B.text(),
-                thrR_plus,
-                thrG_plus,
-                thrB_plus,
-                thrR_minus,
-                thrG_minus,
-                thrB_minus,
-                getattr(self, "math_formul_input").text() if hasattr(self, "math_formul_input") else ""
-            ]
-
-            # Aynı isimliyse üzerine yaz
-            lines = []
-            try:
-                with open('formulas.txt', 'r') as f:
-                    for line in f:
-                        parts = line.strip().split(',')
-                        if parts and parts[0] != name:
-                            lines.append(line.strip())
-            except FileNotFoundError:
-                pass
-            lines.append(','.join(data))
-            with open('formulas.txt', 'w') as f:
-                for ln in lines:
-                    f.write(ln + '\n')
+            rec = {
+                "name": name,
+                "sample_ml": self.formul_motor1_input.text(),
+                "indicator_ml": self.formul_motor2_input.text(),
+                "titrant_ml": self.formul_motor3_input.text(),
+                "preload_ml": self.formul_motor3_preload_input.text(),
+                "m4_ml": m4_txt,
+                "m5_ml": m5_txt,
+                "air_s": air_txt,
+                "water_s": water_txt,
+                "valve_s": selen_txt,
+                "cokme_s": self.formul_cokme_valve_input.text(),
+                "target_r": self.formul_target_input_R.text(),
+                "target_g": self.formul_target_input_G.text(),
+                "target_b": self.formul_target_input_B.text(),
+                "thr_plus_r": thrR_plus,
+                "thr_plus_g": thrG_plus,
+                "thr_plus_b": thrB_plus,
+                "thr_minus_r": thrR_minus,
+                "thr_minus_g": thrG_minus,
+                "thr_minus_b": thrB_minus,
+                "math": getattr(self, "math_formul_input").text() if hasattr(self, "math_formul_input") else "",
+            }
+            # Aynı isimliyse üzerine yazar (atomik)
+            self.formula_store.save(rec)
 
             if self.formula_combobox.findText(name) == -1:
                 self.formula_combobox.addItem(name)
@@ -675,58 +1020,49 @@ class MyApp(QMainWindow):
     def loadFormula(self):
         sel = self.formula_combobox.currentText()
         try:
-            with open('formulas.txt', 'r') as f:
-                for line in f:
-                    parts = line.strip().split(',')
-                    if parts and parts[0] == sel:
-                        self.apply_formula(parts)
-                        break
+            rec = self.formula_store.get(sel)
+            if rec is not None:
+                self.apply_formula(rec)
             self.set_status("Formül yüklendi.")
         except Exception as e:
             self.set_status(f"Formül yüklenemedi: {e}")
 
     def loadFormulas(self):
         try:
-            with open('formulas.txt', 'r') as f:
-                for line in f:
-                    name = line.strip().split(',')[0]
-                    if name and self.formula_combobox.findText(name) == -1:
-                        self.formula_combobox.addItem(name)
-        except FileNotFoundError:
-            pass
+            names = self.formula_store.names()
+        except (OSError, ValueError) as e:
+            self.set_status(f"Formüller okunamadı: {e}")
+            return
+        for name in names:
+            if name and self.formula_combobox.findText(name) == -1:
+                self.formula_combobox.addItem(name)
 
     # ---- FORMÜL UYGULA (toleranslı) ----
-    def apply_formula(self, p):
+    def apply_formula(self, rec):
         """
-        v3 şeması: name,m1,m2,m3,m3_preload,m4,m5,air,water,selenoid,cokme,R,G,B,thrR+,thrG+,thrB+,thrR-,thrG-,thrB-,math
-        Fazla kolonları yok sayar, eksiklerde varsayılan kullanır.
+        rec: formula_store kaydı (adlı alanlar). Eski konumsal v3 listesi de
+        kabul edilir; eksik alanlarda varsayılan kullanılır.
         """
-        p = list(p)
-        # Alan sayısı 21 olmalı (0-20 arası)
+        if not isinstance(rec, dict):
+            if len(rec) < 2:
+                return
+            rec = from_v3(rec)
+        rec = normalize(rec)
 
-        def get(i, dflt=""):
-            return p[i] if i < len(p) else dflt
         def fnum(x, d):
             try:
                 return float(str(x).replace(',', '.')) if str(x) != "" else d
             except Exception:
                 return d
 
-        if len(p) < 2:
-            return
-
-        name = get(0)
-        m1   = get(1);  m2 = get(2);  m3 = get(3);  m3pre = get(4)
-        m4   = get(5, "0")
-        m5   = get(6, "0")
-        air  = get(7, "1")
-        water= get(8, "1")
-        selen= get(9, "1")
-        cokme= get(10, "1")
-        R, G, B = get(11, "0"), get(12, "0"), get(13, "0")
-        thrR_plus, thrG_plus, thrB_plus = get(14, "20"), get(15, "20"), get(16, "20")
-        thrR_minus, thrG_minus, thrB_minus = get(17, "20"), get(18, "20"), get(19, "20")
-        math_formula = get(20, "")
+        name = rec["name"]
+        m1, m2, m3, m3pre = rec["sample_ml"], rec["indicator_ml"], rec["titrant_ml"], rec["preload_ml"]
+        m4, m5 = rec["m4_ml"], rec["m5_ml"]
+        air, water, selen, cokme = rec["air_s"], rec["water_s"], rec["valve_s"], rec["cokme_s"]
+        R, G, B = rec["target_r"], rec["target_g"], rec["target_b"]
+        thrR_plus, thrG_plus, thrB_plus = rec["thr_plus_r"], rec["thr_plus_g"], rec["thr_plus_b"]
+        thrR_minus, thrG_minus, thrB_minus = rec["thr_minus_r"], rec["thr_minus_g"], rec["thr_minus_b"]
+        math_formula = rec["math"]
 
         # Formül sekmesi alanları
         if hasattr(self, "formul_name_input"): self.formul_name_input.setText(name)
@@ -782,136 +1118,118 @@ class MyApp(QMainWindow):
             self.math_formul_input.setText(math_formula)
 
     # ---------- Dev/IO ----------
-    def control_motor1(self, ml_value):
-        self._motor_cmd(1, ml_value)
+    def control_motor1(self, ml_value, on_done=None):
+        return self._motor_cmd(1, ml_value, on_done)
 
-    def control_motor2(self, ml_value):
-        self._motor_cmd(2, ml_value)
+    def control_motor2(self, ml_value, on_done=None):
+        return self._motor_cmd(2, ml_value, on_done)
 
-    def control_motor3(self, ml_value):
-        self._motor_cmd(3, ml_value)
+    def control_motor3(self, ml_value, on_done=None):
+        return self._motor_cmd(3, ml_value, on_done)
 
-    def _motor_cmd(self, idx, ml_value):
+    def control_motors(self, ml_values: dict, on_done=None):
+        """{motor no: ml} — birden çok motoru tek MOVE_MULTI ile aynı anda sürer."""
         try:
-            val = float(str(ml_value).replace(',', '.'))
-            steps = int(val * self.motor_resolution[f"motor{idx}"])
-            if self.worker:
-                self.worker.send_command(f"MOVE{idx} {steps}", "DONE", 15.0)
+            fut = self.device.move_ml(ml_values)
         except Exception:
-            pass
+            return None
+        return self._then(fut, on_done)
+
+    def _move_steps(self, steps: dict, on_done=None):
+        """{motor no: adım} — tek eksen MOVEn, birden çoğu MOVE_MULTI olarak gider."""
+        return self._then(self.device.move_steps(steps), on_done)
+
+    def _motor_cmd(self, idx, ml_value, on_done=None):
+        """MOVEn komutunu kuyruğa bırakır; DONE gelince on_done(cevap) çağrılır."""
+        return self.control_motors({idx: ml_value}, on_done)
 
     # POMPALAR / VALF (GERÇEK TOGGLE)
-    def toggle_air_pump(self):
+    def _toggle(self, attr: str, label: str, on_cmd: str, off_cmd: str):
         if not self.worker:
             return
-        cmd = "AIR_OFF" if self.air_on else "AIR_ON"
-        res = self.worker.send_command(cmd, "DONE", 2.0)
-        if res and not str(res).upper().startswith("ERR"):
-            self.air_on = not self.air_on
-            self.set_status(f"Air {'ON' if self.air_on else 'OFF'}")
+        cmd = off_cmd if getattr(self, attr) else on_cmd
 
-    def trigger_air_pump(self, duration):
-        if not self.worker:
-            return
-        try:
-            d = float(str(duration).replace(',', '.'))
-            self.worker.send_command(f"AIR_DUR {int(d*1000)}", "DONE", d + 2)
-        except Exception:
-            pass
+        def done(res):
+            if not is_error(res):
+                setattr(self, attr, not getattr(self, attr))
+                self.set_status(f"{label} {'ON' if getattr(self, attr) else 'OFF'}")
+        self._send(cmd, "DONE", 2.0, done)
+
+    def toggle_air_pump(self):
+        self._toggle("air_on", "Air", "AIR_ON", "AIR_OFF")
+
+    def trigger_air_pump(self, duration, on_done=None):
+        return self._send_timed("AIR", duration, on_done)
 
     def toggle_water_pump(self):
-        if not self.worker:
-            return
-        cmd = "WATER_OFF" if self.water_on else "WATER_ON"
-        res = self.worker.send_command(cmd, "DONE", 2.0)
-        if res and not str(res).upper().startswith("ERR"):
-            self.water_on = not self.water_on
-            self.set_status(f"Water {'ON' if self.water_on else 'OFF'}")
+        self._toggle("water_on", "Water", "WATER_ON", "WATER_OFF")
 
-    def trigger_water_pump(self, duration):
-        if not self.worker:
-            return
-        try:
-            d = float(str(duration).replace(',', '.'))
-            self.worker.send_command(f"WATER_DUR {int(d*1000)}", "DONE", d + 2)
-        except Exception:
-            pass
+    def trigger_water_pump(self, duration, on_done=None):
+        return self._send_timed("WATER", duration, on_done)
 
     def toggle_selenoid_valve(self):
-        if not self.worker:
-            return
-        cmd = "VALVE_OFF" if self.valve_on else "VALVE_ON"
-        res = self.worker.send_command(cmd, "DONE", 2.0)
-        if res and not str(res).upper().startswith("ERR"):
-            self.valve_on = not self.valve_on
-            self.set_status(f"Valve {'ON' if self.valve_on else 'OFF'}")
+        self._toggle("valve_on", "Valve", "VALVE_ON", "VALVE_OFF")
 
-    def trigger_selenoid_valve(self, duration):
-        if not self.worker:
-            return
-        try:
-            d = float(str(duration).replace(',', '.'))
-            self.worker.send_command(f"VALVE_DUR {int(d*1000)}", "DONE", d + 2)
-        except Exception:
-            pass
+    def trigger_selenoid_valve(self, duration, on_done=None):
+        return self._send_timed("VALVE", duration, on_done)
 
     # ---------- Yoğunluk / pH ----------
-    def get_weight(self):
+    def get_weight(self, on_done=None):
+        """WEIGHT_MEASURE gönderir; gram değeri (ya da None) on_done'a iletilir."""
         if not self.worker:
             return None
-        line = self.worker.send_command("WEIGHT_MEASURE", "WEIGHT:", 5.0)
-        if line and startswith_token(line, "WEIGHT:"):
-            try:
-                val = float(line.split(":", 1)[1])
-                sc = QGraphicsScene(); sc.addText(f"{val:.2f} gram")
-                self.weight_output.setScene(sc)
-                return val
-            except Exception:
-                pass
-        self.set_status("Ağırlık alınamadı.")
-        return None
+
+        def done(val):
+            if val is None:
+                self.set_status("Ağırlık alınamadı.")
+            else:
+                self._set_scene_text("weight_output", f"{val:.2f} gram")
+            if on_done:
+                on_done(val)
+        return self._then(self.device.measure_weight(), done)
 
     def calculate_density(self):
+        def fail(msg="Failed to retrieve weight or volume."):
+            self._set_scene_text("calculate_output", msg)
+
         try:
-            w0 = self.get_weight()
-            if w0 is None:
-                return
             sel = self.motor_combobox.currentText()
             vol = float(self.volume_input.text().replace(',', '.'))
-            if vol <= 0:
-                sc = QGraphicsScene(); sc.addText("Error: Volume > 0 olmalı.")
-                self.calculate_output.setScene(sc)
-                return
-            if sel == "Motor1":
-                self.control_motor1(vol)
-            elif sel == "Motor2":
-                self.control_motor2(vol)
-            else:
-                self.control_motor3(vol)
-            w1 = self.get_weight()
+        except Exception:
+            fail()
+            return
+        if vol <= 0:
+            fail("Error: Volume > 0 olmalı.")
+            return
+        move = {"Motor1": self.control_motor1, "Motor2": self.control_motor2}.get(sel, self.control_motor3)
+
+        # w0 -> motor -> w1 zinciri; her adım bir öncekinin cevabıyla başlar
+        def after_w1(w0, w1):
             if w1 is None:
                 return
             dens = (w1 - w0) / vol
-            sc = QGraphicsScene(); sc.addText(f"{dens:.2f} g/ml")
-            self.calculate_output.setScene(sc)
-        except Exception:
-            sc = QGraphicsScene(); sc.addText("Failed to retrieve weight or volume.")
-            self.calculate_output.setScene(sc)
+            self._set_scene_text("calculate_output", f"{dens:.2f} g/ml")
+
+        def after_w0(w0):
+            if w0 is None:
+                return
+            move(vol, on_done=lambda _res: self.get_weight(on_done=lambda w1: after_w1(w0, w1)))
 
-    def get_ph(self):
+        self.get_weight(on_done=after_w0)
+
+    def get_ph(self, on_done=None):
+        """PH_MEASURE gönderir; pH değeri (ya da None) on_done'a iletilir."""
         if not self.worker:
             return None
-        line = self.worker.send_command("PH_MEASURE", "PH:", 5.0)
-        if line and startswith_token(line, "PH:"):
-            try:
-                val = float(line.split(":", 1)[1])
-                sc = QGraphicsScene(); sc.addText(f"pH: {val:.2f}")
-                self.ph_output.setScene(sc)
-                return val
-            except Exception:
-                pass
-        self.set_status("pH alınamadı.")
-        return None
+
+        def done(val):
+            if val is None:
+                self.set_status("pH alınamadı.")
+            else:
+                self._set_scene_text("ph_output", f"pH: {val:.2f}")
+            if on_done:
+                on_done(val)
+        return self._then(self.device.measure_ph(), done)
 
     # ---------- Mat. Formül ----------
     def calculate_math_formul(self):
@@ -921,9 +1239,8 @@ class MyApp(QMainWindow):
                 self._set_scene_text("math_formul_output", "Örnek hacmi (t) > 0 olmalı.")
                 return None
             S = self.calculate_titrant_total()
-            N = float(self.math_constants.get("N", 1))
-            F = float(self.math_constants.get("F", 1))
-            result = (S * F * N * 3) / t
+            expr = compile_formula(CH2O_FORMULA, ("S", "t"), self.math_constants)
+            result = expr.evaluate(self.math_constants, S=S, t=t)
             self._set_scene_text("math_formul_output", f"% CH2O = {result:.2f}")
             return result
         except Exception as e:
@@ -942,12 +1259,10 @@ class MyApp(QMainWindow):
     def clear_rgb_lcds(self):
         for name in ("lcdNumber_Pointer_R","lcdNumber_Pointer_G","lcdNumber_Pointer_B",
                      "lcdNumber_Pointer_R_Dev","lcdNumber_Pointer_G_Dev","lcdNumber_Pointer_B_Dev"):
-            if hasattr(self, name):
-                getattr(self, name).display("")
+            self.view.publish(name, "")
 
     def set_status(self, txt: str):
-        if hasattr(self, "status_label"):
-            self.status_label.setText(txt)
+        self.view.publish("status_label", txt)
 
     def get_current_rgb(self):
         return self.current_rgb if self.current_rgb else (0, 0, 0)
@@ -967,6 +1282,6 @@ if __name__ == "__main__":
     app = QApplication(sys.argv)
     app.setFont(QFont("", 10))
     app.aboutToQuit.connect(MyApp.clean_exit)
-    w = MyApp()
+    w = MyApp(defer_hardware=True)
     w.show()
     sys.exit(app.exec_())
@@ -0,0 +1,306 @@
+"""Seri ve TCP trafiğinin kaydı ve yeniden oynatılması.
+
+Kayıt biçimi: 8 baytlık başlık (MAGIC) ardından kayıtlar; her kayıt
+"<QBI" = (başlangıçtan beri µs, kanal, uzunluk) + ham baytlar. Kanallar:
+SERIAL_TX (uygulamanın yazdığı), SERIAL_RX (karttan okunan), TCP_RX (FQ2).
+
+Oynatma: ReplaySerial SerialTransport'a serial.Serial yerine verilir; okunan
+baytlar kayıttaki sırayla döner. ReplayTcpServer kayıttaki FQ2 parçalarını
+yerel bir TCP sunucusundan yollar (TcpClientThread'i TITRATION_FQ2_ADDR ile
+buraya yönlendirin). speed=1 gerçek zaman, speed=0 bekleme yok: her gelen
+parça yalnızca kayıtta kendisinden önce gelen yazımlar uygulama tarafından
+yapılınca ve diğer kanaldaki önceki parçalar bırakılınca gönderilir (kanal
+değişiminde handoff_s kadar pay bırakılır: ör. CAMERA_TRIG cevabı işlenmeden
+FQ2 ölçümü gelmez), böylece hızlı oynatmada da komut/cevap sırası korunur.
+
+    TITRATION_TRAFFIC_LOG=olay.tlog python titration_main.py       # kaydet
+    TITRATION_REPLAY=olay.tlog:0 python titration_main.py          # en hızlı oynat
+    python traffic_log.py olay.tlog                                # özet / döküm
+"""
+import argparse
+import socket
+import struct
+import threading
+import time
+
+MAGIC = b"TTLOG1\n\0"
+REC = struct.Struct("<QBI")
+SERIAL_TX, SERIAL_RX, TCP_RX = 0, 1, 2
+CHANNEL_NAMES = {SERIAL_TX: "serial_tx", SERIAL_RX: "serial_rx", TCP_RX: "tcp_rx"}
+
+
+# ---------------- Kayıt ----------------
+class TrafficRecorder:
+    """Thread-güvenli ikili kayıtçı; dosya tamponlu yazılır, close() ile boşaltılır."""
+    def __init__(self, path: str):
+        self.path = path
+        self._f = open(path, "wb", buffering=64 * 1024)
+        self._f.write(MAGIC)
+        self._t0 = time.monotonic()
+        self._lock = threading.Lock()
+        self.records = 0
+
+    def record(self, channel: int, data: bytes):
+        if not data:
+            return
+        us = int((time.monotonic() - self._t0) * 1e6)
+        with self._lock:
+            if self._f is None:
+                return
+            self._f.write(REC.pack(us, channel, len(data)))
+            self._f.write(data)
+            self.records += 1
+
+    def flush(self):
+        with self._lock:
+            if self._f is not None:
+                self._f.flush()
+
+    def close(self):
+        with self._lock:
+            if self._f is not None:
+                self._f.close()
+                self._f = None
+
+
+class RecordingSerial:
+    """serial.Serial sarmalayıcı: write/read trafiği kayda geçer, gerisi aynen iletilir."""
+    def __init__(self, ser, recorder: TrafficRecorder):
+        self._ser = ser
+        self.recorder = recorder
+
+    def write(self, data: bytes):
+        self.recorder.record(SERIAL_TX, bytes(data))
+        return self._ser.write(data)
+
+    def read(self, size: int = 1) -> bytes:
+        data = self._ser.read(size)
+        self.recorder.record(SERIAL_RX, data)
+        return data
+
+    def __getattr__(self, name):
+        return getattr(self._ser, name)
+
+
+def read_log(path: str):
+    """[(saniye, kanal, bayt), ...]"""
+    out = []
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"Trafik kaydı değil: {path}")
+        while True:
+            head = f.read(REC.size)
+            if len(head) < REC.size:
+                break
+            us, ch, n = REC.unpack(head)
+            data = f.read(n)
+            if len(data) < n:
+                break                            # yarım kalan son kayıt (çökme)
+            out.append((us / 1e6, ch, data))
+    return out
+
+
+# ---------------- Oynatma ----------------
+class ReplaySession:
+    """
+    Kayıt + ortak saat. Gelen (RX) her parça, kayıtta kendisinden önceki TX
+    sayısına (gate) ulaşılınca ve speed > 0 ise zamanı gelince bırakılır.
+    """
+    def __init__(self, path: str, speed: float = 1.0, gate_timeout_s: float = 5.0,
+                 handoff_s: float = 0.02):
+        self.speed = speed
+        self.gate_timeout_s = gate_timeout_s
+        self.handoff_s = handoff_s               # hızlı oynatmada kanal değişiminde işlenme payı
+        self.records = read_log(path)
+        self.tx_expected = [d for _, ch, d in self.records if ch == SERIAL_TX]
+        self._first_tx_t = next((t for t, ch, _ in self.records if ch == SERIAL_TX), 0.0)
+        self.tx_count = 0
+        self.rx_done = 0                         # kayıt sırasıyla bırakılmış RX parçası sayısı
+        self._last_channel = None
+        self.mismatches = 0                      # kayıttakinden farklı yazımlar
+        self._cv = threading.Condition()
+        self._t0 = None
+
+    def stream(self, channel: int):
+        """Kanalın RX parçaları: [(saniye, gerekli TX sayısı, RX sırası, bayt)]."""
+        out, tx, rx = [], 0, 0
+        for t, ch, data in self.records:
+            if ch == SERIAL_TX:
+                tx += 1
+                continue
+            if ch == channel:
+                out.append((t, tx, rx, data))
+            rx += 1
+        return out
+
+    def on_write(self, data: bytes):
+        with self._cv:
+            if self._t0 is None:
+                self._start_clock(self._first_tx_t)
+            i = self.tx_count
+            if i >= len(self.tx_expected) or self.tx_expected[i] != bytes(data):
+                self.mismatches += 1
+            self.tx_count += 1
+            self._cv.notify_all()
+
+    def wait_turn(self, t: float, gate: int, order: int, channel: int, alive=lambda: True) -> bool:
+        """
+        Parçanın bırakılma anına kadar bekler (önceki yazımlar yapıldı, diğer
+        kanaldaki önceki parçalar bırakıldı, zamanı geldi); kapanışta False.
+        """
+        deadline = time.monotonic() + self.gate_timeout_s
+        with self._cv:
+            while (self.tx_count < gate or self.rx_done < order) and alive():
+                left = deadline - time.monotonic()
+                if left <= 0:
+                    break                        # uygulama farklı davrandı; akış sürsün
+                self._cv.wait(min(left, 0.1))
+            if self._t0 is None:
+                self._start_clock(t)
+            handoff = self._last_channel not in (None, channel)
+        delay = self._t0 + t / self.speed - time.monotonic() if self.speed > 0 else 0.0
+        if handoff:
+            delay = max(delay, self.handoff_s)
+        if delay > 0:
+            time.sleep(delay)
+        return alive()
+
+    def released(self, order: int, channel: int):
+        with self._cv:
+            self.rx_done = max(self.rx_done, order + 1)
+            self._last_channel = channel
+            self._cv.notify_all()
+
+    def _start_clock(self, t: float):
+        # Oynatma saati ilk olayda başlar: kayıttaki t anı "şimdi" sayılır
+        self._t0 = time.monotonic() - (t / self.speed if self.speed > 0 else 0.0)
+
+    def wake(self):
+        with self._cv:
+            self._cv.notify_all()
+
+
+class ReplaySerial:
+    """SerialTransport'un kullandığı serial.Serial arayüzü (read/write/in_waiting)."""
+    def __init__(self, session: ReplaySession):
+        self.session = session
+        self.is_open = True
+        self._chunks = session.stream(SERIAL_RX)
+        self._i = 0
+        self._buf = b""
+        self._lock = threading.Lock()
+
+    @property
+    def in_waiting(self) -> int:
+        return len(self._buf)
+
+    def write(self, data: bytes):
+        self.session.on_write(data)
+        return len(data)
+
+    def read(self, size: int = 1) -> bytes:
+        with self._lock:
+            while not self._buf and self.is_open:
+                if self._i >= len(self._chunks):
+                    time.sleep(0.05)             # kayıt bitti: port sessiz
+                    return b""
+                t, gate, order, data = self._chunks[self._i]
+                if not self.session.wait_turn(t, gate, order, SERIAL_RX, lambda: self.is_open):
+                    break
+                self._i += 1
+                self._buf = data
+                self.session.released(order, SERIAL_RX)
+            out, self._buf = self._buf[:size], self._buf[size:]
+            return out
+
+    @property
+    def finished(self) -> bool:
+        return self._i >= len(self._chunks) and not self._buf
+
+    def cancel_read(self):
+        self.is_open = False
+        self.session.wake()
+
+    def close(self):
+        self.cancel_read()
+
+
+class ReplayTcpServer:
+    """Kayıttaki FQ2 parçalarını bağlanan ilk istemciye aynı sıra ve zamanlamayla yollar."""
+    def __init__(self, session: ReplaySession, host: str = "127.0.0.1", port: int = 0):
+        self.session = session
+        self._chunks = session.stream(TCP_RX)
+        self._running = False
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._sock.bind((host, port))
+        self._sock.listen(1)
+        self.address = self._sock.getsockname()
+        self.sent = 0
+
+    def start(self):
+        self._running = True
+        threading.Thread(target=self._run, name="replay-tcp", daemon=True).start()
+        return self
+
+    def _run(self):
+        try:
+            conn, _ = self._sock.accept()
+        except OSError:
+            return
+        with conn:
+            for t, gate, order, data in self._chunks:
+                if not self.session.wait_turn(t, gate, order, TCP_RX, lambda: self._running):
+                    return
+                try:
+                    conn.sendall(data)
+                except OSError:
+                    return
+                self.session.released(order, TCP_RX)
+                self.sent += 1
+            while self._running:                 # kayıt bitti; bağlantı açık kalsın
+                time.sleep(0.1)
+
+    def close(self):
+        self._running = False
+        self.session.wake()
+        self._sock.close()
+
+
+def parse_replay_spec(spec: str):
+    """'yol[:hız]' -> (yol, hız). Son ':' sonrası sayı değilse (C:\\kayit.bin) tümü yoldur."""
+    path, sep, speed = spec.rpartition(":")
+    if sep and path:
+        try:
+            return path, float(speed)
+        except ValueError:
+            pass
+    return spec, 1.0
+
+
+def open_replay(spec: str):
+    """'yol[:hız]' -> (ReplaySession, ReplaySerial, ReplayTcpServer); sunucu başlatılmış olur."""
+    session = ReplaySession(*parse_replay_spec(spec))
+    return session, ReplaySerial(session), ReplayTcpServer(session).start()
+
+
+# ---------------- CLI ----------------
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Trafik kaydı özeti / dökümü")
+    ap.add_argument("path")
+    ap.add_argument("--dump", action="store_true", help="her kaydı satır olarak yaz")
+    a = ap.parse_args(argv)
+    records = read_log(a.path)
+    if a.dump:
+        for t, ch, data in records:
+            print(f"{t:12.6f} {CHANNEL_NAMES.get(ch, ch):9s} {data!r}")
+        return
+    dur = records[-1][0] if records else 0.0
+    print(f"{len(records)} kayıt, {dur:.1f} sn")
+    for ch, name in CHANNEL_NAMES.items():
+        sel = [d for _, c, d in records if c == ch]
+        print(f"  {name:9s} {len(sel):7d} parça {sum(map(len, sel)):9d} bayt")
+
+
+if __name__ == "__main__":
+    main()
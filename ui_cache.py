@@ -0,0 +1,72 @@
+"""Derlenmiş .ui önbelleği: uic.loadUi yerine önceden üretilmiş Python formu.
+
+uic.loadUi her açılışta XML'i ayrıştırıp widget ağacını yorumlar. Burada .ui
+bir kez uic.compileUi ile Python modülüne çevrilir ve __pycache__ altında
+içerik özetiyle adlandırılarak saklanır; .ui değişince özet değişir, modül
+yeniden üretilir. Sonraki açılışlarda modül import edilir (bayt kodu da
+Python tarafından önbelleğe alınır).
+
+load_ui(path, widget) loadUi(path, widget) ile aynı sonucu verir: alt widget'lar
+widget'ın öznitelikleri olur. Önbellek yazılamazsa ya da derleme başarısızsa
+loadUi'ye düşülür.
+"""
+import hashlib
+import importlib.util
+import io
+import os
+from pathlib import Path
+
+from PyQt5 import uic
+
+
+def cache_path(ui_path: Path, cache_dir: Path = None) -> Path:
+    ui_path = Path(ui_path)
+    digest = hashlib.sha1(ui_path.read_bytes()).hexdigest()[:12]
+    cache_dir = Path(cache_dir) if cache_dir is not None else ui_path.parent / "__pycache__"
+    return cache_dir / f"ui_{ui_path.stem}_{digest}.py"
+
+
+def compile_ui(ui_path: Path, out: Path):
+    """uic.compileUi çıktısını atomik olarak yazar; aynı .ui'nin eski sürümleri silinir."""
+    buf = io.StringIO()
+    with open(ui_path, "r", encoding="utf-8") as f:
+        uic.compileUi(f, buf)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    tmp = out.with_suffix(f".tmp{os.getpid()}")
+    tmp.write_text(buf.getvalue(), encoding="utf-8")
+    os.replace(tmp, out)
+    prefix = out.name.rsplit("_", 1)[0] + "_"
+    for old in out.parent.glob(f"{prefix}*.py"):
+        if old != out:
+            try:
+                old.unlink()
+            except OSError:
+                pass
+
+
+def _form_class(module_path: Path):
+    spec = importlib.util.spec_from_file_location(module_path.stem, module_path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return next(v for k, v in vars(module).items() if k.startswith("Ui_") and isinstance(v, type))
+
+
+def load_ui(ui_path, widget, cache_dir=None) -> str:
+    """widget'a formu kurar; dönüş: "cached", "compiled" ya da "loadUi"."""
+    ui_path = Path(ui_path)
+    try:
+        out = cache_path(ui_path, cache_dir)
+        how = "cached"
+        if not out.exists():
+            compile_ui(ui_path, out)
+            how = "compiled"
+        form = _form_class(out)()
+    except Exception as e:
+        print("UI önbelleği kullanılamadı, loadUi:", e)
+        uic.loadUi(str(ui_path), widget)
+        return "loadUi"
+    form.setupUi(widget)
+    # loadUi gibi: alt widget'lar doğrudan widget üzerinden erişilsin
+    for name, value in vars(form).items():
+        setattr(widget, name, value)
+    return how
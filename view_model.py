@@ -0,0 +1,43 @@
+"""UI'ye gidecek son değerler: kaynaklar yayınlar, sabit hızlı UI zamanlayıcısı çeker.
+
+Anahtarlar widget adlarıdır (ör. "status_label", "lcdNumber_Pointer_R"). Aynı
+anahtara iki yenileme arasında gelen değerlerden yalnızca sonuncusu çizilir;
+ekrandakiyle aynı olan değer hiç çizilmez. publish her thread'den çağrılabilir.
+"""
+import threading
+
+_UNSET = object()
+
+
+class ViewModel:
+    def __init__(self):
+        self._values = {}
+        self._applied = {}                       # ekrana en son yazılan değerler
+        self._dirty = set()
+        self._lock = threading.Lock()
+
+    def publish(self, key: str, value):
+        with self._lock:
+            self._values[key] = value
+            self._dirty.add(key)
+
+    def publish_many(self, values: dict):
+        with self._lock:
+            self._values.update(values)
+            self._dirty.update(values)
+
+    def get(self, key: str, default=None):
+        with self._lock:
+            return self._values.get(key, default)
+
+    def take_changes(self) -> dict:
+        """Son çekimden beri değişen ve ekrandakinden farklı olan değerler."""
+        with self._lock:
+            out = {}
+            for key in self._dirty:
+                v = self._values[key]
+                if self._applied.get(key, _UNSET) != v:
+                    out[key] = v
+                    self._applied[key] = v
+            self._dirty.clear()
+            return out